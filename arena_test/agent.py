@@ -1,121 +1,124 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple
-from anthropic import Anthropic
+from typing import Dict, List, Optional, Tuple
 import json
-import logging
-from game_state import PlayerType
-from prompt_manager import PromptType
-import streamlit as st
+from .arena_logging import Lazy, capture_payload, get_logger
+from .config import get_context_budgets
+from .context import ContextCompactor, PromptState
+from .game_state import COMPACT_STATE_LEGEND
+from .llm import cached_system, cached_user_message, get_llm_client
+from .prompt_manager import UPDATES_FORMAT, PromptManager, PromptType
+from .router import get_model_router
+from .updates_tool import UPDATES_TOOL, ToolInputStreamParser, validate_updates
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger("agents")
+
+# Per-turn user message; everything else in the prompt is static
+TURN_TEMPLATE = """{game_state}
+
+Player's current message: {player_message}"""
+
+# Substituted for per-turn placeholders in older templates so the system prompt stays static
+HISTORY_IN_MESSAGES = "(see the previous messages in this conversation)"
+STATE_IN_MESSAGES = "(provided with each player message)"
+MESSAGE_IN_MESSAGES = "(see the latest player message)"
 
 class GameMaster:
-    def __init__(self, player_name: str, api_key: str):
+    def __init__(self, player_name: str, api_key: str, prompt_manager: PromptManager,
+                 context_budget: Optional[int] = None):
         self.player_name = player_name
-        self.client = Anthropic(api_key=api_key)
+        self.llm = get_llm_client(api_key)
+        self.router = get_model_router()
+        self.prompt_manager = prompt_manager
         self.conversation_history = []
         self.current_turn = 0  # Added this attribute
+        self.context = ContextCompactor(
+            self.llm, "Game Master", self.conversation_history, 'user_content', 'gm_response',
+            context_budget or get_context_budgets()["game_master"]
+        )
     
-    def format_history_for_prompt(self) -> str:
-        if not self.conversation_history:
-            return "No previous conversation."
-            
-        formatted_history = []
-        for turn in self.conversation_history:
-            formatted_history.append(
-                f"Turn {turn['turn_number']}:\n"
-                f"Player: {turn['player_message']}\n"
-                f"GM: {turn['gm_response']}\n"
-            )
-        return "\n".join(formatted_history)
+    def to_snapshot(self) -> Dict:
+        return {
+            "conversation_history": list(self.conversation_history),
+            "current_turn": self.current_turn,
+            "context": self.context.to_snapshot()
+        }
     
-    async def process_turn_streaming(self, player_message: str, game_state: Dict, 
-                                   update_placeholder_fn) -> Tuple[str, Dict]:
-        # Get the selected prompt from session state
-        selected_prompt = st.session_state.prompt_manager.get_prompt(
-            PromptType.GAME_MASTER,
-            st.session_state.selected_prompts[PromptType.GAME_MASTER]
-        )
+    def restore(self, snapshot: Dict):
+        # Refill in place: the context compactor holds a reference to this list
+        self.conversation_history[:] = snapshot["conversation_history"]
+        self.current_turn = snapshot["current_turn"]
+        self.context.restore(snapshot["context"])
+    
+    def _build_messages(self, user_content: str) -> List[Dict]:
+        """Replay the compacted history and append the new player message"""
+        messages = self.context.messages()
+        messages.append(cached_user_message(user_content))
+        return messages
+    
+    async def process_turn_streaming(self, player_message: str, state: PromptState,
+                                   update_placeholder_fn, prompt_name: str) -> Tuple[str, Dict]:
+        selected_prompt = self.prompt_manager.get_prompt_or_default(PromptType.GAME_MASTER, prompt_name)
         
-        formatted_prompt = st.session_state.prompt_manager.format_prompt(
+        # Static rules and the updates format form a cacheable prefix; history and
+        # state travel in append-only messages so the prefix never changes
+        system_prompt = self.prompt_manager.format_prompt(
             selected_prompt,
             player_name=self.player_name,
-            conversation_history=self.format_history_for_prompt(),
-            game_state=json.dumps(game_state, indent=2),
+            conversation_history=HISTORY_IN_MESSAGES,
+            game_state=STATE_IN_MESSAGES,
+            player_message=MESSAGE_IN_MESSAGES
+        ) + "\n\n" + COMPACT_STATE_LEGEND + "\n\n" + UPDATES_FORMAT
+        
+        user_content = TURN_TEMPLATE.format(
+            game_state=state.describe(),
             player_message=player_message
         )
+        messages = self._build_messages(user_content)
         
-        # Add the updates section template
-        formatted_prompt += """
+        logger.debug("GM turn %d: %d messages, %d chars of new context",
+                     self.current_turn, len(messages), len(user_content))
         
-        After your response, provide a JSON object with state updates in the format:
-        ###Updates
-        {
-            "hp_changes": {
-                "player_a": 0,
-                "player_b": 0
-            },
-            "position_changes": {
-                "player_a": [0, 0],
-                "player_b": [0, 0]
-            },
-            "custom_stat_changes": {
-                "player_a": {},
-                "player_b": {}
-            }
-        }
-        """
+        parser = ToolInputStreamParser()
         
-        logger.info("\n" + "="*50 + "\nFULL GM CONTEXT:\n" + "="*50)
-        logger.info(formatted_prompt)
+        # Only the newly decoded text is passed on; joining it is left to the renderer
+        def on_json(json_delta: str):
+            released = parser.feed(json_delta)
+            if released:
+                update_placeholder_fn(released)
         
-        accumulated_response = ""
+        async def call(model: str, max_tokens: int) -> str:
+            nonlocal parser
+            # A fallback call streams the narrative again from the start
+            parser = ToolInputStreamParser()
+            return await self.llm.stream_tool(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                tool=UPDATES_TOOL,
+                on_json=on_json,
+                system=cached_system(system_prompt),
+                validate=validate_updates
+            )
         
-        stream = self.client.messages.create(
-            max_tokens=1000,
-            messages=[{"role": "user", "content": formatted_prompt}],
-            model="claude-3-sonnet-20240229",
-            stream=True
-        )
-
-        for event in stream:
-            if event.type == "content_block_delta":
-                text_delta = event.delta.text
-                if text_delta:
-                    accumulated_response += text_delta
-                    update_placeholder_fn(accumulated_response)
+        response, model = await self.router.run("game_master", call)
+        narrative, updates = parser.finish()
         
-        logger.info("\n" + "="*50 + "\nFINAL RESPONSE:\n" + "="*50)
-        logger.info(accumulated_response)
+        capture_payload("game_master", system=system_prompt, messages=messages, response=response)
         
         # Store the conversation turn
         self.conversation_history.append({
             "player_message": player_message,
-            "gm_response": accumulated_response,
+            "user_content": user_content,
+            "gm_response": narrative,
             "turn_number": self.current_turn,
-            "game_state_snapshot": game_state
+            "state_turn": state.turn_number,
+            "full_state": state.full,
+            "model": model
         })
         self.current_turn += 1
+        self.context.schedule()
         
-        # Parse updates from response
-        updates = {}
-        if "###Updates" in accumulated_response:
-            try:
-                updates_text = accumulated_response.split("###Updates")[1].strip()
-                updates = json.loads(updates_text)
-                logger.info("\n" + "="*50 + "\nPARSED UPDATES:\n" + "="*50)
-                logger.info(json.dumps(updates, indent=2))
-            except Exception as e:
-                logger.error(f"Error parsing updates: {e}")
-                updates = {
-                    "hp_changes": {"player_a": 0, "player_b": 0},
-                    "position_changes": {"player_a": [0, 0], "player_b": [0, 0]},
-                    "custom_stat_changes": {"player_a": {}, "player_b": {}}
-                }
+        logger.info("GM turn %d complete on %s: %d chars", self.current_turn - 1, model, len(response))
+        logger.debug("GM updates: %s", Lazy(json.dumps, updates))
         
-        return accumulated_response.split("###Updates")[0].strip(), updates
\ No newline at end of file
+        return narrative, updates
@@ -0,0 +1,446 @@
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+import asyncio
+import concurrent.futures
+import copy
+import threading
+import time
+import uuid
+from .agent import GameMaster
+from .arena_logging import get_logger
+from .config import get_arena_size, get_game_store_settings, get_max_rounds
+from .event_store import EventStore
+from .game_state import GameState, PlayerType
+from .narrator import GameNarrator
+from .player_b import PlayerBAgent
+from .prompt_manager import PromptManager, PromptType
+from .scheduler import Priority
+from .snapshots import StateSnapshot
+
+logger = get_logger("engine")
+
+EXCHANGES_PER_ROUND = 5
+
+def speculation_is_valid(speculative_state: Dict, final_state: Dict) -> bool:
+    """A speculative turn stands if the final GM updates left both players unchanged.
+
+    The speculative turn is written before Player A's final action, so an
+    accepted turn never reacts to it. Comparing the action log or narrative
+    would reject every speculation, so only the stats decide: Player B may
+    ignore a final action that changed nothing, which is the price of
+    starting early and why speculation is opt-in.
+    """
+    return all(speculative_state[player] == final_state[player] for player in ("player_a", "player_b"))
+
+class Arena:
+    """Headless game engine: runs GM exchanges, Player B and the narrator for one game.
+
+    All collaborators are passed in explicitly, so the engine can run inside a
+    Streamlit session or in a plain worker process.
+    """
+
+    def __init__(self, api_key: str, prompt_manager: PromptManager,
+                 selected_prompts: Dict[PromptType, str], player_name: str = "Player A",
+                 game_state: Optional[GameState] = None, speculative_player_b: bool = False,
+                 max_rounds: Optional[int] = None, store: Optional[EventStore] = None,
+                 game_id: Optional[str] = None):
+        self.prompt_manager = prompt_manager
+        self.selected_prompts = selected_prompts
+        self.game_state = game_state or GameState(**get_arena_size())
+        self.game_master = GameMaster(player_name, api_key, prompt_manager)
+        self.player_b = PlayerBAgent(api_key, prompt_manager)
+        self.narrator = GameNarrator(api_key, prompt_manager)
+        self.speculative_player_b = speculative_player_b
+        # 0 lifts the cap; context compaction keeps long games at a steady prompt size
+        self.max_rounds = get_max_rounds() if max_rounds is None else max_rounds
+        self.conversation_turns = 0
+        self.rounds_played = 0
+        self._speculation = None
+        # Several sessions can attach to one game; exchanges and round ends run one at a time
+        self._turn_lock = asyncio.Lock()
+        # Round-end phases already applied this round, so a retried finish_round skips them
+        self.round_phases: Set[str] = set()
+        # Text streamed so far by each round-end phase, in pieces; see finish_round
+        self.round_progress: Dict[str, List[str]] = {}
+        # Background finish_round started by a UI; reruns and other sessions attach to it
+        self.round_end_future: Optional[concurrent.futures.Future] = None
+        # State after every change; snapshots share unchanged records, so this stays small
+        self.timeline: List[StateSnapshot] = [self.game_state.snapshot()]
+        # Every change is appended to the store; a snapshot is taken every snapshot_every events
+        self.store = store
+        self.game_id = game_id or uuid.uuid4().hex
+        self.snapshot_every = get_game_store_settings()["snapshot_every"]
+        self.event_seq = 0
+        self._snapshot_seq = 0
+        if store is not None and game_id is None:
+            store.create_game(self.game_id, {
+                "player_name": player_name,
+                "selected_prompts": {prompt_type.value: name for prompt_type, name in selected_prompts.items()},
+                "width": self.game_state.width,
+                "height": self.game_state.height,
+                "max_rounds": self.max_rounds
+            })
+
+    @property
+    def round_complete(self) -> bool:
+        return self.conversation_turns >= EXCHANGES_PER_ROUND
+
+    async def play_exchange(self, message: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Send one Player A message to the GM, apply its updates and return the narrative.
+
+        ``on_text`` receives each newly streamed piece of the narrative.
+        """
+        async with self._turn_lock:
+            return await self._play_exchange(message, on_text)
+
+    async def _play_exchange(self, message: str, on_text: Optional[Callable[[str], None]]) -> str:
+        if self.round_complete:
+            raise RuntimeError("The round is complete; finish it before the next exchange")
+        # On the final exchange, optionally let Player B start from the pre-update state
+        if self.speculative_player_b and self.conversation_turns == EXCHANGES_PER_ROUND - 1:
+            self._start_speculation()
+
+        try:
+            narrative, updates = await self.game_master.process_turn_streaming(
+                message,
+                self.game_master.context.prompt_state(self.game_state),
+                on_text or (lambda text: None),
+                self.selected_prompts[PromptType.GAME_MASTER]
+            )
+        except BaseException:
+            # The exchange will be played again, with a fresh speculation if any
+            self._cancel_speculation()
+            raise
+        self.game_state.update_state(
+            updates=updates,
+            player=PlayerType.A,
+            narrative=narrative
+        )
+        self.timeline.append(self.game_state.snapshot())
+        self.conversation_turns += 1
+        await self._record("exchange", {
+            "gm_turn": self.game_master.conversation_history[-1],
+            "updates": updates,
+            "narrative": narrative
+        })
+        return narrative
+
+    async def finish_round(self, on_text: Optional[Callable[[str, str], None]] = None,
+                           priority: Priority = Priority.BACKGROUND) -> GameState:
+        """Play Player B's turn, add the narrator summary and start the next round.
+
+        Both phases stream: ``on_text(phase, delta)`` is called with phase
+        "player_b" or "narrator" and each new piece of text, and
+        ``round_progress`` collects the pieces of each phase for readers that
+        poll instead (see ``round_text``). Phases that completed in
+        an earlier, failed attempt are not run again. A UI showing the round
+        end passes Priority.INTERACTIVE so Player B's turn is served like a GM
+        turn; headless rounds stay in the background.
+        """
+        async with self._turn_lock:
+            if not self.round_complete:
+                # Another session finished this round while we waited
+                return self.game_state
+            return await self._finish_round(on_text, priority)
+
+    async def _finish_round(self, on_text: Optional[Callable[[str, str], None]],
+                            priority: Priority) -> GameState:
+        self.reset_round_progress()
+
+        def progress(phase: str) -> Callable[[str], None]:
+            pieces = self.round_progress.setdefault(phase, [])
+
+            def update(delta: str):
+                pieces.append(delta)
+                if on_text:
+                    on_text(phase, delta)
+            return update
+
+        if "player_b" not in self.round_phases:
+            await self.play_player_b_turn(progress("player_b"), priority)
+        if "narrator" not in self.round_phases:
+            await self.update_narrative_summary(progress("narrator"))
+        self.conversation_turns = 0
+        self.rounds_played += 1
+        self.round_phases = set()
+        await self._record("round_end", {})
+        return self.game_state
+
+    def reset_round_progress(self):
+        """Clear the streamed text of round-end phases that have yet to complete"""
+        self.round_progress = {phase: pieces for phase, pieces in self.round_progress.items()
+                               if phase in self.round_phases}
+
+    def round_text(self) -> Dict[str, str]:
+        """Text streamed so far by each round-end phase"""
+        return {phase: "".join(pieces) for phase, pieces in list(self.round_progress.items())}
+
+    async def run_round(self, messages: List[str],
+                        on_text: Optional[Callable[[str], None]] = None) -> GameState:
+        """Play a full round from a list of Player A messages and return the new state"""
+        for message in messages[:EXCHANGES_PER_ROUND]:
+            await self.play_exchange(message, on_text)
+        return await self.finish_round()
+
+    async def play_player_b_turn(self, on_text: Optional[Callable[[str], None]] = None,
+                                 priority: Priority = Priority.BACKGROUND) -> str:
+        """Process Player B's turn (AI-simulated), streaming its narrative to on_text"""
+        narrative = None
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            speculative_state, task = speculation
+            try:
+                narrative, updates = await task
+            except Exception as e:
+                logger.error("Speculative Player B turn failed: %s", e)
+            if narrative is not None and speculation_is_valid(speculative_state, self.game_state.to_dict()):
+                self.player_b.commit_pending_turn()
+            else:
+                self.player_b.discard_pending_turn()
+                narrative = None
+
+        if narrative is None:
+            narrative, updates = await self.player_b.generate_turn(
+                self.player_b.context.prompt_state(self.game_state),
+                self.game_state.format_recent_actions(),
+                self.selected_prompts[PromptType.PLAYER_B],
+                on_text=on_text,
+                priority=priority
+            )
+        elif on_text:
+            # The speculative turn finished unseen; show it whole
+            on_text(narrative)
+
+        self.game_state.update_state(
+            updates=updates,
+            player=PlayerType.B,
+            narrative=narrative
+        )
+        self.timeline.append(self.game_state.snapshot())
+        self.round_phases.add("player_b")
+        await self._record("player_b_turn", {
+            "turn": self.player_b.narrative_history[-1],
+            "updates": updates,
+            "narrative": narrative
+        })
+        return narrative
+
+    async def update_narrative_summary(self, on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Narrate the actions since the last summary and update the story so far"""
+        summary, model = await self.narrator.generate_turn_summary(
+            self.game_state,
+            self.selected_prompts[PromptType.NARRATOR],
+            on_text
+        )
+        self.game_state.add_narrative(summary)
+        self.timeline.append(self.game_state.snapshot())
+        self.round_phases.add("narrator")
+        await self._record("narrative", {"summary": summary, "model": model, **self.narrator.to_snapshot()})
+        return summary
+
+    def is_over(self) -> bool:
+        if len(self.game_state.entities.alive()) <= 1:
+            return True
+        return bool(self.max_rounds) and self.rounds_played >= self.max_rounds
+
+    def winner(self) -> Optional[str]:
+        alive = self.game_state.entities.alive()
+        if len(alive) == 1:
+            return self.game_state.entities.get(alive[0]).name
+        return None
+
+    def context_stats(self) -> Dict[str, Dict]:
+        """History compaction per agent, including the estimated tokens saved per request"""
+        return {
+            "game_master": self.game_master.context.stats(),
+            "player_b": self.player_b.context.stats()
+        }
+
+    def transcript(self) -> Iterator[Dict[str, str]]:
+        """Player A and GM chat messages in order"""
+        for turn in self.game_master.conversation_history:
+            yield {"role": "user", "content": turn["player_message"]}
+            yield {"role": "assistant", "content": turn["gm_response"]}
+
+    def to_snapshot(self) -> Dict:
+        return {
+            "game_state": self.game_state.to_snapshot(),
+            "game_master": self.game_master.to_snapshot(),
+            "player_b": self.player_b.to_snapshot(),
+            "narrator": self.narrator.to_snapshot(),
+            "conversation_turns": self.conversation_turns,
+            "rounds_played": self.rounds_played,
+            "round_phases": sorted(self.round_phases)
+        }
+
+    def restore_snapshot(self, snapshot: Dict):
+        self.game_state = GameState.from_snapshot(snapshot["game_state"])
+        self.game_master.restore(snapshot["game_master"])
+        self.player_b.restore(snapshot["player_b"])
+        if "narrator" in snapshot:
+            self.narrator.restore(snapshot["narrator"])
+        self.conversation_turns = snapshot["conversation_turns"]
+        self.rounds_played = snapshot["rounds_played"]
+        self.round_phases = set(snapshot.get("round_phases", ()))
+        self.timeline = [self.game_state.snapshot()]
+
+    def save_snapshot(self):
+        """Snapshot the game at the latest event so a resume replays nothing; blocks until written"""
+        if self.store is not None and self.event_seq > self._snapshot_seq:
+            self._submit_snapshot().result()
+
+    async def save_snapshot_async(self):
+        """save_snapshot for the event loop: the store is written on its writer thread"""
+        if self.store is not None and self.event_seq > self._snapshot_seq:
+            await asyncio.shield(asyncio.wrap_future(self._submit_snapshot()))
+
+    def _submit_snapshot(self) -> concurrent.futures.Future:
+        # Taken here, in step with event_seq; to_snapshot copies what it returns, so the writer
+        # thread can encode it while the game moves on
+        seq, state = self.event_seq, self.to_snapshot()
+        self._snapshot_seq = seq
+        return self.store.submit(self.store.save_snapshot, self.game_id, seq, state)
+
+    def apply_event(self, kind: str, payload: Dict):
+        """Replay a recorded event without calling any model"""
+        if kind == "exchange":
+            self.game_master.conversation_history.append(payload["gm_turn"])
+            self.game_master.current_turn += 1
+            self.game_state.update_state(payload["updates"], PlayerType.A, payload["narrative"])
+            self.conversation_turns += 1
+        elif kind == "player_b_turn":
+            self.player_b.narrative_history.append(payload["turn"])
+            self.game_state.update_state(payload["updates"], PlayerType.B, payload["narrative"])
+            self.round_phases.add("player_b")
+        elif kind == "narrative":
+            self.game_state.add_narrative(payload["summary"])
+            if "cursor" in payload:
+                self.narrator.restore(payload)
+            self.round_phases.add("narrator")
+        elif kind == "round_end":
+            self.conversation_turns = 0
+            self.rounds_played += 1
+            self.round_phases = set()
+        else:
+            logger.warning("Skipping unknown event type %s", kind)
+            return
+        if kind != "round_end":
+            self.timeline.append(self.game_state.snapshot())
+
+    @classmethod
+    def resume(cls, store: EventStore, game_id: str, api_key: str,
+               prompt_manager: PromptManager) -> Optional["Arena"]:
+        """Rebuild a stored game from its latest snapshot plus the events after it"""
+        meta = store.get_meta(game_id)
+        if meta is None:
+            return None
+        arena = cls(
+            api_key,
+            prompt_manager,
+            {PromptType(prompt_type): name for prompt_type, name in meta["selected_prompts"].items()},
+            player_name=meta["player_name"],
+            game_state=GameState(meta["width"], meta["height"]),
+            max_rounds=meta["max_rounds"],
+            game_id=game_id
+        )
+        seq = 0
+        snapshot = store.latest_snapshot(game_id)
+        if snapshot is not None:
+            seq, state = snapshot
+            arena.restore_snapshot(state)
+        arena._snapshot_seq = seq
+        replayed = 0
+        for seq, kind, payload in store.events_after(game_id, seq):
+            arena.apply_event(kind, payload)
+            replayed += 1
+        arena.event_seq = seq
+        arena.store = store
+        logger.info("Resumed game %s at event %d (%d replayed)", game_id, seq, replayed)
+        return arena
+
+    async def _record(self, kind: str, payload: Dict):
+        if self.store is None:
+            return
+        # Numbered here rather than by the store, so a snapshot taken before the write lands
+        # still names the right event
+        self.event_seq += 1
+        writes = [self.store.submit(self.store.append, self.game_id, self.event_seq, kind, payload)]
+        if self.event_seq - self._snapshot_seq >= self.snapshot_every:
+            writes.append(self._submit_snapshot())
+        for write in writes:
+            # Shielded: a cancelled turn must not cancel a write whose event is already numbered
+            await asyncio.shield(asyncio.wrap_future(write))
+
+    def _start_speculation(self):
+        self._cancel_speculation()
+        # Deep copy: custom stats are shared with the live state, which the GM is about to update
+        speculative_state = copy.deepcopy(self.game_state.to_dict())
+        # The state is encoded now: the GM may update it before the task first runs
+        task = asyncio.ensure_future(self.player_b.generate_turn(
+            self.player_b.context.prompt_state(self.game_state),
+            self.game_state.format_recent_actions(),
+            self.selected_prompts[PromptType.PLAYER_B],
+            record=False
+        ))
+        self._speculation = (speculative_state, task)
+
+    def _cancel_speculation(self):
+        """Drop a speculative Player B turn that will not be used, finished or not"""
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            speculation[1].cancel()
+        self.player_b.discard_pending_turn()
+
+class ArenaRegistry:
+    """Live arenas by game id, shared by every session in the process.
+
+    Arenas idle for longer than ``idle_seconds`` are snapshotted and dropped
+    from memory; the next request for the game rehydrates it from the store.
+    Without a store, arenas are never evicted.
+    """
+
+    def __init__(self, idle_seconds: float):
+        self.idle_seconds = idle_seconds
+        self._arenas: Dict[str, Tuple[Arena, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, arena: Arena):
+        with self._lock:
+            self._arenas[arena.game_id] = (arena, time.monotonic())
+
+    def get(self, game_id: str, api_key: str, prompt_manager: PromptManager,
+            store: Optional[EventStore]) -> Optional[Arena]:
+        self.evict_idle()
+        with self._lock:
+            entry = self._arenas.get(game_id)
+        if entry is not None:
+            arena = entry[0]
+        elif store is not None:
+            arena = Arena.resume(store, game_id, api_key, prompt_manager)
+            if arena is None:
+                return None
+        else:
+            return None
+        self.add(arena)
+        return arena
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [arena for arena, last_used in self._arenas.values()
+                    if last_used < cutoff and arena.store is not None]
+            for arena in idle:
+                del self._arenas[arena.game_id]
+        for arena in idle:
+            arena.save_snapshot()
+            logger.info("Evicted idle game %s", arena.game_id)
+
+_registry: Optional[ArenaRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_arena_registry() -> ArenaRegistry:
+    """Return the process-wide registry of live games"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ArenaRegistry(get_game_store_settings()["idle_seconds"])
+    return _registry
@@ -0,0 +1,118 @@
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Deque, Dict, List, Optional
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Default level per category; override with ARENA_LOG_LEVELS="llm=DEBUG,agents=WARNING"
+DEFAULT_LEVELS = {
+    "arena": logging.INFO,
+    "agents": logging.INFO,
+    "llm": logging.WARNING,
+    "prompts": logging.WARNING
+}
+
+PAYLOAD_BUFFER_SIZE = 200
+
+def get_logger(category: str) -> logging.Logger:
+    """Logger for a category; levels are set per category by configure_logging"""
+    return logging.getLogger(f"arena.{category}")
+
+class Lazy:
+    """Defers building a log argument until a handler actually formats the record.
+
+    Use with %-style arguments: ``logger.debug("updates: %s", Lazy(json.dumps, updates))``.
+    """
+
+    def __init__(self, fn: Callable, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return str(self.fn(*self.args, **self.kwargs))
+
+class PayloadRecorder:
+    """Keeps full prompts and responses off the log stream.
+
+    Every payload goes into a bounded in-memory ring buffer by reference, which
+    costs no formatting. A sampled fraction is also written as JSON lines to a
+    rotating file when one is configured.
+    """
+
+    def __init__(self, size: int = PAYLOAD_BUFFER_SIZE, path: Optional[str] = None,
+                 sample_rate: float = 0.0, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3):
+        self.buffer: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._file = None
+        if path and sample_rate > 0:
+            self._file = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            self._file.setFormatter(logging.Formatter('%(message)s'))
+
+    def capture(self, category: str, **payload):
+        entry = {"time": time.time(), "category": category, **payload}
+        self.buffer.append(entry)
+        if self._file is not None and random.random() < self.sample_rate:
+            record = logging.LogRecord(category, logging.INFO, "", 0, "%s", (Lazy(json.dumps, entry, default=str),), None)
+            with self._lock:
+                self._file.emit(record)
+
+    def recent(self, category: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        entries = [entry for entry in self.buffer if category is None or entry["category"] == category]
+        return entries[-limit:] if limit else entries
+
+_recorder = PayloadRecorder()
+_configured = False
+
+def get_payload_recorder() -> PayloadRecorder:
+    return _recorder
+
+def capture_payload(category: str, **payload):
+    """Record a full prompt or response without formatting it"""
+    _recorder.capture(category, **payload)
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            category, level = item.split("=", 1)
+            levels[category.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+def configure_logging(level_spec: Optional[str] = None):
+    """Install the handler and per-category levels once per process.
+
+    Levels come from ``level_spec`` or ARENA_LOG_LEVELS; payload sampling from
+    ARENA_PAYLOAD_LOG (file path) and ARENA_PAYLOAD_SAMPLE_RATE (0 to 1).
+    """
+    global _configured, _recorder
+    if _configured:
+        return
+    _configured = True
+
+    root = logging.getLogger("arena")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.propagate = False
+
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(parse_levels(level_spec or os.getenv('ARENA_LOG_LEVELS', '')))
+    for category, level in levels.items():
+        logger = root if category == "arena" else get_logger(category)
+        logger.setLevel(level)
+
+    payload_log = os.getenv('ARENA_PAYLOAD_LOG')
+    if payload_log:
+        _recorder = PayloadRecorder(
+            path=payload_log,
+            sample_rate=float(os.getenv('ARENA_PAYLOAD_SAMPLE_RATE', '0.01'))
+        )
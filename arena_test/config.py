@@ -11,3 +11,114 @@ def get_api_key():
         raise ValueError("ANTHROPIC_API_KEY not found in environment variables. Please check your .env file.")
     return api_key
 
+def get_speculative_player_b() -> bool:
+    """Whether Player B may start its turn while the final GM response is still streaming"""
+    return os.getenv('ARENA_SPECULATIVE_PLAYER_B', '').lower() in ('1', 'true', 'yes')
+
+def get_response_cache_settings() -> dict:
+    """Response cache mode (off, read_through, record_only, replay_only), location and limits"""
+    return {
+        "mode": os.getenv('ARENA_CACHE_MODE', 'off'),
+        "path": os.getenv('ARENA_CACHE_PATH', '.arena_cache.sqlite3'),
+        "max_bytes": int(float(os.getenv('ARENA_CACHE_MAX_MB', '100')) * 1024 * 1024),
+        "max_age_seconds": float(os.getenv('ARENA_CACHE_MAX_AGE_DAYS', '30')) * 24 * 3600
+    }
+
+def get_llm_pool_settings() -> dict:
+    """Connection pool overrides from the environment; unset values keep the client defaults"""
+    settings = {}
+    for name, env_var, parse in (
+        ("max_connections", 'ARENA_MAX_CONNECTIONS', int),
+        ("max_keepalive_connections", 'ARENA_MAX_KEEPALIVE_CONNECTIONS', int),
+        ("keepalive_expiry", 'ARENA_KEEPALIVE_EXPIRY', float),
+        ("max_concurrent_requests", 'ARENA_MAX_CONCURRENT_REQUESTS', int)
+    ):
+        value = os.getenv(env_var)
+        if value:
+            settings[name] = parse(value)
+    return settings
+
+def get_context_budgets() -> dict:
+    """Token budget for the verbatim history each agent replays before older turns are summarized"""
+    return {
+        "game_master": int(os.getenv('ARENA_GM_CONTEXT_TOKENS', '6000')),
+        "player_b": int(os.getenv('ARENA_PLAYER_B_CONTEXT_TOKENS', '4000'))
+    }
+
+def get_max_rounds() -> int:
+    """Rounds before the game ends on time; 0 means play until a player is defeated"""
+    return int(os.getenv('ARENA_MAX_ROUNDS', '3'))
+
+def get_render_settings() -> dict:
+    """How often streamed text is pushed to the browser: every N ms or every N deltas"""
+    return {
+        "interval": float(os.getenv('ARENA_RENDER_INTERVAL_MS', '50')) / 1000,
+        "max_deltas": int(os.getenv('ARENA_RENDER_MAX_DELTAS', '20'))
+    }
+
+def get_arena_size() -> dict:
+    """Arena dimensions in cells for new games"""
+    return {
+        "width": int(os.getenv('ARENA_WIDTH', '10')),
+        "height": int(os.getenv('ARENA_HEIGHT', '10'))
+    }
+
+def get_game_store_settings() -> dict:
+    """Where games are persisted (empty path disables it), snapshot cadence and idle eviction"""
+    return {
+        "path": os.getenv('ARENA_GAME_STORE_PATH', '.arena_games.sqlite3'),
+        "snapshot_every": int(os.getenv('ARENA_SNAPSHOT_EVERY', '20')),
+        "idle_seconds": float(os.getenv('ARENA_SESSION_IDLE_SECONDS', '900'))
+    }
+
+def get_server_settings() -> dict:
+    """Address of the standalone arena server and its per-game queue and game limits"""
+    return {
+        "host": os.getenv('ARENA_SERVER_HOST', '127.0.0.1'),
+        "port": int(os.getenv('ARENA_SERVER_PORT', '8700')),
+        "inbox_size": int(os.getenv('ARENA_SERVER_INBOX_SIZE', '4')),
+        "outbox_size": int(os.getenv('ARENA_SERVER_OUTBOX_SIZE', '256')),
+        "max_games": int(os.getenv('ARENA_SERVER_MAX_GAMES', '500'))
+    }
+
+def get_rate_limits() -> dict:
+    """Per-minute request and token limits shared by every LLM call in the process (0 disables one),
+    and the retry policy for failed requests"""
+    return {
+        "requests_per_minute": float(os.getenv('ARENA_RATE_LIMIT_RPM', '50')),
+        "input_tokens_per_minute": float(os.getenv('ARENA_RATE_LIMIT_INPUT_TPM', '40000')),
+        "output_tokens_per_minute": float(os.getenv('ARENA_RATE_LIMIT_OUTPUT_TPM', '8000')),
+        "max_retries": int(os.getenv('ARENA_LLM_MAX_RETRIES', '4')),
+        "base_delay": float(os.getenv('ARENA_LLM_RETRY_BASE_MS', '500')) / 1000,
+        "max_delay": float(os.getenv('ARENA_LLM_RETRY_MAX_MS', '20000')) / 1000
+    }
+
+# Length the narrator's rolling story-so-far digest is asked to stay within
+DIGEST_WORDS = 150
+
+# The narrator writes the round summary and the digest in one tool call: 500 tokens
+# for the summary plus two per digest word, leaving room for JSON escaping
+NARRATOR_MAX_TOKENS = 500 + 2 * DIGEST_WORDS
+
+# Per-role defaults: environment prefix, model, max_tokens and p95 latency budget in ms (0 = none).
+# Latency runs from admission to the first streamed output, so budgets do not grow with max_tokens.
+MODEL_ROUTE_DEFAULTS = {
+    "game_master": ("GM", "claude-3-sonnet-20240229", 1000, 4000),
+    "player_b": ("PLAYER_B", "claude-3-sonnet-20240229", 1000, 4000),
+    "narrator": ("NARRATOR", "claude-3-sonnet-20240229", NARRATOR_MAX_TOKENS, 4000),
+    "summary": ("SUMMARY", "claude-3-sonnet-20240229", 400, 0)
+}
+FAST_MODEL = "claude-3-haiku-20240307"
+
+def get_model_routes() -> dict:
+    """Model, token limit, latency budget, faster model and error fallback per agent role"""
+    routes = {}
+    for role, (prefix, model, max_tokens, budget_ms) in MODEL_ROUTE_DEFAULTS.items():
+        routes[role] = {
+            "model": os.getenv(f'ARENA_{prefix}_MODEL', model),
+            "max_tokens": int(os.getenv(f'ARENA_{prefix}_MAX_TOKENS', str(max_tokens))),
+            "latency_budget": float(os.getenv(f'ARENA_{prefix}_LATENCY_BUDGET_MS', str(budget_ms))) / 1000,
+            "fast_model": os.getenv(f'ARENA_{prefix}_FAST_MODEL', FAST_MODEL) or None,
+            "fallback_model": os.getenv(f'ARENA_{prefix}_FALLBACK_MODEL', FAST_MODEL) or None
+        }
+    return routes
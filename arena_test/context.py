@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import asyncio
+import json
+from .arena_logging import get_logger
+from .game_state import GameState
+from .llm import LLMClient
+from .router import get_model_router
+from .scheduler import Priority, estimate_tokens
+
+logger = get_logger("agents")
+
+# Turns always kept verbatim at the end of the context
+KEEP_RECENT_TURNS = 4
+
+SUMMARY_PROMPT = """You are compressing the earlier part of an AI Arena game conversation for the {role}.
+
+Previous summary:
+{summary}
+
+Turns to fold in:
+{turns}
+
+Write an updated summary, at most a few short paragraphs, that keeps every fact the {role} needs to stay consistent: actions taken, their outcomes, HP and position changes, custom stats, promises and ongoing plans. Output only the summary."""
+
+SUMMARY_MESSAGE = "Summary of the earlier turns of this game:\n{summary}"
+SUMMARY_ACKNOWLEDGEMENT = "Understood, I will stay consistent with that summary."
+
+@dataclass(frozen=True)
+class PromptState:
+    """The game state as one turn's message carries it: in full, or as the changes since the previous turn's"""
+    text: str
+    turn_number: int
+    full: bool
+
+    def describe(self) -> str:
+        header = "Current game state" if self.full else "Changes to the game state since the previous message"
+        return f"{header}:\n{self.text}"
+
+class ContextCompactor:
+    """Keeps an agent's replayed history within a token budget.
+
+    The newest turns are always sent verbatim. Once the verbatim part exceeds
+    the budget, older turns are folded into a rolling summary by a background
+    task, so the turn that triggers compaction does not wait for it; later
+    turns pick the summary up once it is ready.
+    """
+
+    def __init__(self, llm: LLMClient, role: str, history: List[Dict], user_key: str,
+                 assistant_key: str, token_budget: int, keep_recent: int = KEEP_RECENT_TURNS):
+        self.llm = llm
+        self.role = role
+        self.history = history
+        self.user_key = user_key
+        self.assistant_key = assistant_key
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary: Optional[str] = None
+        self.summarized_turns = 0
+        self.folded_tokens = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def tokens_saved(self) -> int:
+        """Estimated input tokens saved on every request by the current summary"""
+        if self.summary is None:
+            return 0
+        return self.folded_tokens - estimate_tokens(self.summary)
+
+    def stats(self) -> Dict:
+        return {
+            "summarized_turns": self.summarized_turns,
+            "verbatim_turns": len(self.history) - self.summarized_turns,
+            "tokens_saved": self.tokens_saved
+        }
+
+    def to_snapshot(self) -> Dict:
+        return {
+            "summary": self.summary,
+            "summarized_turns": self.summarized_turns,
+            "folded_tokens": self.folded_tokens
+        }
+
+    def restore(self, snapshot: Dict):
+        self.summary = snapshot["summary"]
+        self.summarized_turns = snapshot["summarized_turns"]
+        self.folded_tokens = snapshot["folded_tokens"]
+
+    def messages(self) -> List[Dict]:
+        """The rolling summary, if any, followed by every turn not yet folded into it"""
+        messages = []
+        if self.summary is not None:
+            messages.append({"role": "user", "content": SUMMARY_MESSAGE.format(summary=self.summary)})
+            messages.append({"role": "assistant", "content": SUMMARY_ACKNOWLEDGEMENT})
+        for entry in self.history[self.summarized_turns:]:
+            messages.append({"role": "user", "content": entry[self.user_key]})
+            messages.append({"role": "assistant", "content": entry[self.assistant_key]})
+        return messages
+
+    def prompt_state(self, game_state: GameState) -> PromptState:
+        """State for the next turn's message: a diff against the state the previous turn carried.
+
+        History entries record the turn their state was taken at and whether it
+        was full. A full state is sent again once ``keep_recent`` turns have
+        passed since the last one, so compaction, which always leaves that many
+        turns verbatim, never folds away the state the diffs build on.
+        """
+        verbatim = self.history[self.summarized_turns:]
+        since_full = next((age for age, entry in enumerate(reversed(verbatim)) if entry.get("full_state")), None)
+        if since_full is None or since_full + 1 >= self.keep_recent or "state_turn" not in verbatim[-1]:
+            return PromptState(game_state.to_json(), game_state.turn_number, True)
+        diff = game_state.diff_since(verbatim[-1]["state_turn"])
+        return PromptState(json.dumps(diff, separators=(",", ":")), game_state.turn_number, False)
+
+    def schedule(self):
+        """Start folding older turns into the summary if the verbatim part is over budget"""
+        if self._task is not None and not self._task.done():
+            return
+        verbatim = self.history[self.summarized_turns:]
+        if len(verbatim) <= self.keep_recent:
+            return
+        if sum(self._turn_tokens(entry) for entry in verbatim) <= self.token_budget:
+            return
+        # Fold down to half the budget so compaction runs every few turns, not every turn
+        keep, kept_tokens = 0, 0
+        for entry in reversed(verbatim):
+            kept_tokens += self._turn_tokens(entry)
+            if keep >= self.keep_recent and kept_tokens > self.token_budget // 2:
+                break
+            keep += 1
+        fold = verbatim[:len(verbatim) - keep]
+        if not fold:
+            return
+        self._task = asyncio.ensure_future(self._compact(fold))
+
+    async def _compact(self, fold: List[Dict]):
+        turns = "\n\n".join(
+            f"User:\n{entry[self.user_key]}\n\nAssistant:\n{entry[self.assistant_key]}" for entry in fold
+        )
+        prompt = SUMMARY_PROMPT.format(
+            role=self.role,
+            summary=self.summary or "(none yet)",
+            turns=turns
+        )
+        try:
+            summary, _ = await get_model_router().run("summary", lambda model, max_tokens: self.llm.complete(
+                messages=[{"role": "user", "content": prompt}],
+                model=model,
+                max_tokens=max_tokens,
+                priority=Priority.BULK
+            ))
+        except Exception as e:
+            logger.error("Context compaction for %s failed: %s", self.role, e)
+            return
+        self.folded_tokens += sum(self._turn_tokens(entry) for entry in fold)
+        self.summary = summary
+        self.summarized_turns += len(fold)
+        logger.info("Compacted %s context: %d turns summarized, ~%d tokens saved per request",
+                    self.role, self.summarized_turns, self.tokens_saved)
+
+    def _turn_tokens(self, entry: Dict) -> int:
+        return estimate_tokens(entry[self.user_key]) + estimate_tokens(entry[self.assistant_key])
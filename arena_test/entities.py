@@ -0,0 +1,240 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+# Side of a spatial hash bucket in arena cells
+SPATIAL_CELL_SIZE = 8
+
+INITIAL_CAPACITY = 16
+
+# Largest HP or position delta applied at once; anything beyond is clamped so the
+# int64 columns can neither reject nor wrap around a huge model-supplied value
+MAX_DELTA = 2 ** 31
+
+class SpatialHash:
+    """Buckets entity ids by position for proximity and collision queries"""
+
+    def __init__(self, cell_size: int = SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self._buckets: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+
+    def _key(self, position: Tuple[int, int]) -> Tuple[int, int]:
+        return position[0] // self.cell_size, position[1] // self.cell_size
+
+    def insert(self, entity_id: str, position: Tuple[int, int]):
+        self._buckets[self._key(position)].add(entity_id)
+
+    def move(self, entity_id: str, old: Tuple[int, int], new: Tuple[int, int]):
+        old_key, new_key = self._key(old), self._key(new)
+        if old_key != new_key:
+            bucket = self._buckets[old_key]
+            bucket.discard(entity_id)
+            if not bucket:
+                del self._buckets[old_key]
+            self._buckets[new_key].add(entity_id)
+
+    def candidates(self, position: Tuple[int, int], radius: int) -> Iterable[str]:
+        """Ids in every bucket that overlaps the square of the given radius"""
+        low_x, low_y = self._key((position[0] - radius, position[1] - radius))
+        high_x, high_y = self._key((position[0] + radius, position[1] + radius))
+        for x in range(low_x, high_x + 1):
+            for y in range(low_y, high_y + 1):
+                yield from self._buckets.get((x, y), ())
+
+class EntityView:
+    """Live view of one entity's row; reads and writes go to the table columns"""
+
+    def __init__(self, table: "EntityTable", row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def entity_id(self) -> str:
+        return self._table.ids[self._row]
+
+    @property
+    def name(self) -> str:
+        return self._table.names[self._row]
+
+    @property
+    def hp(self) -> int:
+        return int(self._table.hp[self._row])
+
+    @hp.setter
+    def hp(self, value: int):
+        self._table.hp[self._row] = value
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        x, y = self._table.positions[self._row]
+        return int(x), int(y)
+
+    @position.setter
+    def position(self, value: Tuple[int, int]):
+        self._table.move(self._row, value)
+
+    @property
+    def custom_stats(self) -> Dict:
+        return self._table.stats[self._row]
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "hp": self.hp,
+            "position": list(self.position),
+            "custom_stats": dict(self.custom_stats)
+        }
+
+    def to_compact_dict(self) -> Dict:
+        return {
+            "n": self.name,
+            "hp": self.hp,
+            "p": list(self.position),
+            "s": dict(self.custom_stats)
+        }
+
+class EntityTable:
+    """Column storage for any number of combatants.
+
+    HP and positions are NumPy columns indexed by row; free-form custom stats
+    stay as one dict per row. A spatial hash tracks positions for proximity and
+    collision queries.
+    """
+
+    def __init__(self, width: int, height: int, capacity: int = INITIAL_CAPACITY):
+        self.width = width
+        self.height = height
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.stats: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._hp = np.zeros(capacity, dtype=np.int64)
+        self._positions = np.zeros((capacity, 2), dtype=np.int64)
+        self._bounds = np.array([width - 1, height - 1], dtype=np.int64)
+        self.spatial = SpatialHash()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._rows
+
+    @property
+    def hp(self) -> np.ndarray:
+        return self._hp[:len(self.ids)]
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._positions[:len(self.ids)]
+
+    def add(self, entity_id: str, name: str, hp: int, position: Tuple[int, int],
+            custom_stats: Optional[Dict] = None) -> EntityView:
+        if entity_id in self._rows:
+            raise ValueError(f"Entity already exists: {entity_id}")
+        row = len(self.ids)
+        if row == len(self._hp):
+            self._hp = np.resize(self._hp, row * 2)
+            self._positions = np.resize(self._positions, (row * 2, 2))
+        self.ids.append(entity_id)
+        self.names.append(name)
+        self.stats.append(dict(custom_stats or {}))
+        self._rows[entity_id] = row
+        self._hp[row] = hp
+        self._positions[row] = np.clip(position, 0, self._bounds)
+        self.spatial.insert(entity_id, self.view(row).position)
+        return self.view(row)
+
+    def view(self, row: int) -> EntityView:
+        return EntityView(self, row)
+
+    def get(self, entity_id: str) -> EntityView:
+        return EntityView(self, self._rows[entity_id])
+
+    def row(self, entity_id: str) -> int:
+        return self._rows[entity_id]
+
+    def move(self, row: int, position: Tuple[int, int]):
+        old = tuple(int(v) for v in self._positions[row])
+        self._positions[row] = np.clip(position, 0, self._bounds)
+        self.spatial.move(self.ids[row], old, tuple(int(v) for v in self._positions[row]))
+
+    def alive(self) -> List[str]:
+        return [self.ids[row] for row in np.flatnonzero(self.hp > 0)]
+
+    def near(self, position: Tuple[int, int], radius: int) -> List[str]:
+        """Ids within a Chebyshev distance of a position, nearest first"""
+        target = np.array(position)
+        found = []
+        for entity_id in self.spatial.candidates(position, radius):
+            distance = int(np.max(np.abs(self._positions[self._rows[entity_id]] - target)))
+            if distance <= radius:
+                found.append((distance, entity_id))
+        return [entity_id for _, entity_id in sorted(found)]
+
+    def at(self, position: Tuple[int, int]) -> List[str]:
+        """Ids occupying exactly this cell"""
+        return self.near(position, 0)
+
+    def collisions(self) -> List[List[str]]:
+        """Groups of entities sharing a cell"""
+        occupied: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+        for entity_id, (x, y) in zip(self.ids, self.positions.tolist()):
+            occupied[(x, y)].append(entity_id)
+        return [group for group in occupied.values() if len(group) > 1]
+
+    def apply_updates(self, updates: Dict) -> Set[str]:
+        """Apply every entity's HP, position and stat deltas and return the ids that changed.
+
+        HP and position deltas are applied and clamped in one vectorized pass
+        per column. Ids that are not in the table are ignored.
+        """
+        changed: Set[str] = set()
+
+        rows, deltas = self._resolve(updates.get('hp_changes'))
+        if len(rows):
+            old = self._hp[rows]
+            new = np.maximum(0, old + deltas)
+            self._hp[rows] = new
+            changed.update(self.ids[row] for row in rows[new != old])
+
+        rows, deltas = self._resolve(updates.get('position_changes'))
+        if len(rows):
+            old = self._positions[rows]
+            new = np.clip(old + deltas.reshape(-1, 2), 0, self._bounds)
+            self._positions[rows] = new
+            moved = np.any(new != old, axis=1)
+            changed.update(self.ids[row] for row in rows[moved])
+            # Only entities that crossed into another bucket touch the spatial hash
+            cell_size = self.spatial.cell_size
+            rebucket = np.flatnonzero(np.any(old // cell_size != new // cell_size, axis=1))
+            for index in rebucket.tolist():
+                self.spatial.move(self.ids[rows[index]], tuple(old[index].tolist()), tuple(new[index].tolist()))
+
+        for entity_id, stats in (updates.get('custom_stat_changes') or {}).items():
+            row = self._rows.get(entity_id)
+            if row is None:
+                continue
+            target = self.stats[row]
+            if any(target.get(name) != value for name, value in stats.items()):
+                target.update(stats)
+                changed.add(entity_id)
+
+        return changed
+
+    def _resolve(self, changes: Optional[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and stacked deltas for the known ids in a per-entity change map"""
+        if not changes:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        known = [(self._rows[entity_id], delta) for entity_id, delta in changes.items() if entity_id in self._rows]
+        if not known:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64)
+        rows, deltas = zip(*known)
+        try:
+            array = np.array(deltas, dtype=np.int64)
+        except OverflowError:
+            # Beyond int64: clamp the Python ints before converting
+            array = np.array(deltas, dtype=object).clip(-MAX_DELTA, MAX_DELTA).astype(np.int64)
+        # In place through the ufuncs: np.clip costs several times more on these tiny arrays
+        np.minimum(array, MAX_DELTA, out=array)
+        np.maximum(array, -MAX_DELTA, out=array)
+        return np.array(rows, dtype=np.intp), array
@@ -0,0 +1,109 @@
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import concurrent.futures
+import json
+import sqlite3
+import threading
+import time
+from .config import get_game_store_settings
+
+class EventStore:
+    """Append-only game events with periodic snapshots, stored in SQLite (WAL mode).
+
+    Every change to a game is appended as a numbered event. A snapshot holds
+    the full game at one event number, so a game is restored from its latest
+    snapshot plus the events recorded after it. Writers on an event loop hand
+    their calls to ``submit``, which runs them on one worker thread in order.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-store")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS games ("
+            "game_id TEXT PRIMARY KEY, meta TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS events ("
+            "game_id TEXT NOT NULL, seq INTEGER NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (game_id, seq));"
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "game_id TEXT NOT NULL, seq INTEGER NOT NULL, state TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (game_id, seq));"
+        )
+        self._conn.commit()
+
+    def create_game(self, game_id: str, meta: Dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO games (game_id, meta, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (game_id, json.dumps(meta), now, now)
+            )
+            self._conn.commit()
+
+    def get_meta(self, game_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT meta FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_games(self) -> List[Tuple[str, float]]:
+        """Game ids with their last update time, most recent first"""
+        with self._lock:
+            return self._conn.execute("SELECT game_id, updated_at FROM games ORDER BY updated_at DESC").fetchall()
+
+    def submit(self, fn: Callable, *args) -> concurrent.futures.Future:
+        """Run a store call on the writer thread; calls run one at a time, in submission order"""
+        return self._writer.submit(fn, *args)
+
+    def append(self, game_id: str, seq: int, kind: str, payload: Dict):
+        """Record event number ``seq``; the game's owner numbers its events from 1"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (game_id, seq, kind, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (game_id, seq, kind, json.dumps(payload, separators=(",", ":")), now)
+            )
+            self._conn.execute("UPDATE games SET updated_at = ? WHERE game_id = ?", (now, game_id))
+            self._conn.commit()
+
+    def events_after(self, game_id: str, seq: int) -> Iterator[Tuple[int, str, Dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, kind, payload FROM events WHERE game_id = ? AND seq > ? ORDER BY seq",
+                (game_id, seq)
+            ).fetchall()
+        for event_seq, kind, payload in rows:
+            yield event_seq, kind, json.loads(payload)
+
+    def save_snapshot(self, game_id: str, seq: int, state: Dict):
+        """Store the game as of event ``seq``; older snapshots are dropped"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots (game_id, seq, state, created_at) VALUES (?, ?, ?, ?)",
+                (game_id, seq, json.dumps(state, separators=(",", ":")), time.time())
+            )
+            self._conn.execute("DELETE FROM snapshots WHERE game_id = ? AND seq < ?", (game_id, seq))
+            self._conn.commit()
+
+    def latest_snapshot(self, game_id: str) -> Optional[Tuple[int, Dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq, state FROM snapshots WHERE game_id = ? ORDER BY seq DESC LIMIT 1", (game_id,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+_store: Optional[EventStore] = None
+_store_lock = threading.Lock()
+
+def get_event_store() -> Optional[EventStore]:
+    """Return the process-wide event store, or None when persistence is disabled"""
+    global _store
+    path = get_game_store_settings()["path"]
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = EventStore(path)
+    return _store
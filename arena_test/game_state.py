@@ -1,6 +1,27 @@
+from bisect import bisect_left
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple
+from itertools import islice
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
 from enum import Enum
+import copy
+import json
+from .entities import EntityTable, EntityView
+from .snapshots import EntityRecord, PersistentVector, StateSnapshot, freeze_stats
+
+# Number of most recent actions kept as full TurnAction objects
+HISTORY_WINDOW = 50
+
+DEFAULT_ARENA_SIZE = 10
+
+# Explains the short keys of GameState.to_compact_dict; static, so it can live in cached system prompts
+COMPACT_STATE_LEGEND = (
+    "Game state keys: a = player_a, b = player_b, n = name, hp = hit points, "
+    "p = position [x, y], s = custom stats, t = turn number, c = player to move, "
+    "log = latest public summaries, since = turn a state diff starts from, "
+    "size = arena [width, height]; positions run from 0 to size - 1; "
+    "e = any further combatants by id."
+)
 
 class PlayerType(Enum):
     A = "player_a"
@@ -12,9 +33,123 @@ class TurnAction:
     narrative: str
     state_updates: Dict
     turn_number: int
+    
+    def to_summary(self) -> Dict:
+        return {
+            "player": self.player.value,
+            "narrative": self.narrative,
+            "turn_number": self.turn_number
+        }
+
+class ActionHistory:
+    """Windowed action log: recent turns in a ring buffer, older turns in a compact archive.
+
+    Recent actions are indexed by player and by turn number, and their summary
+    dicts are built once on append, so recent-action views cost O(window)
+    regardless of game length. Archived turns are kept as
+    ``(turn_number, player, narrative, updates_json)`` tuples; that is far
+    smaller than live objects, but the archive still grows with the game and
+    is part of every snapshot.
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW):
+        self.window = window
+        self._recent: Deque[TurnAction] = deque()
+        self._summaries: Deque[Dict] = deque()
+        self._by_turn: Dict[int, TurnAction] = {}
+        self._by_player: Dict[PlayerType, Deque[TurnAction]] = {player: deque() for player in PlayerType}
+        self.archive: List[Tuple[int, str, str, str]] = []
+
+    def append(self, action: TurnAction):
+        self._recent.append(action)
+        self._summaries.append(action.to_summary())
+        self._by_turn[action.turn_number] = action
+        self._by_player[action.player].append(action)
+        if len(self._recent) > self.window:
+            self._spill()
+
+    def _spill(self):
+        oldest = self._recent.popleft()
+        self._summaries.popleft()
+        del self._by_turn[oldest.turn_number]
+        self._by_player[oldest.player].popleft()
+        self.archive.append(self._to_archive(oldest))
+
+    def to_snapshot(self) -> List[Tuple[int, str, str, str]]:
+        """Every action as an archive tuple, oldest first"""
+        return self.archive + [self._to_archive(action) for action in self._recent]
+
+    @classmethod
+    def from_snapshot(cls, entries: List, window: int = HISTORY_WINDOW) -> "ActionHistory":
+        history = cls(window)
+        split = max(0, len(entries) - window)
+        history.archive = [tuple(entry) for entry in entries[:split]]
+        for entry in entries[split:]:
+            history.append(cls._from_archive(entry))
+        return history
+
+    def __len__(self) -> int:
+        return len(self.archive) + len(self._recent)
+
+    def __iter__(self) -> Iterator[TurnAction]:
+        """Every action in turn order, rehydrating archived turns"""
+        for entry in self.archive:
+            yield self._from_archive(entry)
+        yield from self._recent
+
+    def recent(self, limit: Optional[int] = None) -> List[TurnAction]:
+        return self._tail(self._recent, limit)
+
+    def recent_summaries(self, limit: Optional[int] = None) -> List[Dict]:
+        return self._tail(self._summaries, limit)
+
+    def summaries_since(self, turn_number: int) -> List[Dict]:
+        """Summaries of every action from ``turn_number`` on, oldest first"""
+        # Turn numbers are consecutive, so the first wanted action's offset is a subtraction
+        if self._recent and turn_number >= self._recent[0].turn_number:
+            return list(islice(self._summaries, turn_number - self._recent[0].turn_number, None))
+        index = bisect_left(self.archive, (turn_number,))
+        return [self._from_archive(entry).to_summary() for entry in self.archive[index:]] + list(self._summaries)
+
+    def by_player(self, player: PlayerType, limit: Optional[int] = None) -> List[TurnAction]:
+        return self._tail(self._by_player[player], limit)
+
+    def get(self, turn_number: int) -> Optional[TurnAction]:
+        if turn_number in self._by_turn:
+            return self._by_turn[turn_number]
+        index = bisect_left(self.archive, (turn_number,))
+        if index < len(self.archive) and self.archive[index][0] == turn_number:
+            return self._from_archive(self.archive[index])
+        return None
+
+    @staticmethod
+    def _tail(items: Deque, limit: Optional[int]) -> List:
+        if limit is None or limit >= len(items):
+            return list(items)
+        return list(islice(items, len(items) - limit, None))
+
+    @staticmethod
+    def _to_archive(action: TurnAction) -> Tuple[int, str, str, str]:
+        return (
+            action.turn_number,
+            action.player.value,
+            action.narrative,
+            json.dumps(action.state_updates, separators=(",", ":"))
+        )
+
+    @staticmethod
+    def _from_archive(entry: Tuple[int, str, str, str]) -> TurnAction:
+        turn_number, player, narrative, updates = entry
+        return TurnAction(
+            player=PlayerType(player),
+            narrative=narrative,
+            state_updates=json.loads(updates),
+            turn_number=turn_number
+        )
 
 @dataclass
 class PlayerState:
+    """Starting stats for a combatant; live state is read through GameState views"""
     name: str
     hp: int
     position: tuple[int, int]
@@ -25,49 +160,217 @@ class PlayerState:
             "name": self.name,
             "hp": self.hp,
             "position": list(self.position),
-            "custom_stats": self.custom_stats
+            "custom_stats": dict(self.custom_stats)
+        }
+    
+    def to_compact_dict(self) -> Dict:
+        return {
+            "n": self.name,
+            "hp": self.hp,
+            "p": list(self.position),
+            "s": dict(self.custom_stats)
         }
 
 class GameState:
-    def __init__(self):
-        self.player_a = PlayerState("Player A", 100, (3, 4))
-        self.player_b = PlayerState("Player B", 100, (7, 4))
+    def __init__(self, width: int = DEFAULT_ARENA_SIZE, height: int = DEFAULT_ARENA_SIZE):
+        self.width = width
+        self.height = height
+        self.entities = EntityTable(width, height)
         self.turn_number = 0
         self.current_player: PlayerType = None
-        self.action_history: List[TurnAction] = []
+        self.action_history = ActionHistory()
         self.public_narrative: List[str] = []
+        # Turn at which each field last changed, the turn each summary was added,
+        # and serialized forms valid until the next mutation
+        self._changed_at: Dict[str, int] = {}
+        self._narrative_turns: List[int] = []
+        self._cache: Dict[str, object] = {}
+        # Latest immutable snapshot and the entities changed since, so the next
+        # snapshot only rebuilds their records
+        self._last_snapshot: Optional[StateSnapshot] = None
+        self._stale_entities: Set[str] = set()
+        # Same starting spots as the original 10x10 arena, scaled to the map
+        self.add_entity("player_a", PlayerState("Player A", 100, (width * 3 // 10, height * 4 // 10)))
+        self.add_entity("player_b", PlayerState("Player B", 100, (width * 7 // 10, height * 4 // 10)))
     
-    def to_dict(self) -> Dict:
+    @property
+    def player_a(self) -> EntityView:
+        return self.entities.get("player_a")
+    
+    @property
+    def player_b(self) -> EntityView:
+        return self.entities.get("player_b")
+    
+    def add_entity(self, entity_id: str, state: PlayerState) -> EntityView:
+        """Add a combatant; ids other than player_a and player_b are serialized under e"""
+        view = self.entities.add(entity_id, state.name, state.hp, state.position, state.custom_stats)
+        self._mark_dirty(entity_id)
+        return view
+    
+    def _others(self) -> List[str]:
+        return self.entities.ids[2:]
+    
+    def to_snapshot(self) -> Dict:
+        """Everything needed to rebuild this state exactly, as plain JSON types"""
         return {
-            "player_a": self.player_a.to_dict(),
-            "player_b": self.player_b.to_dict(),
+            "width": self.width,
+            "height": self.height,
+            "entities": [
+                {"id": entity_id, **self.entities.get(entity_id).to_dict()} for entity_id in self.entities.ids
+            ],
             "turn_number": self.turn_number,
             "current_player": self.current_player.value if self.current_player else None,
-            "public_narrative": self.public_narrative
+            "public_narrative": list(self.public_narrative),
+            "narrative_turns": list(self._narrative_turns),
+            "changed_at": dict(self._changed_at),
+            "actions": self.action_history.to_snapshot()
         }
+    
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> "GameState":
+        game_state = cls(snapshot["width"], snapshot["height"])
+        game_state.entities = EntityTable(game_state.width, game_state.height)
+        for entity in snapshot["entities"]:
+            game_state.entities.add(
+                entity["id"], entity["name"], entity["hp"], tuple(entity["position"]), entity["custom_stats"]
+            )
+        game_state.turn_number = snapshot["turn_number"]
+        if snapshot["current_player"]:
+            game_state.current_player = PlayerType(snapshot["current_player"])
+        game_state.public_narrative = list(snapshot["public_narrative"])
+        game_state._narrative_turns = list(snapshot["narrative_turns"])
+        game_state._changed_at = dict(snapshot["changed_at"])
+        game_state.action_history = ActionHistory.from_snapshot(snapshot["actions"])
+        game_state._stale_entities = set(game_state.entities.ids)
+        game_state._cache.clear()
+        return game_state
+    
+    def snapshot(self) -> StateSnapshot:
+        """Immutable view of the current state; unchanged entity records are shared with the previous one"""
+        if "snapshot" not in self._cache:
+            base = self._last_snapshot.entities if self._last_snapshot else PersistentVector()
+            records = {}
+            for entity_id in self._stale_entities:
+                view = self.entities.get(entity_id)
+                records[self.entities.row(entity_id)] = EntityRecord(
+                    entity_id, view.name, view.hp, view.position,
+                    freeze_stats(view.custom_stats), self._changed_at[entity_id]
+                )
+            self._stale_entities.clear()
+            self._last_snapshot = StateSnapshot(
+                width=self.width,
+                height=self.height,
+                turn_number=self.turn_number,
+                current_player=self.current_player.value if self.current_player else None,
+                entities=base.set_many(records),
+                narrative_log=self.public_narrative,
+                narrative_turns=self._narrative_turns,
+                narrative_count=len(self.public_narrative),
+                action_history=self.action_history,
+                action_count=len(self.action_history)
+            )
+            self._cache["snapshot"] = self._last_snapshot
+        return self._cache["snapshot"]
+    
+    def fork(self, snapshot: Optional[StateSnapshot] = None) -> "GameState":
+        """Independent game starting from a snapshot of this one (by default the current state)"""
+        snapshot = snapshot or self.snapshot()
+        game_state = GameState(snapshot.width, snapshot.height)
+        game_state.entities = EntityTable(snapshot.width, snapshot.height)
+        for record in snapshot.entities:
+            game_state.entities.add(
+                record.entity_id, record.name, record.hp, record.position,
+                copy.deepcopy(dict(record.custom_stats))
+            )
+        game_state._changed_at = {record.entity_id: record.changed_at for record in snapshot.entities}
+        game_state.turn_number = snapshot.turn_number
+        if snapshot.current_player:
+            game_state.current_player = PlayerType(snapshot.current_player)
+        game_state.public_narrative = snapshot.narratives
+        game_state._narrative_turns = snapshot.narrative_turns[:snapshot.narrative_count]
+        game_state.action_history = ActionHistory.from_snapshot(
+            snapshot.action_history.to_snapshot()[:snapshot.action_count],
+            snapshot.action_history.window
+        )
+        # The fork keeps sharing entity records with the snapshot it started from
+        game_state._last_snapshot = snapshot
+        game_state._stale_entities = set()
+        game_state._cache.clear()
+        return game_state
+    
+    def _mark_dirty(self, *fields: str):
+        for name in fields:
+            self._changed_at[name] = self.turn_number
+        self._stale_entities.update(fields)
+        self._cache.clear()
+    
+    def to_dict(self) -> Dict:
+        """Full state; the returned dict is cached until the next mutation and must not be modified"""
+        if "dict" not in self._cache:
+            self._cache["dict"] = {
+                **{entity_id: self.entities.get(entity_id).to_dict() for entity_id in self.entities.ids},
+                "turn_number": self.turn_number,
+                "current_player": self.current_player.value if self.current_player else None,
+                "public_narrative": list(self.public_narrative),
+                "arena": {"width": self.width, "height": self.height}
+            }
+        return self._cache["dict"]
+    
+    def to_compact_dict(self, narrative_limit: int = 1) -> Dict:
+        """Short-keyed state with only the latest public summaries (see COMPACT_STATE_LEGEND)"""
+        compact = {
+            "a": self.player_a.to_compact_dict(),
+            "b": self.player_b.to_compact_dict(),
+            "t": self.turn_number,
+            "c": self.current_player.value if self.current_player else None,
+            "size": [self.width, self.height]
+        }
+        if len(self.entities) > 2:
+            compact["e"] = {entity_id: self.entities.get(entity_id).to_compact_dict() for entity_id in self._others()}
+        if narrative_limit and self.public_narrative:
+            compact["log"] = self.public_narrative[-narrative_limit:]
+        return compact
+    
+    def to_json(self, compact: bool = True) -> str:
+        """Serialized state for prompts, cached until the next mutation"""
+        key = "compact_json" if compact else "json"
+        if key not in self._cache:
+            if compact:
+                self._cache[key] = json.dumps(self.to_compact_dict(), separators=(",", ":"))
+            else:
+                self._cache[key] = json.dumps(self.to_dict(), indent=2)
+        return self._cache[key]
+    
+    def diff_since(self, turn_number: int) -> Dict:
+        """Compact encoding of only what changed at or after the given turn"""
+        diff = {
+            "since": turn_number,
+            "t": self.turn_number,
+            "c": self.current_player.value if self.current_player else None
+        }
+        if self._changed_at["player_a"] >= turn_number:
+            diff["a"] = self.player_a.to_compact_dict()
+        if self._changed_at["player_b"] >= turn_number:
+            diff["b"] = self.player_b.to_compact_dict()
+        others = {entity_id: self.entities.get(entity_id).to_compact_dict()
+                  for entity_id in self._others() if self._changed_at[entity_id] >= turn_number}
+        if others:
+            diff["e"] = others
+        first_new = bisect_left(self._narrative_turns, turn_number)
+        if first_new < len(self.public_narrative):
+            diff["log"] = self.public_narrative[first_new:]
+        return diff
+    
+    def add_narrative(self, summary: str):
+        """Append a public narrative summary"""
+        self.public_narrative.append(summary)
+        self._narrative_turns.append(self.turn_number)
+        self._mark_dirty()
 
     def update_state(self, updates: Dict, player: PlayerType, narrative: str):
-        # Handle HP changes
-        if 'hp_changes' in updates:
-            for player_id, change in updates['hp_changes'].items():
-                target = self.player_a if player_id == "player_a" else self.player_b
-                target.hp = max(0, target.hp + change)
-        
-        # Handle position changes
-        if 'position_changes' in updates:
-            for player_id, change in updates['position_changes'].items():
-                target = self.player_a if player_id == "player_a" else self.player_b
-                dx, dy = change
-                current_x, current_y = target.position
-                new_x = max(0, min(9, current_x + dx))
-                new_y = max(0, min(9, current_y + dy))
-                target.position = (new_x, new_y)
-        
-        # Handle custom stat changes
-        if 'custom_stat_changes' in updates:
-            for player_id, stats in updates['custom_stat_changes'].items():
-                target = self.player_a if player_id == "player_a" else self.player_b
-                target.custom_stats.update(stats)
+        # HP and position deltas for every combatant are clamped and applied in one pass
+        changed = self.entities.apply_updates(updates)
+        self._mark_dirty(*changed)
         
         # Record the action
         self.action_history.append(TurnAction(
@@ -80,14 +383,17 @@ class GameState:
         self.turn_number += 1
         self.current_player = PlayerType.B if player == PlayerType.A else PlayerType.A
 
-    def get_recent_actions(self) -> List[Dict]:
-        """Returns recent actions"""
-        actions = []
-        for action in self.action_history:
-            action_dict = {
-                "player": action.player.value,
-                "narrative": action.narrative,
-                "turn_number": action.turn_number
-            }
-            actions.append(action_dict)
-        return actions
\ No newline at end of file
+    def get_recent_actions(self, limit: Optional[int] = None) -> List[Dict]:
+        """Returns summaries of the most recent actions, at most the history window"""
+        return self.action_history.recent_summaries(limit)
+    
+    def get_actions_since(self, turn_number: int) -> List[Dict]:
+        """Summaries of the actions taken at or after the given turn"""
+        return self.action_history.summaries_since(turn_number)
+    
+    def format_recent_actions(self, limit: Optional[int] = None) -> str:
+        """Compact one-line-per-action text of the most recent actions"""
+        return "\n".join(
+            f"Turn {action['turn_number']} ({action['player']}): {action['narrative']}"
+            for action in self.get_recent_actions(limit)
+        )
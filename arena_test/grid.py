@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+from .game_state import GameState
+
+# Viewport limits in cells; larger arenas only render the part around the players
+MIN_VIEWPORT = 10
+MAX_VIEWPORT = 40
+VIEWPORT_MARGIN = 3
+
+# Pixel budget for the grid; cells shrink as the viewport grows
+GRID_PIXELS = 400
+MIN_CELL_PIXELS = 10
+
+# Static stylesheet shared by every render; per-grid sizes come from CSS variables.
+# Grid lines are a background pattern, so only labels and players are elements.
+GRID_CSS = """
+<style>
+    .arena {
+        display: grid;
+        grid-template-columns: 28px repeat(var(--cols), var(--cell));
+        grid-template-rows: 18px repeat(var(--rows), var(--cell));
+        width: max-content;
+        background-color: #f0f0f0;
+        padding: 10px;
+        border-radius: 8px;
+        margin: 0 auto;
+    }
+    .cells {
+        grid-column: 2 / span var(--cols);
+        grid-row: 2 / span var(--rows);
+        background-color: white;
+        background-image: linear-gradient(to right, #ddd 1px, transparent 1px),
+                          linear-gradient(to bottom, #ddd 1px, transparent 1px);
+        background-size: var(--cell) var(--cell);
+        border-right: 1px solid #ddd;
+        border-bottom: 1px solid #ddd;
+    }
+    .label, .marker {
+        display: flex;
+        align-items: center;
+        justify-content: center;
+    }
+    .label {
+        color: #aaa;
+        font-size: 10px;
+        font-family: monospace;
+    }
+    .marker {
+        font-size: calc(var(--cell) * 0.5);
+        z-index: 1;
+    }
+    .off-view {
+        text-align: center;
+        color: #888;
+        font-size: 12px;
+        font-family: monospace;
+        margin-top: 4px;
+    }
+</style>
+"""
+
+@dataclass(frozen=True)
+class Viewport:
+    x: int
+    y: int
+    cols: int
+    rows: int
+
+    @property
+    def cell_pixels(self) -> int:
+        return max(MIN_CELL_PIXELS, GRID_PIXELS // max(self.cols, self.rows))
+
+    @property
+    def pixel_height(self) -> int:
+        """Height for the components.html frame, including labels and padding"""
+        return self.rows * self.cell_pixels + 80
+
+    def contains(self, position: Tuple[int, int]) -> bool:
+        return self.x <= position[0] < self.x + self.cols and self.y <= position[1] < self.y + self.rows
+
+def _axis(a: int, b: int, limit: int) -> Tuple[int, int]:
+    """Start and length of a window on one axis around a and b, centred on a if both do not fit"""
+    low, high = min(a, b), max(a, b)
+    length = min(limit, max(MIN_VIEWPORT, min(MAX_VIEWPORT, high - low + 1 + 2 * VIEWPORT_MARGIN)))
+    centre = (low + high + 1) // 2 if high - low < length else a
+    return max(0, min(limit - length, centre - length // 2)), length
+
+def get_viewport(game_state: GameState) -> Viewport:
+    """Window of the arena around both players; the whole arena when it is small"""
+    a_x, a_y = game_state.player_a.position
+    b_x, b_y = game_state.player_b.position
+    x, cols = _axis(a_x, b_x, game_state.width)
+    y, rows = _axis(a_y, b_y, game_state.height)
+    return Viewport(x, y, cols, rows)
+
+def build_grid_html(game_state: GameState, viewport: Optional[Viewport] = None) -> str:
+    """HTML for the arena viewport with both players marked"""
+    viewport = viewport or get_viewport(game_state)
+    return _render(viewport, game_state.player_a.position, game_state.player_b.position)
+
+@lru_cache(maxsize=64)
+def _render(viewport: Viewport, player_a_pos: Tuple[int, int], player_b_pos: Tuple[int, int]) -> str:
+    # Identical arguments give an identical string, so Streamlit keeps the existing frame
+    # instead of reloading it when nothing on the grid moved
+    cell = viewport.cell_pixels
+    label_every = 1 if cell >= 24 else 5
+    parts = [
+        GRID_CSS,
+        f'<div class="arena" style="--cols:{viewport.cols};--rows:{viewport.rows};--cell:{cell}px">',
+        '<div class="cells"></div>'
+    ]
+    for column in range(viewport.cols):
+        x = viewport.x + column
+        if x % label_every == 0:
+            parts.append(f'<div class="label" style="grid-area:1/{column + 2}">{x}</div>')
+    for row in range(viewport.rows):
+        y = viewport.y + row
+        if y % label_every == 0:
+            parts.append(f'<div class="label" style="grid-area:{row + 2}/1">{y}</div>')
+
+    off_view = []
+    for marker, name, position in (("🔵", "Player A", player_a_pos), ("🔴", "Player B", player_b_pos)):
+        if viewport.contains(position):
+            row, column = position[1] - viewport.y + 2, position[0] - viewport.x + 2
+            parts.append(f'<div class="marker" style="grid-area:{row}/{column}">{marker}</div>')
+        else:
+            off_view.append(f"{marker} {name} at {position[0]},{position[1]}")
+    parts.append("</div>")
+
+    if off_view:
+        parts.append(f'<div class="off-view">Outside the view: {"; ".join(off_view)}</div>')
+    return "".join(parts)
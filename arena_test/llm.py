@@ -0,0 +1,412 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+from .arena_logging import get_logger
+from .config import get_llm_pool_settings, get_response_cache_settings
+from .response_cache import CacheMiss, CacheMode, ResponseCache, make_cache_key
+from .scheduler import (Priority, RequestScheduler, Reservation, estimate_tokens, get_scheduler,
+                        mark_first_output)
+
+if TYPE_CHECKING:
+    # The SDK and httpx take hundreds of milliseconds to import, so they are loaded
+    # when the first client is created rather than with this module
+    from anthropic import AsyncAnthropic
+
+# Connection and concurrency limits shared by every agent in the process
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+MAX_CONCURRENT_REQUESTS = 8
+KEEPALIVE_EXPIRY = 30.0
+
+# Consecutive failed requests after which a client's connections are torn down and reopened
+RECYCLE_AFTER_FAILURES = 3
+
+# Size of the text chunks a cached response is replayed in
+REPLAY_CHUNK_SIZE = 16
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Status codes worth retrying: timeout, conflict, rate limit, server errors and overload
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def cached_system(text: str) -> List[Dict]:
+    """Wrap static instructions as a system block marked for prompt caching"""
+    return [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]
+
+
+def cached_user_message(text: str) -> Dict:
+    """Build the newest user message with a cache breakpoint so the next turn reuses it"""
+    return {"role": "user", "content": [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]}
+
+
+logger = get_logger("llm")
+
+
+def retry_delay(error: Exception) -> Optional[float]:
+    """Delay the API asked for before a retry (0 if it gave none), or None if the error is final"""
+    from anthropic import APIConnectionError, APIStatusError
+    if isinstance(error, APIConnectionError):
+        return 0.0
+    if not isinstance(error, APIStatusError) or error.status_code not in RETRYABLE_STATUS:
+        return None
+    try:
+        return max(0.0, float(error.response.headers.get("retry-after", 0)))
+    except ValueError:
+        return 0.0
+
+
+def not_given() -> Any:
+    """The SDK's marker for an omitted argument"""
+    from anthropic import NOT_GIVEN
+    return NOT_GIVEN
+
+
+def input_usage(usage: Any) -> Optional[int]:
+    """Prompt tokens of a response, counting cache writes and reads"""
+    if usage is None:
+        return None
+    return sum(getattr(usage, name, None) or 0
+               for name in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"))
+
+
+@dataclass
+class ClientHealth:
+    """Request outcomes for one pooled client"""
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    recycles: int = 0
+    last_latency: Optional[float] = None
+    last_error: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.consecutive_failures < RECYCLE_AFTER_FAILURES
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "healthy": self.healthy}
+
+
+def is_usable_tool_input(text: str, validate: Optional[Callable[[Any], List[str]]]) -> bool:
+    """Whether a complete tool input parses as JSON that ``validate`` accepts"""
+    if validate is None:
+        return True
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return False
+    return not validate(data)
+
+
+def record_stream_usage(event: Any, reservation: Reservation):
+    """Pick up token usage from message_start and message_delta stream events"""
+    if event.type == "message_start":
+        reservation.record_usage(input_usage(getattr(event.message, "usage", None)), None)
+    elif event.type == "message_delta":
+        usage = getattr(event, "usage", None)
+        reservation.record_usage(None, getattr(usage, "output_tokens", None))
+
+
+class LLMClient:
+    """Async Anthropic client with a bounded keep-alive connection pool, request limit and health tracking"""
+
+    def __init__(self, api_key: str, max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY,
+                 cache: Optional[ResponseCache] = None, cache_mode: CacheMode = CacheMode.OFF,
+                 scheduler: Optional[RequestScheduler] = None):
+        self._api_key = api_key
+        self._limits = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry
+        }
+        self.client = self._new_client()
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self.health = ClientHealth()
+        self.cache = cache
+        self.cache_mode = cache_mode if cache else CacheMode.OFF
+        self.scheduler = scheduler or RequestScheduler()
+
+    def _new_client(self) -> "AsyncAnthropic":
+        import httpx
+        from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+        # Retries are left to the scheduler, which knows about every request in the process
+        return AsyncAnthropic(
+            api_key=self._api_key,
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(**self._limits)),
+            max_retries=0
+        )
+
+    @contextlib.asynccontextmanager
+    async def _request(self):
+        """Hold a concurrency slot for one API call and record its outcome"""
+        async with self._semaphore:
+            client = self.client
+            start = time.monotonic()
+            try:
+                yield client
+            except Exception as e:
+                self._record_failure(client, e)
+                raise
+            self.health.requests += 1
+            self.health.consecutive_failures = 0
+            self.health.last_latency = time.monotonic() - start
+
+    async def _call(self, priority: Priority, messages: List[Dict], system: Optional[List[Dict]],
+                    max_tokens: int, send: Callable[["AsyncAnthropic", Reservation], Awaitable[Any]],
+                    can_retry: Optional[Callable[[], bool]] = None) -> Any:
+        """Run one API call once the scheduler admits it, retrying transient failures"""
+        input_tokens = estimate_tokens(json.dumps([system, messages]))
+
+        async def attempt(reservation: Reservation):
+            async with self._request() as client:
+                return await send(client, reservation)
+
+        return await self.scheduler.run(priority, input_tokens, max_tokens, attempt, retry_delay, can_retry)
+
+    def _record_failure(self, client: "AsyncAnthropic", error: Exception):
+        from anthropic import APIStatusError
+        self.health.requests += 1
+        self.health.failures += 1
+        self.health.last_error = f"{type(error).__name__}: {error}"
+        if isinstance(error, APIStatusError) and error.status_code == 429:
+            # Throttling says nothing about the connections; the scheduler backs off instead
+            return
+        self.health.consecutive_failures += 1
+        if not self.health.healthy and client is self.client:
+            # Replace possibly broken keep-alive connections; in-flight calls finish on the old client
+            logger.warning("Recycling LLM client after %d consecutive failures", self.health.consecutive_failures)
+            self.client = self._new_client()
+            self.health.recycles += 1
+            self.health.consecutive_failures = 0
+            asyncio.get_running_loop().call_later(60, lambda: asyncio.ensure_future(client.close()))
+
+    async def close(self):
+        await self.client.close()
+
+    def _cached_response(self, key: str) -> Optional[str]:
+        if self.cache_mode.reads:
+            response = self.cache.get(key)
+            if response is not None:
+                return response
+        if self.cache_mode == CacheMode.REPLAY_ONLY:
+            raise CacheMiss(f"No recorded response for request {key}")
+        return None
+
+    def _record_response(self, key: str, response: str):
+        if self.cache_mode.writes:
+            self.cache.put(key, response)
+
+    async def complete(self, messages: List[Dict], model: str, max_tokens: int,
+                       system: Optional[List[Dict]] = None, priority: Priority = Priority.INTERACTIVE) -> str:
+        """Send a non-streaming request and return the text of the first content block"""
+        key = make_cache_key(model, max_tokens, messages, system)
+        cached = self._cached_response(key)
+        if cached is not None:
+            return cached
+
+        async def send(client: "AsyncAnthropic", reservation: Reservation):
+            response = await client.messages.create(
+                max_tokens=max_tokens,
+                messages=messages,
+                model=model,
+                system=system or not_given()
+            )
+            reservation.record_usage(input_usage(response.usage), response.usage.output_tokens)
+            return response
+
+        response = await self._call(priority, messages, system, max_tokens, send)
+        text = response.content[0].text
+        self._record_response(key, text)
+        return text
+
+    async def stream_tool(self, messages: List[Dict], model: str, max_tokens: int, tool: Dict,
+                          on_json: Callable[[str], None], system: Optional[List[Dict]] = None,
+                          priority: Priority = Priority.INTERACTIVE,
+                          validate: Optional[Callable[[Any], List[str]]] = None) -> str:
+        """Force a call to one tool, calling on_json with each partial JSON delta, and return the full input.
+
+        The input is only cached if the response was not cut off by
+        ``max_tokens`` and, given a ``validate`` function such as one from
+        ``compile_validator``, it passes validation; otherwise a broken input
+        would be replayed on every later run.
+        """
+        key = make_cache_key(model, max_tokens, messages, system, tools=[tool])
+        cached = self._cached_response(key)
+        if cached is not None:
+            # Replay in small chunks so streaming consumers behave as for a live response
+            for start in range(0, len(cached), REPLAY_CHUNK_SIZE):
+                on_json(cached[start:start + REPLAY_CHUNK_SIZE])
+            return cached
+
+        chunks = []
+        stop_reason = None
+
+        async def send(client: "AsyncAnthropic", reservation: Reservation):
+            nonlocal stop_reason
+            stream = await client.messages.create(
+                max_tokens=max_tokens,
+                messages=messages,
+                model=model,
+                system=system or not_given(),
+                tools=[tool],
+                tool_choice={"type": "tool", "name": tool["name"]},
+                stream=True
+            )
+            async for event in stream:
+                if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                    if event.delta.partial_json:
+                        if not chunks:
+                            mark_first_output()
+                        chunks.append(event.delta.partial_json)
+                        on_json(event.delta.partial_json)
+                else:
+                    if event.type == "message_delta":
+                        stop_reason = event.delta.stop_reason
+                    record_stream_usage(event, reservation)
+
+        await self._call(priority, messages, system, max_tokens, send, can_retry=lambda: not chunks)
+        text = "".join(chunks)
+        if stop_reason == "max_tokens":
+            logger.warning("Tool input from %s hit max_tokens (%d); not caching it", model, max_tokens)
+        elif is_usable_tool_input(text, validate):
+            self._record_response(key, text)
+        return text
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when caching is off"""
+    global _response_cache
+    settings = get_response_cache_settings()
+    if CacheMode(settings["mode"]) == CacheMode.OFF:
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            settings["path"],
+            max_bytes=settings["max_bytes"],
+            max_age_seconds=settings["max_age_seconds"]
+        )
+    return _response_cache
+
+
+class ClientPool:
+    """Process-wide LLM clients shared by every session and agent, one per API key"""
+
+    def __init__(self):
+        self._clients: Dict[str, LLMClient] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def get(self, api_key: str) -> LLMClient:
+        key = self._key(api_key)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = LLMClient(
+                    api_key,
+                    cache=get_response_cache(),
+                    cache_mode=CacheMode(get_response_cache_settings()["mode"]),
+                    scheduler=get_scheduler(),
+                    **get_llm_pool_settings()
+                )
+            return self._clients[key]
+
+    def health(self) -> Dict[str, ClientHealth]:
+        """Health per client, keyed by a short hash of its API key"""
+        with self._lock:
+            return {key: client.health for key, client in self._clients.items()}
+
+    async def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            await client.close()
+
+
+_pool = ClientPool()
+
+
+def get_client_pool() -> ClientPool:
+    return _pool
+
+
+def get_llm_client(api_key: str) -> LLMClient:
+    """Return the pooled client for an API key, creating it on first use"""
+    return _pool.get(api_key)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the background event loop that owns every LLM connection.
+
+    Pooled connections are bound to the loop that opened them, so all agent
+    coroutines run on this one long-lived loop instead of a fresh
+    ``asyncio.run`` loop per call.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="arena-llm-loop", daemon=True)
+            thread.start()
+        return _loop
+
+
+class CallbackDispatcher:
+    """Queues callbacks from the event loop so they run on the calling thread.
+
+    Streamlit elements may only be touched from the script thread, so streaming
+    callbacks are wrapped here and drained by ``run_sync`` while it waits.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def wrap(self, fn: Callable) -> Callable:
+        def enqueue(*args, **kwargs):
+            self._queue.put((fn, args, kwargs))
+        return enqueue
+
+    def drain(self):
+        while True:
+            try:
+                fn, args, kwargs = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args, **kwargs)
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """Start a coroutine on the background loop without waiting for it"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_sync(coro, dispatcher: Optional[CallbackDispatcher] = None, poll_interval: float = 0.02):
+    """Run a coroutine on the background loop and block until it finishes"""
+    future = submit(coro)
+    while True:
+        done, _ = concurrent.futures.wait([future], timeout=poll_interval)
+        if dispatcher:
+            dispatcher.drain()
+        if done:
+            return future.result()
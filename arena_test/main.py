@@ -1,47 +1,59 @@
+import concurrent.futures
+import json
+import os
+import sys
 import streamlit as st
-from agent import GameMaster
-from game_state import GameState, PlayerType
-from player_b import PlayerBAgent
-from narrator import GameNarrator
-from config import get_api_key
-import asyncio
 import streamlit.components.v1 as components
-import json
-from prompt_manager import PromptManager, Prompt, PromptType
+
+if __package__ in (None, ""):
+    # Run as a script (streamlit run arena_test/main.py): make the package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arena_test.arena import Arena, get_arena_registry  # noqa: E402
+from arena_test.arena_logging import configure_logging  # noqa: E402
+from arena_test.grid import build_grid_html, get_viewport  # noqa: E402
+from arena_test.config import get_api_key, get_render_settings, get_speculative_player_b  # noqa: E402
+from arena_test.event_store import get_event_store  # noqa: E402
+from arena_test.llm import CallbackDispatcher, run_sync, submit  # noqa: E402
+from arena_test.render import RenderCoalescer  # noqa: E402
+from arena_test.prompt_manager import DEFAULT_PROMPT_NAMES, Prompt, PromptType, get_prompt_manager  # noqa: E402
+from arena_test.scheduler import Priority  # noqa: E402
 
 def initialize_session_state():
-    if 'game_state' not in st.session_state:
-        st.session_state.game_state = GameState()
-    if 'game_master_a' not in st.session_state:
-        try:
-            api_key = get_api_key()
-            st.session_state.game_master_a = GameMaster("Player A", api_key)
-            st.session_state.player_b = PlayerBAgent(api_key)
-            st.session_state.narrator = GameNarrator(api_key)
-        except ValueError as e:
-            st.error(f"Configuration error: {e}")
-            st.stop()
-    if 'conversation_turns' not in st.session_state:
-        st.session_state.conversation_turns = 0
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
-    if 'total_turns' not in st.session_state:
-        st.session_state.total_turns = 0
+    # The session only keeps the game id; the arena lives in the process-wide registry,
+    # which can evict it when idle and rehydrate it from the event store
+    if 'game_id' not in st.session_state:
+        st.session_state.game_id = st.query_params.get("game")
+    if 'speculative_player_b' not in st.session_state:
+        st.session_state.speculative_player_b = get_speculative_player_b()
+
+def get_session_arena() -> Arena:
+    """Arena for this session: live, resumed from the store, or a new game"""
+    try:
+        api_key = get_api_key()
+    except ValueError as e:
+        st.error(f"Configuration error: {e}")
+        st.stop()
+    registry = get_arena_registry()
+    store = get_event_store()
+    arena = None
+    if st.session_state.game_id:
+        arena = registry.get(st.session_state.game_id, api_key, st.session_state.prompt_manager, store)
+    if arena is None:
+        arena = Arena(api_key, st.session_state.prompt_manager, st.session_state.selected_prompts, store=store)
+        registry.add(arena)
+    st.session_state.game_id = arena.game_id
+    st.session_state.selected_prompts = arena.selected_prompts
+    # Keep the game in the URL so a reload or server restart resumes it
+    st.query_params["game"] = arena.game_id
+    return arena
 
 def initialize_prompt_manager():
-    if 'prompt_manager' not in st.session_state:
-        st.session_state.prompt_manager = PromptManager()
+    # Process-wide registry; each rerun picks up prompt files changed on disk
+    st.session_state.prompt_manager = get_prompt_manager()
     if 'selected_prompts' not in st.session_state:
         # Initialize with default prompt names for all types
-        st.session_state.selected_prompts = {
-            PromptType.GAME_MASTER: "Default Game Master",
-            PromptType.PLAYER_B: "Default Player B",
-            PromptType.NARRATOR: "Default Narrator" 
-        }
-
-    # Ensure prompts are loaded
-    if not hasattr(st.session_state.prompt_manager, 'prompts'):
-        st.session_state.prompt_manager.load_prompts()
+        st.session_state.selected_prompts = dict(DEFAULT_PROMPT_NAMES)
 
 def render_prompt_management():
     st.sidebar.title("Prompt Management")
@@ -51,12 +63,16 @@ def render_prompt_management():
         st.sidebar.subheader(f"{prompt_type.value.title()} Prompts")
         prompts = st.session_state.prompt_manager.get_prompts(prompt_type)
         prompt_names = [p.name for p in prompts]
+        current = st.session_state.selected_prompts[prompt_type]
+        if current not in prompt_names:
+            # Removed by a hot reload since it was selected
+            current = DEFAULT_PROMPT_NAMES[prompt_type]
         
         selected = st.sidebar.selectbox(
             f"Select {prompt_type.value} prompt",
             prompt_names,
             key=f"select_{prompt_type.value}",
-            index=prompt_names.index(st.session_state.selected_prompts[prompt_type])
+            index=prompt_names.index(current) if current in prompt_names else 0
         )
         st.session_state.selected_prompts[prompt_type] = selected
         
@@ -89,12 +105,16 @@ def render_prompt_management():
                 description=description,
                 type=PromptType(prompt_type)
             )
-            st.session_state.prompt_manager.add_prompt(new_prompt)
-            st.sidebar.success("Prompt added successfully!")
-            st.rerun()
+            try:
+                st.session_state.prompt_manager.add_prompt(new_prompt)
+            except ValueError as e:
+                st.sidebar.error(str(e))
+            else:
+                st.sidebar.success("Prompt added successfully!")
+                st.rerun()
 
-def render_chat_interface():
-    for message in st.session_state.messages:
+def render_chat_interface(arena: Arena):
+    for message in arena.transcript():
         if message["role"] == "user":
             with st.chat_message("user", avatar="👤"):
                 st.markdown(message["content"])
@@ -104,11 +124,7 @@ def render_chat_interface():
     
     return st.empty()
 
-async def process_player_a_turn(message: str, game_state: GameState, game_master: GameMaster, 
-                              streaming_placeholder):
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": message})
-    
+def process_player_a_turn(message: str, arena: Arena):
     # Show user message immediately
     with st.chat_message("user", avatar="👤"):
         st.markdown(message)
@@ -117,145 +133,88 @@ async def process_player_a_turn(message: str, game_state: GameState, game_master
     with st.chat_message("assistant", avatar="🎲"):
         message_placeholder = st.empty()
         
-        def update_stream(text):
-            narrative = text.split('###Updates')[0].strip() if '###Updates' in text else text
-            message_placeholder.markdown(narrative)
+        # Process the message with streaming; deltas are coalesced on the loop
+        # thread and rendered on this thread
+        dispatcher = CallbackDispatcher()
+        coalescer = RenderCoalescer(dispatcher.wrap(message_placeholder.markdown), **get_render_settings())
         
-        # Process the message with streaming
-        response, updates = await game_master.process_turn_streaming(
-            message,
-            game_state.to_dict(),
-            update_stream
-        )
+        async def play_exchange():
+            try:
+                return await arena.play_exchange(message, coalescer.update)
+            finally:
+                coalescer.close()
         
-        # Update with final response
+        response = run_sync(play_exchange(), dispatcher)
+        
+        # Final render with the complete response
         message_placeholder.markdown(response)
     
-    # Add GM response to message history
-    st.session_state.messages.append({"role": "assistant", "content": response})
-    
-    # Get the narrative part
-    narrative = response.split('###Updates')[0].strip()
-    
-    # Update game state
-    game_state.update_state(
-        updates=updates,
-        player=PlayerType.A,
-        narrative=narrative
-    )
-    
-    return narrative
+    return response
 
-async def process_player_b_turn(game_state: GameState, player_b: PlayerBAgent):
-    """Process Player B's turn (AI-simulated)"""
-    recent_actions = game_state.get_recent_actions()
-    
-    # Generate Player B's response
-    narrative, updates = await player_b.generate_turn(
-        game_state.to_dict(),
-        str(recent_actions)
-    )
+def process_round_end(arena: Arena):
+    """Run Player B and the narrator in the background and show their text as it streams in"""
+    future = arena.round_end_future
+    if future is None or future.done():
+        arena.reset_round_progress()
+        future = arena.round_end_future = submit(arena.finish_round(priority=Priority.INTERACTIVE))
     
-    # Update game state
-    game_state.update_state(
-        updates=updates,
-        player=PlayerType.B,
-        narrative=narrative
-    )
+    with st.chat_message("assistant", avatar="🤖"):
+        player_b_placeholder = st.empty()
+    summary_placeholder = st.empty()
+    placeholders = {"player_b": player_b_placeholder, "narrator": summary_placeholder}
     
-    return narrative
-
-async def update_narrative_summary(game_state: GameState, narrator: GameNarrator):
-    """Generate and update the narrative summary"""
-    recent_actions = game_state.get_recent_actions()
-    summary = await narrator.generate_turn_summary(
-        recent_actions,
-        game_state.to_dict()
-    )
-    game_state.public_narrative.append(summary)
-    return summary
+    # Poll the streamed text at the render interval; the phases keep running if this script is rerun
+    shown = {}
+    interval = get_render_settings()["interval"]
+    while True:
+        done, _ = concurrent.futures.wait([future], timeout=interval)
+        for phase, text in arena.round_text().items():
+            if shown.get(phase) != text:
+                placeholders[phase].markdown(f"### Game Summary\n{text}" if phase == "narrator" else text)
+                shown[phase] = text
+        if done:
+            break
+    arena.round_end_future = None
+    future.result()
+    st.rerun()
 
 def create_grid_display(game_state):
-    grid_html = """
-    <style>
-        .grid-container {
-            display: grid;
-            grid-template-columns: repeat(10, 40px);
-            gap: 2px;
-            background-color: #f0f0f0;
-            padding: 10px;
-            border-radius: 8px;
-            margin: 0 auto;
-        }
-        .grid-cell {
-            width: 40px;
-            height: 40px;
-            background-color: white;
-            border: 1px solid #ddd;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 20px;
-            transition: all 0.2s ease;
-        }
-        .grid-cell:hover {
-            background-color: #f8f8f8;
-            transform: scale(1.05);
-        }
-        .coordinates {
-            color: #ccc;
-            font-size: 12px;
-            font-family: monospace;
-        }
-    </style>
-    <div class="grid-container">
-    """
-    
-    player_a_pos = game_state.player_a.position
-    player_b_pos = game_state.player_b.position
-    
-    for y in range(10):
-        for x in range(10):
-            if (x, y) == player_a_pos:
-                cell_content = "🔵"
-            elif (x, y) == player_b_pos:
-                cell_content = "🔴"
-            else:
-                cell_content = f'<span class="coordinates">{x},{y}</span>'
-                
-            grid_html += f'<div class="grid-cell">{cell_content}</div>'
-    
-    grid_html += "</div>"
-    
-    components.html(grid_html, height=500)
-
-def check_game_end(game_state: GameState) -> bool:
-    if game_state.player_a.hp <= 0 or game_state.player_b.hp <= 0:
-        return True
-    if st.session_state.total_turns >= 3:
-        return True
-    return False
+    # Only the viewport around the players is rendered; unchanged grids reuse the same HTML
+    viewport = get_viewport(game_state)
+    components.html(build_grid_html(game_state, viewport), height=viewport.pixel_height)
 
 def render_game_ui():
     st.title("AI Arena Prototype")
-    initialize_session_state()
     initialize_prompt_manager()
+    initialize_session_state()
+    arena = get_session_arena()
+    game_state = arena.game_state
     
     # Add prompt management UI
     render_prompt_management()
+    st.sidebar.checkbox(
+        "Speculative Player B turn",
+        key="speculative_player_b",
+        help="Start Player B's turn while the final Game Master response streams. "
+             "Player B then does not see Player A's final action; its turn is generated again "
+             "only if that action changed either player's stats"
+    )
+    tokens_saved = sum(stats["tokens_saved"] for stats in arena.context_stats().values())
+    if tokens_saved:
+        st.sidebar.caption(f"History compaction saves ~{tokens_saved} tokens per request")
 
     # Display the grid
     st.markdown("### Battle Arena")
-    create_grid_display(st.session_state.game_state)
+    create_grid_display(game_state)
     
     # Display narrative summary
-    if st.session_state.game_state.public_narrative:
+    if game_state.public_narrative:
         st.markdown("### Game Summary")
         with st.container():
-            st.markdown(st.session_state.game_state.public_narrative[-1])
-            if len(st.session_state.game_state.public_narrative) > 1:
+            st.markdown(game_state.public_narrative[-1])
+            if len(game_state.public_narrative) > 1:
                 with st.expander("Previous Events"):
-                    for i, narrative in enumerate(st.session_state.game_state.public_narrative[:-1]):
+                    for i, narrative in enumerate(game_state.public_narrative[:-1]):
                         st.markdown(f"Turn {i + 1}:")
                         st.markdown(narrative)
     
@@ -263,26 +222,22 @@ def render_game_ui():
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Player A")
-        st.write(f"HP: {st.session_state.game_state.player_a.hp}")
-        st.write(f"Position: {st.session_state.game_state.player_a.position}")
-        if st.session_state.game_state.player_a.custom_stats:
-            st.write("Custom stats:", st.session_state.game_state.player_a.custom_stats)
+        st.write(f"HP: {game_state.player_a.hp}")
+        st.write(f"Position: {game_state.player_a.position}")
+        if game_state.player_a.custom_stats:
+            st.write("Custom stats:", game_state.player_a.custom_stats)
                         
     with col2:
         st.subheader("Player B (AI)")
-        st.write(f"HP: {st.session_state.game_state.player_b.hp}")
-        st.write(f"Position: {st.session_state.game_state.player_b.position}")
-        if st.session_state.game_state.player_b.custom_stats:
-            st.write("Custom stats:", st.session_state.game_state.player_b.custom_stats)
+        st.write(f"HP: {game_state.player_b.hp}")
+        st.write(f"Position: {game_state.player_b.position}")
+        if game_state.player_b.custom_stats:
+            st.write("Custom stats:", game_state.player_b.custom_stats)
     
     # Check for game end
-    if check_game_end(st.session_state.game_state):
+    if arena.is_over():
         st.markdown("### Game Over!")
-        winner = None
-        if st.session_state.game_state.player_a.hp <= 0:
-            winner = "Player B"
-        elif st.session_state.game_state.player_b.hp <= 0:
-            winner = "Player A"
+        winner = arena.winner()
         if winner:
             st.markdown(f"🏆 {winner} wins!")
         else:
@@ -290,38 +245,22 @@ def render_game_ui():
         return
 
     # Render chat interface
-    streaming_placeholder = render_chat_interface()
+    render_chat_interface(arena)
     
     # Input area
-    if st.session_state.conversation_turns < 5:
-        if prompt := st.chat_input("Your message to the Game Master:"):
-            # Process message
-            response = asyncio.run(process_player_a_turn(
-                prompt,
-                st.session_state.game_state,
-                st.session_state.game_master_a,
-                streaming_placeholder
-            ))
-            
-            st.session_state.conversation_turns += 1
-            
-            # If this was the 5th turn, process Player B's turn and update narrative
-            if st.session_state.conversation_turns == 5:
-                player_b_narrative = asyncio.run(process_player_b_turn(
-                    st.session_state.game_state,
-                    st.session_state.player_b
-                ))
-                
-                # Generate narrative summary
-                summary = asyncio.run(update_narrative_summary(
-                    st.session_state.game_state,
-                    st.session_state.narrator
-                ))
-                
-                # Reset conversation turns for next round
-                st.session_state.conversation_turns = 0
-                st.session_state.total_turns += 1
-                st.rerun()
+    if arena.round_complete:
+        # A rerun during the round end attaches to the phases already running
+        process_round_end(arena)
+    elif prompt := st.chat_input("Your message to the Game Master:"):
+        arena.speculative_player_b = st.session_state.speculative_player_b
+        
+        # Process message
+        process_player_a_turn(prompt, arena)
+        
+        # If this was the 5th turn, stream Player B's turn and the narrative summary
+        if arena.round_complete:
+            process_round_end(arena)
 
 if __name__ == "__main__":
+    configure_logging()
     render_game_ui()
\ No newline at end of file
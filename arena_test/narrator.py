@@ -1,42 +1,98 @@
 # narrator.py
 from dataclasses import dataclass
-from typing import List, Dict
-from anthropic import Anthropic
+from typing import Callable, Dict, List, Optional, Tuple
 import json
-import streamlit as st
-from prompt_manager import PromptType
+from .arena_logging import capture_payload, get_logger
+from .config import DIGEST_WORDS
+from .game_state import COMPACT_STATE_LEGEND, GameState
+from .llm import get_llm_client
+from .prompt_manager import NARRATION_FORMAT, PromptManager, PromptType
+from .router import get_model_router
+from .scheduler import Priority
+from .updates_tool import ToolInputStreamParser, compile_validator
+
+logger = get_logger("agents")
+
+NARRATION_TOOL_NAME = "publish_summary"
+
+NARRATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {
+            "type": "string",
+            "description": "Public narrative of the new actions, exactly as the players should read it"
+        },
+        "story_so_far": {
+            "type": "string",
+            "description": f"The previous story so far with the new actions folded in, at most {DIGEST_WORDS} words"
+        }
+    },
+    "required": ["summary", "story_so_far"]
+}
+
+NARRATION_TOOL = {
+    "name": NARRATION_TOOL_NAME,
+    "description": "Publish this round's narrative and the updated story so far.",
+    "input_schema": NARRATION_SCHEMA
+}
+
+validate_narration = compile_validator(NARRATION_SCHEMA)
 
 class GameNarrator:
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
-    
-    async def generate_turn_summary(self, recent_actions: List[Dict], game_state: Dict) -> str:
+    """Summarizes each round from the actions since its last summary and a rolling digest.
+
+    ``cursor`` is the first turn not yet narrated and ``digest`` the story so
+    far, so every call sees one round of actions plus a bounded digest no
+    matter how long the game has run.
+    """
+
+    def __init__(self, api_key: str, prompt_manager: PromptManager):
+        self.llm = get_llm_client(api_key)
+        self.router = get_model_router()
+        self.prompt_manager = prompt_manager
+        self.cursor = 0
+        self.digest = ""
+
+    def to_snapshot(self) -> Dict:
+        return {"cursor": self.cursor, "digest": self.digest}
+
+    def restore(self, snapshot: Dict):
+        self.cursor = snapshot["cursor"]
+        self.digest = snapshot["digest"]
+
+    async def generate_turn_summary(self, game_state: GameState, prompt_name: str,
+                                    on_text: Optional[Callable[[str], None]] = None) -> Tuple[str, str]:
         """
-        Generate a narrative summary of recent game events
+        Narrate the actions since the last summary, passing each newly streamed piece of it to on_text;
+        returns the summary and the model that wrote it
         """
+        new_actions = game_state.get_actions_since(self.cursor)
+        # Earlier summaries are covered by the digest, so the state leaves its log out
+        state = json.dumps(game_state.to_compact_dict(narrative_limit=0), separators=(",", ":"))
+        story = f"Story so far: {self.digest or '(the game has just begun)'}"
         try:
-            selected_prompt = st.session_state.prompt_manager.get_prompt(
-                PromptType.NARRATOR,
-                st.session_state.selected_prompts[PromptType.NARRATOR]
-            )
-            
-            formatted_prompt = st.session_state.prompt_manager.format_prompt(
+            selected_prompt = self.prompt_manager.get_prompt_or_default(PromptType.NARRATOR, prompt_name)
+
+            formatted_prompt = self.prompt_manager.format_prompt(
                 selected_prompt,
-                game_state=json.dumps(game_state, indent=2),
-                recent_actions=json.dumps(recent_actions, indent=2)
+                game_state=f"{state}\n{COMPACT_STATE_LEGEND}\n\n{story}",
+                recent_actions=json.dumps(new_actions, indent=2)
             )
-            
-        except (KeyError, AttributeError) as e:
+
+        except (KeyError, ValueError) as e:
             # Fallback prompt if the prompt system fails
             formatted_prompt = f"""As the narrator of an AI Arena game, create an engaging summary of recent events.
             Focus on public actions and their results, while maintaining any strategic secrets.
-            
+
             Current game state:
-            {json.dumps(game_state, indent=2)}
-            
+            {state}
+            {COMPACT_STATE_LEGEND}
+
+            {story}
+
             Recent actions:
-            {json.dumps(recent_actions, indent=2)}
-            
+            {json.dumps(new_actions, indent=2)}
+
             Create a brief, engaging narrative that:
             1. Describes what happened in an exciting way
             2. Maintains dramatic tension
@@ -44,11 +100,49 @@ class GameNarrator:
             4. Connects events in a coherent narrative thread
             5. Highlights significant state changes (HP, position, etc.)
             """
-        
-        response = self.client.messages.create(
-            max_tokens=500,
-            messages=[{"role": "user", "content": formatted_prompt}],
-            model="claude-3-sonnet-20240229"
+        formatted_prompt += "\n\n" + NARRATION_FORMAT.format(digest_words=DIGEST_WORDS)
+
+        parser = ToolInputStreamParser(field="summary")
+
+        def on_json(json_delta: str):
+            released = parser.feed(json_delta)
+            if released and on_text:
+                on_text(released)
+
+        async def call(model: str, max_tokens: int) -> str:
+            nonlocal parser
+            parser = ToolInputStreamParser(field="summary")
+            return await self.llm.stream_tool(
+                messages=[{"role": "user", "content": formatted_prompt}],
+                model=model,
+                max_tokens=max_tokens,
+                tool=NARRATION_TOOL,
+                on_json=on_json,
+                priority=Priority.BULK,
+                validate=validate_narration
+            )
+
+        content, model = await self.router.run("narrator", call)
+        capture_payload("narrator", prompt=formatted_prompt, response=content, model=model)
+        summary, digest = self._parse(content, parser.narrative)
+        self.digest = digest
+        self.cursor = game_state.turn_number
+        logger.info("Narrated %d actions on %s; digest is %d chars", len(new_actions), model, len(digest))
+        return summary, model
+
+    def _parse(self, content: str, streamed: str) -> Tuple[str, str]:
+        """Summary and new digest from the tool input; the old digest stands if it is unusable"""
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.error("Error parsing narration: %s", e)
+            return streamed.strip(), self.digest
+        errors = validate_narration(data)
+        if errors:
+            logger.error("Invalid narration: %s", "; ".join(errors))
+        summary = data.get("summary") if isinstance(data, dict) else None
+        digest = data.get("story_so_far") if isinstance(data, dict) else None
+        return (
+            summary.strip() if isinstance(summary, str) else streamed.strip(),
+            digest.strip() if isinstance(digest, str) and digest.strip() else self.digest
         )
-        
-        return response.content[0].text
\ No newline at end of file
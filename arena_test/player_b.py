@@ -1,116 +1,143 @@
 from dataclasses import dataclass, field
-from typing import Dict, Tuple
-from anthropic import Anthropic
+from typing import Callable, Dict, List, Optional, Tuple
 import json
-import logging
-from prompt_manager import PromptType
-import streamlit as st
+from .arena_logging import Lazy, capture_payload, get_logger
+from .config import get_context_budgets
+from .context import ContextCompactor, PromptState
+from .game_state import COMPACT_STATE_LEGEND
+from .llm import cached_system, cached_user_message, get_llm_client
+from .prompt_manager import UPDATES_FORMAT, PromptManager, PromptType
+from .router import get_model_router
+from .scheduler import Priority
+from .updates_tool import UPDATES_TOOL, ToolInputStreamParser, validate_updates
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger("agents")
+
+# Per-turn user message; everything else in the prompt is static
+TURN_TEMPLATE = """{game_state}
+
+Recent actions summary:
+{action_summary}"""
+
+# Substituted for per-turn placeholders in older templates so the system prompt stays static
+STATE_IN_MESSAGES = "(provided with each turn)"
+ACTIONS_IN_MESSAGES = "(provided with each turn)"
+HISTORY_IN_MESSAGES = "(see your previous turns in this conversation)"
 
 class PlayerBAgent:
 
-    def __init__(self, api_key: str):
-        logger.info("Initializing PlayerBAgent")
-        self.client = Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, prompt_manager: PromptManager, context_budget: Optional[int] = None):
+        self.llm = get_llm_client(api_key)
+        self.router = get_model_router()
+        self.prompt_manager = prompt_manager
         self.narrative_history = []
-    
-    async def generate_turn(self, game_state: Dict, action_summary: str) -> Tuple[str, Dict]:
-        selected_prompt = st.session_state.prompt_manager.get_prompt(
-            PromptType.PLAYER_B,
-            st.session_state.selected_prompts[PromptType.PLAYER_B]
+        self.pending_turn = None
+        self.context = ContextCompactor(
+            self.llm, "Player B", self.narrative_history, 'user_content', 'response',
+            context_budget or get_context_budgets()["player_b"]
         )
+    
+    async def generate_turn(self, state: PromptState, action_summary: str, prompt_name: str,
+                            record: bool = True,
+                            on_text: Optional[Callable[[str], None]] = None,
+                            priority: Priority = Priority.BACKGROUND) -> Tuple[str, Dict]:
+        """Generate Player B's move, passing each newly streamed piece of its narrative to on_text.
+
+        With record=False the turn is held until commit_pending_turn. Pass
+        Priority.INTERACTIVE when someone is watching the turn.
+        """
+        selected_prompt = self.prompt_manager.get_prompt_or_default(PromptType.PLAYER_B, prompt_name)
         
-        formatted_prompt = st.session_state.prompt_manager.format_prompt(
+        # Static instructions form a cacheable prefix; each turn is appended as a new message
+        system_prompt = self.prompt_manager.format_prompt(
             selected_prompt,
-            game_state=json.dumps(game_state, indent=2),
-            action_summary=action_summary,
-            narrative_history=self._format_narrative_history()
+            game_state=STATE_IN_MESSAGES,
+            action_summary=ACTIONS_IN_MESSAGES,
+            narrative_history=HISTORY_IN_MESSAGES
+        ) + "\n\n" + COMPACT_STATE_LEGEND + "\n\n" + UPDATES_FORMAT
+        
+        user_content = TURN_TEMPLATE.format(
+            game_state=state.describe(),
+            action_summary=action_summary
         )
         
-        # Add the updates section template
-        formatted_prompt += """
+        messages = self._build_messages(user_content)
+        logger.debug("Player B turn: %d messages, %d chars of new context", len(messages), len(user_content))
         
-        Provide your response followed by a JSON updates object in the format:
-        ###Updates
-        {
-            "hp_changes": {
-                "player_a": 0,
-                "player_b": 0
-            },
-            "position_changes": {
-                "player_a": [0, 0],
-                "player_b": [0, 0]
-            },
-            "custom_stat_changes": {
-                "player_a": {},
-                "player_b": {}
-            }
-        }
-        """
+        parser = ToolInputStreamParser()
         
-        logger.info("\n" + "="*50 + "\nPLAYER B GENERATING TURN\n" + "="*50)
-        logger.info(f"Using prompt:\n{formatted_prompt}")
+        def on_json(json_delta: str):
+            released = parser.feed(json_delta)
+            if released and on_text:
+                on_text(released)
         
-        # Note: Create is not async, so we don't use await here
-        try:
-            response = self.client.messages.create(
-                max_tokens=1000,
-                messages=[{"role": "user", "content": formatted_prompt}],
-                model="claude-3-sonnet-20240229"
+        async def call(model: str, max_tokens: int) -> str:
+            nonlocal parser
+            parser = ToolInputStreamParser()
+            return await self.llm.stream_tool(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                tool=UPDATES_TOOL,
+                on_json=on_json,
+                system=cached_system(system_prompt),
+                priority=priority,
+                validate=validate_updates
             )
-            logger.info("\n" + "="*50 + "\nRECEIVED API RESPONSE:\n" + "="*50)
-            logger.info(f"Full response object: {response}")
-            logger.info(f"Response content: {response.content}")
-            
-            # Get the first content block's text
-            content = response.content[0].text
-            logger.info(f"\nExtracted content text: {content}")
-            
-            # Split the response into narrative and updates
-            parts = content.split("###Updates")
-            narrative = parts[0].strip()
-            logger.info(f"\nExtracted narrative: {narrative}")
-            
-            try:
-                updates = json.loads(parts[1].strip())
-                logger.info(f"\nParsed updates: {json.dumps(updates, indent=2)}")
-            except (json.JSONDecodeError, IndexError) as e:
-                logger.error(f"Error parsing updates: {e}")
-                logger.error(f"Raw updates text: {parts[1] if len(parts) > 1 else 'No updates section found'}")
-                # Provide default updates if parsing fails
-                updates = {
-                    "hp_changes": {"player_a": 0, "player_b": 0},
-                    "position_changes": {"player_a": [0, 0], "player_b": [0, 0]},
-                    "custom_stat_changes": {"player_a": {}, "player_b": {}}
-                }
         
+        try:
+            content, model = await self.router.run("player_b", call)
         except Exception as e:
-            logger.error(f"Error during API call: {e}")
+            logger.error("Error during API call: %s", e)
             raise
         
-        self.narrative_history.append({
+        capture_payload("player_b", system=system_prompt, messages=messages, response=content)
+        narrative, updates = parser.finish()
+        
+        entry = {
+            "user_content": user_content,
+            "response": narrative,
             "turn_narrative": narrative,
-            "game_state_snapshot": game_state,
-            "updates": updates
-        })
+            "updates": updates,
+            "state_turn": state.turn_number,
+            "full_state": state.full,
+            "model": model
+        }
+        if record:
+            self.narrative_history.append(entry)
+            self.context.schedule()
+        else:
+            self.pending_turn = entry
         
-        logger.info("\n" + "="*50 + "\nCOMPLETING TURN\n" + "="*50)
-        logger.info(f"Final narrative length: {len(narrative)}")
-        logger.info(f"Final updates: {json.dumps(updates, indent=2)}")
+        logger.info("Player B turn complete on %s: %d chars of narrative", model, len(narrative))
+        logger.debug("Player B updates: %s", Lazy(json.dumps, updates))
         
         return narrative, updates
     
-    def _format_narrative_history(self) -> str:
-        if not self.narrative_history:
-            return "No previous actions."
-            
-        formatted = []
-        for entry in self.narrative_history:
-            formatted.append(f"Turn narrative:\n{entry['turn_narrative']}\n")
-        return "\n".join(formatted)
\ No newline at end of file
+    def to_snapshot(self) -> Dict:
+        return {
+            "narrative_history": list(self.narrative_history),
+            "context": self.context.to_snapshot()
+        }
+    
+    def restore(self, snapshot: Dict):
+        # Refill in place: the context compactor holds a reference to this list
+        self.narrative_history[:] = snapshot["narrative_history"]
+        self.context.restore(snapshot["context"])
+    
+    def commit_pending_turn(self):
+        """Record a speculative turn once it has been accepted"""
+        if self.pending_turn is not None:
+            self.narrative_history.append(self.pending_turn)
+            self.pending_turn = None
+            self.context.schedule()
+    
+    def discard_pending_turn(self):
+        """Forget a speculative turn that was rejected"""
+        self.pending_turn = None
+    
+    def _build_messages(self, user_content: str) -> List[Dict]:
+        """Replay the compacted history and append the new turn"""
+        messages = self.context.messages()
+        messages.append(cached_user_message(user_content))
+        return messages
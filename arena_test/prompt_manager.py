@@ -1,21 +1,86 @@
-from dataclasses import dataclass
-from typing import Dict, List
-import yaml
-import json
+from dataclasses import dataclass, field
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
 import os
 from enum import Enum
+from .arena_logging import get_logger
+
+logger = get_logger("prompts")
+
+# How the model reports each turn; kept static so it can sit in the cached system prompt
+UPDATES_FORMAT = """Always answer by calling the apply_state_updates tool. Put your complete response for the turn in "narrative", and put the resulting HP changes, movements [dx, dy] and custom stat changes, keyed by combatant id (player_a, player_b, ...), in the other fields. Use 0, [0, 0] and {} for combatants that are unaffected."""
+
+NARRATION_FORMAT = """Always answer by calling the publish_summary tool. Put the public narrative for these actions in "summary". Put an updated "story_so_far" in the other field: the previous story so far with these actions folded in, in at most {digest_words} words, keeping names, turning points and the current situation."""
 
 class PromptType(Enum):
     GAME_MASTER = "game_master"
     PLAYER_B = "player_b"
     NARRATOR = "narrator"
 
+# Prompts a new game starts with
+DEFAULT_PROMPT_NAMES: Dict[PromptType, str] = {
+    PromptType.GAME_MASTER: "Default Game Master",
+    PromptType.PLAYER_B: "Default Player B",
+    PromptType.NARRATOR: "Default Narrator"
+}
+
+# Placeholders each prompt type may use
+PLACEHOLDERS: Dict[PromptType, frozenset] = {
+    PromptType.GAME_MASTER: frozenset({"player_name", "conversation_history", "game_state", "player_message"}),
+    PromptType.PLAYER_B: frozenset({"game_state", "action_summary", "narrative_history"}),
+    PromptType.NARRATOR: frozenset({"game_state", "recent_actions"})
+}
+
+# Minimum seconds between directory scans for changed prompt files
+REFRESH_INTERVAL = 1.0
+
+class CompiledTemplate:
+    """A prompt template parsed once into literal text and placeholder names"""
+
+    def __init__(self, content: str):
+        self.pieces: List[Tuple[str, Optional[str]]] = []
+        self.placeholders = set()
+        # Conversions, format specs and attribute lookups need the full str.format machinery
+        self.simple = True
+        for literal, field_name, format_spec, conversion in Formatter().parse(content):
+            if field_name is not None:
+                if format_spec or conversion or not field_name.isidentifier():
+                    self.simple = False
+                self.placeholders.add(field_name)
+            self.pieces.append((literal, field_name))
+        self.content = content
+
+    def format(self, **kwargs) -> str:
+        if not self.simple:
+            return self.content.format(**kwargs)
+        parts = []
+        for literal, field_name in self.pieces:
+            parts.append(literal)
+            if field_name is not None:
+                parts.append(str(kwargs[field_name]))
+        return "".join(parts)
+
 @dataclass
 class Prompt:
     name: str
     content: str
     description: str
     type: PromptType
+    template: CompiledTemplate = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.template = CompiledTemplate(self.content)
+
+    def validate(self):
+        """Raise ValueError if the template uses placeholders its type does not provide"""
+        unknown = self.template.placeholders - PLACEHOLDERS[self.type]
+        if unknown:
+            raise ValueError(
+                f"Prompt {self.name} uses unknown placeholders {sorted(unknown)}; "
+                f"{self.type.value} prompts may use {sorted(PLACEHOLDERS[self.type])}"
+            )
 
 class PromptManager:
     def __init__(self, prompts_dir: str = "prompt_templates"):
@@ -23,6 +88,11 @@ class PromptManager:
         self.prompts: Dict[PromptType, List[Prompt]] = {
             prompt_type: [] for prompt_type in PromptType
         }
+        self._index: Dict[Tuple[PromptType, str], Prompt] = {}
+        self._file_mtimes: Dict[str, float] = {}
+        self._file_prompts: Dict[str, Tuple[PromptType, str]] = {}
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
         self.load_prompts()
 
     def load_prompts(self):
@@ -30,18 +100,56 @@ class PromptManager:
         if not os.path.exists(self.prompts_dir):
             os.makedirs(self.prompts_dir)
             self._create_default_prompts()
-        
-        for filename in os.listdir(self.prompts_dir):
-            if filename.endswith('.yaml'):
-                with open(os.path.join(self.prompts_dir, filename), 'r') as f:
-                    prompt_data = yaml.safe_load(f)
-                    prompt = Prompt(
-                        name=prompt_data['name'],
-                        content=prompt_data['content'],
-                        description=prompt_data['description'],
-                        type=PromptType(prompt_data['type'])
-                    )
-                    self.prompts[prompt.type].append(prompt)
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False):
+        """Reload only prompt files that were added, changed or removed since the last scan"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            self._last_refresh = now
+            seen = set()
+            with os.scandir(self.prompts_dir) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if not entry.name.endswith('.yaml'):
+                        continue
+                    seen.add(entry.path)
+                    mtime = entry.stat().st_mtime
+                    if self._file_mtimes.get(entry.path) != mtime:
+                        self._load_file(entry.path)
+                        self._file_mtimes[entry.path] = mtime
+            for path in set(self._file_mtimes) - seen:
+                del self._file_mtimes[path]
+                key = self._file_prompts.pop(path, None)
+                if key:
+                    self._unregister(key)
+
+    def _load_file(self, path: str):
+        import yaml  # deferred: only needed once prompts are loaded from disk
+        try:
+            with open(path, 'r') as f:
+                prompt_data = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as e:
+            # The mtime is still recorded, so the file is retried only once it changes
+            logger.error("Skipping unreadable prompt file %s: %s", path, e)
+            return
+        try:
+            prompt = Prompt(
+                name=prompt_data['name'],
+                content=prompt_data['content'],
+                description=prompt_data['description'],
+                type=PromptType(prompt_data['type'])
+            )
+            prompt.validate()
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error("Skipping prompt file %s: %s", path, e)
+            return
+        previous = self._file_prompts.get(path)
+        if previous and previous != (prompt.type, prompt.name):
+            self._unregister(previous)
+        self._file_prompts[path] = (prompt.type, prompt.name)
+        self.register(prompt)
 
     def _create_default_prompts(self):
         """Create default prompt files if none exist"""
@@ -51,12 +159,8 @@ class PromptManager:
                 "type": "game_master",
                 "description": "Default prompt for the Game Master role",
                 "content": """You are the Game Master for {player_name} in an AI Arena game.
-        
-                Previous conversation history:
-                {conversation_history}
                 
-                Current game state:
-                {game_state}
+                Each player message arrives together with the current game state.
                 
                 Rules:
                 - No actions can confer infinite HP
@@ -65,8 +169,6 @@ class PromptManager:
                 - Maintain consistency with previous narrative elements
                 - Reference previous conversation elements when relevant
                 
-                Player's current message: {player_message}
-                
                 Respond in character as the Game Master, maintaining narrative continuity with previous interactions."""
             },
             "player_b_default.yaml": {
@@ -76,14 +178,7 @@ class PromptManager:
                 "content": """You are playing as Player B in an AI Arena game. You need to respond to the current 
                 game state and your opponent's actions with a strategic move of your own.
 
-                Current game state:
-                {game_state}
-
-                Recent actions summary:
-                {action_summary}
-
-                Previous narrative history:
-                {narrative_history}
+                Each turn you receive the current game state and a summary of recent actions.
 
                 Generate a response that includes:
                 1. A narrative description of your strategic thinking and approach
@@ -112,24 +207,55 @@ class PromptManager:
             }
         }
 
+        import yaml
         for filename, content in default_prompts.items():
             with open(os.path.join(self.prompts_dir, filename), 'w') as f:
                 yaml.dump(content, f)
 
+    def register(self, prompt: Prompt):
+        """Add or replace a prompt in memory without writing a file"""
+        prompt.validate()
+        with self._lock:
+            key = (prompt.type, prompt.name)
+            prompts = list(self.prompts[prompt.type])
+            if key in self._index:
+                prompts[prompts.index(self._index[key])] = prompt
+            else:
+                prompts.append(prompt)
+            self.prompts[prompt.type] = prompts
+            self._index[key] = prompt
+
+    def _unregister(self, key: Tuple[PromptType, str]):
+        prompt = self._index.pop(key, None)
+        if prompt is not None:
+            self.prompts[key[0]] = [p for p in self.prompts[key[0]] if p is not prompt]
+
     def get_prompts(self, prompt_type: PromptType) -> List[Prompt]:
         """Get all prompts of a specific type"""
         return self.prompts[prompt_type]
 
     def get_prompt(self, prompt_type: PromptType, name: str) -> Prompt:
         """Get a specific prompt by type and name"""
-        for prompt in self.prompts[prompt_type]:
-            if prompt.name == name:
-                return prompt
-        raise ValueError(f"No prompt found with name {name} and type {prompt_type}")
+        try:
+            return self._index[(prompt_type, name)]
+        except KeyError:
+            raise ValueError(f"No prompt found with name {name} and type {prompt_type}") from None
+
+    def get_prompt_or_default(self, prompt_type: PromptType, name: str) -> Prompt:
+        """Get a prompt by name, or the default of its type if it was removed since it was selected"""
+        try:
+            return self.get_prompt(prompt_type, name)
+        except ValueError:
+            if name == DEFAULT_PROMPT_NAMES[prompt_type]:
+                raise
+        logger.warning("Prompt %s is gone; using %s", name, DEFAULT_PROMPT_NAMES[prompt_type])
+        return self.get_prompt(prompt_type, DEFAULT_PROMPT_NAMES[prompt_type])
 
     def add_prompt(self, prompt: Prompt):
         """Add a new prompt and save it to a file"""
+        prompt.validate()
         filename = f"{prompt.name.lower().replace(' ', '_')}.yaml"
+        path = os.path.join(self.prompts_dir, filename)
         prompt_data = {
             "name": prompt.name,
             "type": prompt.type.value,
@@ -137,11 +263,28 @@ class PromptManager:
             "content": prompt.content
         }
         
-        with open(os.path.join(self.prompts_dir, filename), 'w') as f:
-            yaml.dump(prompt_data, f)
-        
-        self.prompts[prompt.type].append(prompt)
+        import yaml
+        with self._lock:
+            with open(path, 'w') as f:
+                yaml.dump(prompt_data, f)
+            self._file_mtimes[path] = os.stat(path).st_mtime
+            self._file_prompts[path] = (prompt.type, prompt.name)
+            self.register(prompt)
 
     def format_prompt(self, prompt: Prompt, **kwargs) -> str:
         """Format a prompt with the provided arguments"""
-        return prompt.content.format(**kwargs)
\ No newline at end of file
+        return prompt.template.format(**kwargs)
+
+_managers: Dict[str, PromptManager] = {}
+_managers_lock = threading.Lock()
+
+def get_prompt_manager(prompts_dir: str = "prompt_templates") -> PromptManager:
+    """Return the process-wide prompt registry for a directory, picking up changed files"""
+    key = os.path.abspath(prompts_dir)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = PromptManager(prompts_dir)
+            return _managers[key]
+    manager = _managers[key]
+    manager.refresh()
+    return manager
@@ -0,0 +1,54 @@
+from typing import Callable, List, Optional
+import asyncio
+import time
+
+# Default flush cadence for streamed text: at most ~20 renders per second
+RENDER_INTERVAL = 0.05
+RENDER_MAX_DELTAS = 20
+
+class RenderCoalescer:
+    """Rate-limits a render callback that always receives the full text so far.
+
+    Streamed text deltas are held and joined onto the text only when it is
+    rendered, at most once per ``interval`` seconds or after ``max_deltas``
+    deltas, whichever comes first. A timer renders held deltas if the stream
+    stalls. Runs on the event loop thread that produces the deltas.
+    """
+
+    def __init__(self, render: Callable[[str], None], interval: float = RENDER_INTERVAL,
+                 max_deltas: int = RENDER_MAX_DELTAS):
+        self.render = render
+        self.interval = interval
+        self.max_deltas = max_deltas
+        self.renders = 0
+        self.text = ""
+        self._pending: List[str] = []
+        self._last_render = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def update(self, delta: str):
+        self._pending.append(delta)
+        elapsed = time.monotonic() - self._last_render
+        if elapsed >= self.interval or (self.max_deltas and len(self._pending) >= self.max_deltas):
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval - elapsed, self.flush)
+
+    def flush(self):
+        """Render the held deltas now, if there are any"""
+        self._cancel_timer()
+        if self._pending:
+            self.text += "".join(self._pending)
+            self._pending = []
+            self._last_render = time.monotonic()
+            self.renders += 1
+            self.render(self.text)
+
+    def close(self):
+        """Render any held deltas and stop the timer; the stream is over"""
+        self.flush()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,98 @@
+from enum import Enum
+from typing import Dict, List, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+class CacheMode(Enum):
+    OFF = "off"
+    READ_THROUGH = "read_through"
+    RECORD_ONLY = "record_only"
+    REPLAY_ONLY = "replay_only"
+
+    @property
+    def reads(self) -> bool:
+        return self in (CacheMode.READ_THROUGH, CacheMode.REPLAY_ONLY)
+
+    @property
+    def writes(self) -> bool:
+        return self in (CacheMode.READ_THROUGH, CacheMode.RECORD_ONLY)
+
+class CacheMiss(Exception):
+    """Raised in replay-only mode when a request has no recorded response"""
+
+def make_cache_key(model: str, max_tokens: int, messages: List[Dict],
+                   system: Optional[List[Dict]] = None, tools: Optional[List[Dict]] = None) -> str:
+    """Content hash of everything that determines a response"""
+    request = {"model": model, "max_tokens": max_tokens, "system": system, "messages": messages}
+    if tools:
+        request["tools"] = tools
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """LLM responses stored in SQLite, evicted by age and then least-recent use"""
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024,
+                 max_age_seconds: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return response
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the cache fits again
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
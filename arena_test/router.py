@@ -0,0 +1,126 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+import threading
+import time
+from .arena_logging import get_logger
+from .config import get_model_routes
+from .llm import retry_delay
+from .scheduler import CallTiming, call_timing
+
+logger = get_logger("llm")
+
+T = TypeVar("T")
+
+# Latencies kept per role and model, and how many are needed before the p95 is trusted
+LATENCY_WINDOW = 50
+MIN_LATENCY_SAMPLES = 5
+
+# While a role is routed to its fast model, every Nth call still goes to the primary
+# so its latency window keeps up and the role can switch back
+PROBE_EVERY = 10
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Model settings for one agent role; a latency budget of 0 disables fast-model routing"""
+    model: str
+    max_tokens: int
+    latency_budget: float = 0.0
+    fast_model: Optional[str] = None
+    fallback_model: Optional[str] = None
+
+class LatencyWindow:
+    """Most recent call durations for one role and model"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.requests = 0
+        self.failures = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.requests += 1
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+class ModelRouter:
+    """Picks the model for each call of an agent role and falls back on errors.
+
+    Latency is the time from the scheduler admitting a request to its first
+    streamed output, or to the whole response for calls that do not stream,
+    so rate-limit queueing and retry backoff say nothing about a model. A
+    role uses its primary model until that model's p95 latency exceeds the
+    role's budget, then its fast model, probing the primary now and then to
+    notice when it recovers. A call that still fails with a transient API
+    error after the scheduler's retries is repeated once on the role's
+    fallback model; request errors are raised as they are.
+    """
+
+    def __init__(self, routes: Dict[str, ModelRoute]):
+        self.routes = routes
+        self._latency: Dict[Tuple[str, str], LatencyWindow] = defaultdict(LatencyWindow)
+        self._calls: Dict[str, int] = defaultdict(int)
+
+    def route(self, role: str) -> ModelRoute:
+        return self.routes[role]
+
+    def choose(self, role: str) -> str:
+        route = self.routes[role]
+        self._calls[role] += 1
+        if not route.latency_budget or not route.fast_model or route.fast_model == route.model:
+            return route.model
+        p95 = self._latency[(role, route.model)].p95()
+        if p95 is None or p95 <= route.latency_budget or self._calls[role] % PROBE_EVERY == 0:
+            return route.model
+        return route.fast_model
+
+    async def run(self, role: str, call: Callable[[str, int], Awaitable[T]]) -> Tuple[T, str]:
+        """Call ``call(model, max_tokens)`` on the chosen model and return its result and the model used"""
+        route = self.routes[role]
+        model = self.choose(role)
+        try:
+            return await self._timed(role, model, route.max_tokens, call), model
+        except Exception as e:
+            fallback = route.fallback_model
+            if not fallback or fallback == model or retry_delay(e) is None:
+                raise
+            logger.warning("%s call on %s failed, falling back to %s: %s", role, model, fallback, e)
+            return await self._timed(role, fallback, route.max_tokens, call), fallback
+
+    async def _timed(self, role: str, model: str, max_tokens: int, call: Callable[[str, int], Awaitable[T]]) -> T:
+        window = self._latency[(role, model)]
+        timing = CallTiming()
+        token = call_timing.set(timing)
+        start = time.monotonic()
+        try:
+            result = await call(model, max_tokens)
+        except Exception:
+            window.failures += 1
+            raise
+        finally:
+            call_timing.reset(token)
+        # Cached responses are never admitted; their wall time is all there is
+        window.add((timing.first_output or time.monotonic()) - (timing.admitted or start))
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, Dict]]:
+        """Requests, failures and p95 latency per role and model"""
+        stats: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        for (role, model), window in self._latency.items():
+            stats[role][model] = {"requests": window.requests, "failures": window.failures, "p95": window.p95()}
+        return dict(stats)
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide router; latency is shared by every game in the process"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter({role: ModelRoute(**route) for role, route in get_model_routes().items()})
+    return _router
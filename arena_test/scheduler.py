@@ -0,0 +1,239 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from .arena_logging import get_logger
+from .config import get_rate_limits
+
+logger = get_logger("llm")
+
+T = TypeVar("T")
+
+# Rough token estimate; good enough for budgeting and rate limiting
+CHARS_PER_TOKEN = 4
+
+# Default retry policy: full jitter over an exponential backoff
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class Priority(IntEnum):
+    """Lower values are served first when the rate limits are saturated"""
+    INTERACTIVE = 0  # streamed GM turns a player is watching
+    BACKGROUND = 1  # Player B turns
+    BULK = 2  # narrator summaries and history compaction
+
+class TokenBucket:
+    """Refills continuously at ``per_minute``; may go into debt when usage exceeds the estimate"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken; requests larger than the bucket wait for a full one"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def give(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+@dataclass
+class Reservation:
+    """Capacity held for one request; the caller reports actual usage once the response arrives"""
+    priority: Priority
+    input_tokens: int
+    output_tokens: int
+    used_input: Optional[int] = None
+    used_output: Optional[int] = None
+
+    def record_usage(self, input_tokens: Optional[int], output_tokens: Optional[int]):
+        if input_tokens is not None:
+            self.used_input = input_tokens
+        if output_tokens is not None:
+            self.used_output = output_tokens
+
+@dataclass
+class CallTiming:
+    """When the latest attempt of a call was admitted and when its first output arrived"""
+    admitted: Optional[float] = None
+    first_output: Optional[float] = None
+
+# Set by whoever times a call, i.e. the model router; the scheduler and streams fill it in
+call_timing: ContextVar[Optional[CallTiming]] = ContextVar("call_timing", default=None)
+
+def mark_first_output():
+    """Note that the current call's first streamed output has arrived"""
+    timing = call_timing.get()
+    if timing is not None and timing.first_output is None:
+        timing.first_output = time.monotonic()
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    waiting: int = 0
+
+class RequestScheduler:
+    """Admits LLM requests against requests, input-token and output-token per-minute limits.
+
+    Waiting requests are served strictly by priority, then in arrival order,
+    so an interactive GM stream never queues behind background work. Each
+    request reserves its estimated input and ``max_tokens`` output up front;
+    the difference is returned once the real usage is known. Failed requests
+    are retried with jittered exponential backoff, and a rate-limit response
+    pauses every request until its retry-after has passed. A limit of 0
+    disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, input_tokens_per_minute: float = 0,
+                 output_tokens_per_minute: float = 0, max_retries: int = MAX_RETRIES,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY):
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._input = TokenBucket(input_tokens_per_minute) if input_tokens_per_minute else None
+        self._output = TokenBucket(output_tokens_per_minute) if output_tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = SchedulerStats()
+        self._waiters: List[Tuple[int, int, Reservation, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def run(self, priority: Priority, input_tokens: int, output_tokens: int,
+                  call: Callable[[Reservation], Awaitable[T]],
+                  retryable: Callable[[Exception], Optional[float]],
+                  can_retry: Optional[Callable[[], bool]] = None) -> T:
+        """Run ``call`` once admitted, retrying failures that ``retryable`` accepts.
+
+        ``retryable`` returns None for errors that must not be retried, or the
+        server's requested delay in seconds (0 when it gave none).
+        ``can_retry`` vetoes a retry, e.g. once a stream has delivered output.
+        """
+        attempt = 0
+        while True:
+            reservation = await self.acquire(priority, input_tokens, output_tokens)
+            timing = call_timing.get()
+            if timing is not None:
+                # Each attempt is timed from its admission, so queueing and backoff never count
+                timing.admitted, timing.first_output = time.monotonic(), None
+            try:
+                result = await call(reservation)
+            except Exception as e:
+                if reservation.used_input is None and reservation.used_output is None:
+                    # The request never produced a response, so it consumed no tokens
+                    reservation.record_usage(0, 0)
+                self.settle(reservation)
+                retry_after = retryable(e)
+                if retry_after is None or attempt >= self.max_retries or (can_retry and not can_retry()):
+                    raise
+                delay = self.backoff(attempt, retry_after)
+                if retry_after:
+                    self.stats.rate_limited += 1
+                    self.pause(delay)
+                attempt += 1
+                self.stats.retries += 1
+                logger.warning("Retrying %s request in %.2fs (attempt %d): %s", priority.name.lower(), delay, attempt, e)
+                await asyncio.sleep(delay)
+                continue
+            self.settle(reservation)
+            return result
+
+    def backoff(self, attempt: int, retry_after: float = 0.0) -> float:
+        """Full-jitter exponential delay, never shorter than the server's retry-after"""
+        jittered = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(retry_after, jittered) if retry_after else jittered
+
+    def pause(self, seconds: float):
+        """Hold every request for ``seconds``, e.g. after a rate-limit response"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority: Priority, input_tokens: int, output_tokens: int) -> Reservation:
+        reservation = Reservation(priority, input_tokens, output_tokens)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), reservation, future))
+        self.stats.waiting += 1
+        self._pump()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up: hand the capacity back
+                reservation.record_usage(0, 0)
+                self.settle(reservation)
+            raise
+        finally:
+            self.stats.waiting -= 1
+
+    def settle(self, reservation: Reservation):
+        """Return the unused part of a reservation, or charge usage above the estimate"""
+        if self._input is not None and reservation.used_input is not None:
+            self._input.give(reservation.input_tokens - reservation.used_input)
+        if self._output is not None and reservation.used_output is not None:
+            self._output.give(reservation.output_tokens - reservation.used_output)
+        self._pump()
+
+    def _wait_time(self, reservation: Reservation) -> float:
+        wait = self._paused_until - time.monotonic()
+        for bucket, amount in ((self._requests, 1), (self._input, reservation.input_tokens),
+                               (self._output, reservation.output_tokens)):
+            if bucket is not None:
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+    def _pump(self):
+        """Admit waiters in priority order until the head one has to wait"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            _, _, reservation, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._wait_time(reservation)
+            if wait > 0:
+                self._timer = future.get_loop().call_later(wait, self._pump)
+                return
+            heapq.heappop(self._waiters)
+            for bucket, amount in ((self._requests, 1), (self._input, reservation.input_tokens),
+                                   (self._output, reservation.output_tokens)):
+                if bucket is not None:
+                    bucket.take(amount)
+            self.stats.requests += 1
+            future.set_result(reservation)
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide scheduler shared by every LLM client"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(**get_rate_limits())
+    return _scheduler
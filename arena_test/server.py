@@ -0,0 +1,563 @@
+from typing import Any, Dict, Optional, Set, Tuple
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import time
+from .arena import Arena
+from .arena_logging import configure_logging, get_logger
+from .config import get_api_key, get_game_store_settings, get_render_settings, get_server_settings
+from .event_store import EventStore, get_event_store
+from .llm import get_client_pool
+from .prompt_manager import DEFAULT_PROMPT_NAMES, REFRESH_INTERVAL, PromptManager, PromptType, get_prompt_manager
+from .render import RenderCoalescer
+from .router import get_model_router
+from .scheduler import Priority
+from .snapshots import diff
+
+logger = get_logger("server")
+
+# Largest request head or body, and largest WebSocket message, accepted from a client
+MAX_REQUEST_BYTES = 64 * 1024
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+# RFC 6455 close codes
+CLOSE_NORMAL, CLOSE_INVALID_PAYLOAD = 1000, 1007
+
+HTTP_REASONS = {
+    200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    429: "Too Many Requests", 503: "Service Unavailable"
+}
+
+class GameUnavailable(Exception):
+    """A message was refused; ``status`` is the HTTP status that describes why"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class WebSocketProtocolError(Exception):
+    """The client sent something the protocol forbids; ``code`` is the close code to send"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+class Subscriber:
+    """Bounded outbound event queue for one connected client.
+
+    Text deltas are dropped while the queue is full; the complete response
+    follows in a later event anyway. Any other event that does not fit closes
+    the subscriber, so one slow client never holds back the game.
+    """
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+        self.closed = False
+        self.close_code = CLOSE_NORMAL
+        self.dropped = 0
+
+    def offer(self, event: Dict, droppable: bool = False):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if droppable:
+                self.dropped += 1
+                return
+            logger.warning("Disconnecting slow subscriber (%d events queued)", self.queue.qsize())
+            self.close()
+
+    def close(self, code: int = CLOSE_NORMAL):
+        if not self.closed:
+            self.closed = True
+            self.close_code = code
+            # Wake the writer even if the queue is full
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+class GameActor:
+    """Owns one Arena and plays its messages one at a time from a bounded inbox.
+
+    Every change is published to the game's subscribers: streamed GM, Player B
+    and narrator text as coalesced deltas, then the final text and a state diff.
+    """
+
+    def __init__(self, arena: Arena, inbox_size: int, outbox_size: int,
+                 render_settings: Optional[Dict] = None):
+        self.arena = arena
+        self.inbox: asyncio.Queue = asyncio.Queue(inbox_size)
+        self.outbox_size = outbox_size
+        self.render_settings = render_settings or {}
+        self.subscribers: Set[Subscriber] = set()
+        self.last_active = time.monotonic()
+        self.playing = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def game_id(self) -> str:
+        return self.arena.game_id
+
+    @property
+    def idle(self) -> bool:
+        return not self.playing and self.inbox.empty() and not self.subscribers
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop playing, snapshot the game and disconnect every subscriber"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.arena.save_snapshot_async()
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+        self.subscribers.clear()
+
+    def submit(self, text: str) -> int:
+        """Queue a Player A message and return how many messages are now waiting"""
+        if self.arena.is_over():
+            raise GameUnavailable(409, "Game is over")
+        try:
+            self.inbox.put_nowait(text)
+        except asyncio.QueueFull:
+            raise GameUnavailable(429, "Game is busy; try again once queued messages are played")
+        self.last_active = time.monotonic()
+        return self.inbox.qsize()
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.outbox_size)
+        subscriber.offer({"type": "hello", **self.status(), "transcript": list(self.arena.transcript())})
+        self.subscribers.add(subscriber)
+        self.last_active = time.monotonic()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        self.last_active = time.monotonic()
+
+    def publish(self, event: Dict, droppable: bool = False):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(event, droppable)
+            if subscriber.closed:
+                self.subscribers.discard(subscriber)
+
+    def status(self) -> Dict:
+        arena = self.arena
+        return {
+            "game_id": self.game_id,
+            "state": arena.game_state.to_dict(),
+            "rounds_played": arena.rounds_played,
+            "conversation_turns": arena.conversation_turns,
+            "queued": self.inbox.qsize(),
+            "playing": self.playing,
+            "over": arena.is_over(),
+            "winner": arena.winner()
+        }
+
+    def _delta_stream(self, phase: str) -> RenderCoalescer:
+        """Publishes one phase's streamed text as coalesced delta events"""
+        sent = 0
+
+        def send_delta(text: str):
+            nonlocal sent
+            if len(text) > sent:
+                self.publish({"type": "delta", "phase": phase, "text": text[sent:]}, droppable=True)
+                sent = len(text)
+
+        return RenderCoalescer(send_delta, **self.render_settings)
+
+    async def _run(self):
+        while True:
+            text = await self.inbox.get()
+            self.playing = True
+            try:
+                await self._play(text)
+            except Exception as e:
+                logger.error("Game %s failed to play a message: %s", self.game_id, e)
+                self.publish({"type": "error", "message": str(e)})
+            finally:
+                self.playing = False
+                self.last_active = time.monotonic()
+
+    async def _play(self, text: str):
+        arena = self.arena
+        if arena.is_over():
+            self.publish({"type": "error", "message": "Game is over"})
+            return
+        self.publish({"type": "player_message", "text": text})
+        before = arena.timeline[-1]
+
+        streams = {phase: self._delta_stream(phase) for phase in ("game_master", "player_b", "narrator")}
+        try:
+            if arena.round_complete:
+                # The previous round end failed; close that round before the next exchange
+                await self._finish_round(streams)
+            narrative = await arena.play_exchange(text, streams["game_master"].update)
+            streams["game_master"].flush()
+            self.publish({"type": "gm_response", "text": narrative})
+            if arena.round_complete:
+                await self._finish_round(streams)
+        finally:
+            for stream in streams.values():
+                stream.close()
+        self.publish({"type": "state", "diff": diff(before, arena.timeline[-1])})
+        if arena.is_over():
+            self.publish({"type": "game_over", "winner": arena.winner()})
+
+    async def _finish_round(self, streams: Dict[str, RenderCoalescer]):
+        arena = self.arena
+        await arena.finish_round(lambda phase, text: streams[phase].update(text), Priority.INTERACTIVE)
+        streams["player_b"].flush()
+        streams["narrator"].flush()
+        self.publish({
+            "type": "round_end",
+            "rounds_played": arena.rounds_played,
+            "player_b": arena.player_b.narrative_history[-1]["turn_narrative"],
+            "summary": arena.game_state.public_narrative[-1]
+        })
+
+class ArenaServer:
+    """Hosts many games over HTTP and WebSocket on one event loop.
+
+    Routes:
+      POST /games                    create a game, returns its id
+      GET  /games/{id}               game status and full state
+      POST /games/{id}/messages      queue a Player A message (429 when the inbox is full)
+      GET  /games/{id}/ws            WebSocket: send messages, receive streamed events
+      GET  /health                   live game and subscriber counts, latency per model,
+                                     LLM client health per API key hash
+    """
+
+    def __init__(self, api_key: str, prompt_manager: PromptManager, store: Optional[EventStore],
+                 host: str, port: int, inbox_size: int, outbox_size: int, max_games: int,
+                 idle_seconds: float):
+        self.api_key = api_key
+        self.prompt_manager = prompt_manager
+        self.store = store
+        self.host = host
+        self.port = port
+        self.inbox_size = inbox_size
+        self.outbox_size = outbox_size
+        self.max_games = max_games
+        self.idle_seconds = idle_seconds
+        self.render_settings = get_render_settings()
+        self.actors: Dict[str, GameActor] = {}
+        self._resuming: Dict[str, asyncio.Task] = {}
+
+    async def serve(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_REQUEST_BYTES)
+        chores = [asyncio.ensure_future(self._sweep_idle()), asyncio.ensure_future(self._refresh_prompts())]
+        logger.info("Arena server listening on http://%s:%d", self.host, self.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for chore in chores:
+                chore.cancel()
+            for actor in list(self.actors.values()):
+                await actor.stop()
+
+    async def create_game(self, options: Dict) -> GameActor:
+        if len(self.actors) + len(self._resuming) >= self.max_games:
+            raise GameUnavailable(503, "Server is at its game limit")
+        selected_prompts = dict(DEFAULT_PROMPT_NAMES)
+        for prompt_type, name in (options.get("prompts") or {}).items():
+            try:
+                prompt_type = PromptType(prompt_type)
+            except ValueError:
+                raise GameUnavailable(400, f"Unknown prompt type: {prompt_type}")
+            try:
+                self.prompt_manager.get_prompt(prompt_type, name)
+            except ValueError as e:
+                raise GameUnavailable(400, str(e))
+            selected_prompts[prompt_type] = name
+        # In a thread: with a store, creating the arena writes the game's record
+        arena = await asyncio.to_thread(
+            Arena,
+            self.api_key,
+            self.prompt_manager,
+            selected_prompts,
+            player_name=options.get("player_name") or "Player A",
+            speculative_player_b=bool(options.get("speculative_player_b")),
+            store=self.store
+        )
+        return self._start(arena)
+
+    async def get_actor(self, game_id: str) -> Optional[GameActor]:
+        """Live actor for a game, resuming it from the store if it was evicted"""
+        actor = self.actors.get(game_id)
+        if actor is not None or self.store is None:
+            return actor
+        resuming = self._resuming.get(game_id)
+        if resuming is None:
+            if len(self.actors) + len(self._resuming) >= self.max_games:
+                raise GameUnavailable(503, "Server is at its game limit")
+            # One resume per game, however many requests for it arrive meanwhile
+            resuming = self._resuming[game_id] = asyncio.ensure_future(self._resume(game_id))
+        # Shielded so a client that disconnects does not abandon the resume for the others
+        return await asyncio.shield(resuming)
+
+    async def _resume(self, game_id: str) -> Optional[GameActor]:
+        try:
+            arena = await asyncio.to_thread(Arena.resume, self.store, game_id, self.api_key, self.prompt_manager)
+            return self._start(arena) if arena is not None else None
+        finally:
+            del self._resuming[game_id]
+
+    def _start(self, arena: Arena) -> GameActor:
+        actor = GameActor(arena, self.inbox_size, self.outbox_size, self.render_settings)
+        self.actors[arena.game_id] = actor
+        actor.start()
+        return actor
+
+    async def _sweep_idle(self):
+        """Snapshot and drop games nobody has used for idle_seconds; the store brings them back"""
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_seconds / 4))
+            if self.store is None:
+                continue
+            cutoff = time.monotonic() - self.idle_seconds
+            for actor in [actor for actor in self.actors.values() if actor.idle and actor.last_active < cutoff]:
+                del self.actors[actor.game_id]
+                await actor.stop()
+                logger.info("Evicted idle game %s", actor.game_id)
+
+    async def _refresh_prompts(self):
+        """Pick up prompt files edited on disk, as every Streamlit rerun does"""
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.prompt_manager.refresh)
+            except Exception as e:
+                logger.error("Failed to refresh prompts: %s", e)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, headers, body = await read_request(reader)
+            parts = [part for part in path.split("?", 1)[0].split("/") if part]
+            if len(parts) == 3 and parts[0] == "games" and parts[2] == "ws" and method == "GET":
+                actor = await self.get_actor(parts[1])
+                if actor is None:
+                    await write_json(writer, 404, {"error": "Unknown game"})
+                elif not await accept_websocket(writer, headers):
+                    await write_json(writer, 400, {"error": "Expected a WebSocket upgrade"})
+                else:
+                    await self._serve_websocket(actor, reader, writer)
+                return
+            status, payload = await self._route(method, parts, body)
+            await write_json(writer, status, payload)
+        except GameUnavailable as e:
+            await write_json(writer, e.status, {"error": str(e)})
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error("Request failed: %s", e)
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, parts: list, body: Dict) -> Tuple[int, Dict]:
+        if parts == ["health"]:
+            return 200, {
+                "games": len(self.actors),
+                "playing": sum(actor.playing for actor in self.actors.values()),
+                "subscribers": sum(len(actor.subscribers) for actor in self.actors.values()),
+                "models": get_model_router().stats(),
+                "llm_clients": {key: health.to_dict() for key, health in get_client_pool().health().items()}
+            }
+        if parts == ["games"]:
+            if method != "POST":
+                return 405, {"error": "Use POST to create a game"}
+            return 201, {"game_id": (await self.create_game(body)).game_id}
+        if len(parts) in (2, 3) and parts[0] == "games":
+            actor = await self.get_actor(parts[1])
+            if actor is None:
+                return 404, {"error": "Unknown game"}
+            if len(parts) == 2 and method == "GET":
+                return 200, actor.status()
+            if parts[2:] == ["messages"] and method == "POST":
+                text = body.get("text")
+                if not isinstance(text, str) or not text.strip():
+                    return 400, {"error": "Expected a non-empty text field"}
+                return 202, {"queued": actor.submit(text)}
+            return 405, {"error": "Method not allowed"}
+        return 404, {"error": "Not found"}
+
+    async def _serve_websocket(self, actor: GameActor, reader: asyncio.StreamReader,
+                               writer: asyncio.StreamWriter):
+        subscriber = actor.subscribe()
+        sender = asyncio.ensure_future(send_events(subscriber, writer))
+        try:
+            while not subscriber.closed:
+                message = await read_websocket_message(reader, writer)
+                if message is None:
+                    break
+                try:
+                    command = json.loads(message)
+                    if command.get("type") != "message" or not isinstance(command.get("text"), str):
+                        raise ValueError("Expected {\"type\": \"message\", \"text\": ...}")
+                    subscriber.offer({"type": "queued", "queued": actor.submit(command["text"])})
+                except GameUnavailable as e:
+                    subscriber.offer({"type": "error", "status": e.status, "message": str(e)})
+                except (ValueError, AttributeError) as e:
+                    subscriber.offer({"type": "error", "status": 400, "message": str(e)})
+        except WebSocketProtocolError as e:
+            logger.warning("Closing WebSocket for game %s: %s", actor.game_id, e)
+            subscriber.close(e.code)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            actor.unsubscribe(subscriber)
+            subscriber.close()
+            await sender
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], Dict]:
+    """Read one HTTP/1.1 request and return its method, path, headers and JSON body"""
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    request_line, *header_lines = head.split("\r\n")
+    try:
+        method, path, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise GameUnavailable(400, "Malformed request line")
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise GameUnavailable(400, "Invalid Content-Length")
+    if length > MAX_REQUEST_BYTES:
+        raise GameUnavailable(413, "Request body too large")
+    body = {}
+    if length:
+        try:
+            body = json.loads(await reader.readexactly(length))
+        except json.JSONDecodeError:
+            raise GameUnavailable(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise GameUnavailable(400, "Request body must be a JSON object")
+    return method.upper(), path, headers, body
+
+async def write_json(writer: asyncio.StreamWriter, status: int, payload: Any):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        .encode("latin-1") + body
+    )
+    await writer.drain()
+
+async def accept_websocket(writer: asyncio.StreamWriter, headers: Dict[str, str]) -> bool:
+    """Complete the RFC 6455 opening handshake; False if the request is not an upgrade"""
+    key = headers.get("sec-websocket-key")
+    if headers.get("upgrade", "").lower() != "websocket" or not key:
+        return False
+    accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("latin-1")).digest()).decode("latin-1")
+    writer.write(
+        "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1")
+    )
+    await writer.drain()
+    return True
+
+def encode_frame(opcode: int, payload: bytes) -> bytes:
+    """Unmasked server-to-client frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bool, int, bytes]:
+    """Read one client frame and return (fin, opcode, unmasked payload)"""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_REQUEST_BYTES:
+        raise ConnectionError("WebSocket frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else b""
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+async def read_websocket_message(reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> Optional[str]:
+    """Next complete text message from the client, answering pings; None once it closes"""
+    parts = []
+    while True:
+        fin, opcode, payload = await read_frame(reader)
+        if opcode == OP_CLOSE:
+            writer.write(encode_frame(OP_CLOSE, payload[:2]))
+            return None
+        if opcode == OP_PING:
+            writer.write(encode_frame(OP_PONG, payload))
+            continue
+        if opcode == OP_PONG:
+            continue
+        parts.append(payload)
+        if sum(len(part) for part in parts) > MAX_REQUEST_BYTES:
+            raise ConnectionError("WebSocket message too large")
+        if fin:
+            try:
+                return b"".join(parts).decode("utf-8")
+            except UnicodeDecodeError:
+                raise WebSocketProtocolError(CLOSE_INVALID_PAYLOAD, "Text message is not valid UTF-8")
+
+async def send_events(subscriber: Subscriber, writer: asyncio.StreamWriter):
+    """Write a subscriber's events as WebSocket text frames until it closes"""
+    try:
+        while True:
+            event = await subscriber.queue.get()
+            if event is None:
+                break
+            writer.write(encode_frame(OP_TEXT, json.dumps(event).encode("utf-8")))
+            # Waiting for the socket to drain is what lets a slow client's queue fill up
+            await writer.drain()
+        writer.write(encode_frame(OP_CLOSE, struct.pack("!H", subscriber.close_code)))
+        await writer.drain()
+    except ConnectionError:
+        subscriber.close()
+
+def main():
+    configure_logging()
+    settings = get_server_settings()
+    server = ArenaServer(
+        get_api_key(),
+        get_prompt_manager(),
+        get_event_store(),
+        host=settings["host"],
+        port=settings["port"],
+        inbox_size=settings["inbox_size"],
+        outbox_size=settings["outbox_size"],
+        max_games=settings["max_games"],
+        idle_seconds=get_game_store_settings()["idle_seconds"]
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+import copy
+
+# Entries per chunk of a PersistentVector; an update copies one chunk plus the chunk index
+CHUNK_SIZE = 32
+
+class PersistentVector:
+    """Immutable vector split into fixed-size chunks.
+
+    ``set_many`` returns a new vector that copies only the chunks it touches
+    and shares every other chunk with the original, so successive versions of
+    a mostly unchanged vector cost O(changes + length / CHUNK_SIZE).
+    """
+
+    __slots__ = ("_chunks", "_length")
+
+    def __init__(self, chunks: Tuple[Tuple, ...] = (), length: int = 0):
+        self._chunks = chunks
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> Any:
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self._chunks[index // CHUNK_SIZE][index % CHUNK_SIZE]
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def set_many(self, items: Dict[int, Any]) -> "PersistentVector":
+        """New vector with the given indexes replaced; indexes may extend the end contiguously"""
+        if not items:
+            return self
+        chunks = list(self._chunks)
+        touched: Dict[int, List] = {}
+        length = self._length
+        for index in sorted(items):
+            if index > length:
+                raise IndexError(index)
+            chunk_index, offset = divmod(index, CHUNK_SIZE)
+            if chunk_index not in touched:
+                touched[chunk_index] = list(chunks[chunk_index]) if chunk_index < len(chunks) else []
+            chunk = touched[chunk_index]
+            if offset == len(chunk):
+                chunk.append(items[index])
+                length += 1
+            else:
+                chunk[offset] = items[index]
+        for chunk_index in sorted(touched):
+            if chunk_index < len(chunks):
+                chunks[chunk_index] = tuple(touched[chunk_index])
+            else:
+                chunks.append(tuple(touched[chunk_index]))
+        return PersistentVector(tuple(chunks), length)
+
+    def changed_indexes(self, other: "PersistentVector") -> Iterator[int]:
+        """Indexes whose entries differ from ``other``, skipping chunks the two vectors share"""
+        for chunk_index, chunk in enumerate(self._chunks):
+            other_chunk = other._chunks[chunk_index] if chunk_index < len(other._chunks) else ()
+            if chunk is other_chunk:
+                continue
+            for offset, entry in enumerate(chunk):
+                if offset >= len(other_chunk) or entry is not other_chunk[offset] and entry != other_chunk[offset]:
+                    yield chunk_index * CHUNK_SIZE + offset
+
+class EntityRecord(NamedTuple):
+    """One combatant at one point in time; shared between snapshots until it changes"""
+    entity_id: str
+    name: str
+    hp: int
+    position: Tuple[int, int]
+    custom_stats: Mapping
+    changed_at: int
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "hp": self.hp,
+            "position": list(self.position),
+            "custom_stats": dict(self.custom_stats)
+        }
+
+def freeze_stats(stats: Dict) -> Mapping:
+    return MappingProxyType(copy.deepcopy(stats))
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    """Immutable view of a GameState at one turn.
+
+    Entity records live in a PersistentVector shared with earlier snapshots.
+    Narratives and actions are not copied: the snapshot keeps a reference to
+    the game's append-only logs and how many entries it covers.
+    """
+    width: int
+    height: int
+    turn_number: int
+    current_player: Optional[str]
+    entities: PersistentVector
+    narrative_log: List[str]
+    narrative_turns: List[int]
+    narrative_count: int
+    action_history: Any
+    action_count: int
+
+    def entity(self, entity_id: str) -> Optional[EntityRecord]:
+        for record in self.entities:
+            if record.entity_id == entity_id:
+                return record
+        return None
+
+    @property
+    def narratives(self) -> List[str]:
+        return self.narrative_log[:self.narrative_count]
+
+    def to_dict(self) -> Dict:
+        """Same layout as GameState.to_dict"""
+        return {
+            **{record.entity_id: record.to_dict() for record in self.entities},
+            "turn_number": self.turn_number,
+            "current_player": self.current_player,
+            "public_narrative": self.narratives,
+            "arena": {"width": self.width, "height": self.height}
+        }
+
+def diff(a: StateSnapshot, b: StateSnapshot) -> Dict:
+    """What changed between two snapshots of the same game, from a to b"""
+    changes = {
+        "from_turn": a.turn_number,
+        "to_turn": b.turn_number,
+        "current_player": b.current_player,
+        "entities": {b.entities[index].entity_id: b.entities[index].to_dict()
+                     for index in b.entities.changed_indexes(a.entities)}
+    }
+    if b.narrative_count > a.narrative_count:
+        changes["narratives"] = b.narrative_log[a.narrative_count:b.narrative_count]
+    if b.action_count > a.action_count:
+        actions = (b.action_history.get(turn) for turn in range(a.turn_number, b.turn_number))
+        changes["actions"] = [action.to_summary() for action in actions if action is not None]
+    return changes
@@ -0,0 +1,205 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import re
+from .arena_logging import get_logger
+
+logger = get_logger("agents")
+
+UPDATES_TOOL_NAME = "apply_state_updates"
+
+UPDATE_KEYS = ("hp_changes", "position_changes", "custom_stat_changes")
+
+UPDATES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "narrative": {
+            "type": "string",
+            "description": "Your full response for this turn, exactly as the players should read it"
+        },
+        "hp_changes": {
+            "type": "object",
+            "description": "HP change per combatant id, e.g. {\"player_a\": -10}",
+            "additionalProperties": {"type": "integer"}
+        },
+        "position_changes": {
+            "type": "object",
+            "description": "Movement [dx, dy] per combatant id",
+            "additionalProperties": {"type": "array", "items": {"type": "integer"}, "minItems": 2, "maxItems": 2}
+        },
+        "custom_stat_changes": {
+            "type": "object",
+            "description": "Custom stats to set per combatant id",
+            "additionalProperties": {"type": "object"}
+        }
+    },
+    "required": ["narrative", "hp_changes", "position_changes", "custom_stat_changes"]
+}
+
+def default_updates() -> Dict:
+    """Updates that leave the game state unchanged"""
+    return {
+        "hp_changes": {"player_a": 0, "player_b": 0},
+        "position_changes": {"player_a": [0, 0], "player_b": [0, 0]},
+        "custom_stat_changes": {"player_a": {}, "player_b": {}}
+    }
+
+UPDATES_TOOL = {
+    "name": UPDATES_TOOL_NAME,
+    "description": "Report this turn's narrative and the resulting changes to the game state.",
+    "input_schema": UPDATES_SCHEMA
+}
+
+_JSON_TYPES = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool)
+}
+
+def compile_validator(schema: Dict) -> Callable[[Any], List[str]]:
+    """Turn a JSON schema into a checker that returns a list of errors.
+
+    Supports the subset the tool schemas use: type, properties, required,
+    additionalProperties, items, minItems and maxItems. The schema is walked
+    once here, so validating a payload is a chain of plain function calls.
+    """
+    checks: List[Callable[[Any, str, List[str]], bool]] = []
+
+    if "type" in schema:
+        type_name, is_type = schema["type"], _JSON_TYPES[schema["type"]]
+
+        def check_type(value, path, errors):
+            if not is_type(value):
+                errors.append(f"{path or 'input'}: expected {type_name}")
+                return False
+            return True
+        checks.append(check_type)
+
+    required = tuple(schema.get("required", ()))
+    properties = {name: compile_validator(sub) for name, sub in schema.get("properties", {}).items()}
+    additional = schema.get("additionalProperties")
+    additional_check = compile_validator(additional) if isinstance(additional, dict) else None
+    if required or properties or additional is not None:
+        def check_object(value, path, errors):
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path or 'input'}: missing {name}")
+            for name, item in value.items():
+                check = properties.get(name, additional_check)
+                if check is not None:
+                    errors.extend(check(item, f"{path}.{name}" if path else name))
+                elif additional is False:
+                    errors.append(f"{path or 'input'}: unexpected {name}")
+            return True
+        checks.append(check_object)
+
+    items = compile_validator(schema["items"]) if "items" in schema else None
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if items or min_items is not None or max_items is not None:
+        def check_array(value, path, errors):
+            if min_items is not None and len(value) < min_items:
+                errors.append(f"{path}: expected at least {min_items} items")
+            if max_items is not None and len(value) > max_items:
+                errors.append(f"{path}: expected at most {max_items} items")
+            if items:
+                for index, item in enumerate(value):
+                    errors.extend(items(item, f"{path}[{index}]"))
+            return True
+        checks.append(check_array)
+
+    def validate(value: Any, path: str = "") -> List[str]:
+        errors: List[str] = []
+        for check in checks:
+            # Structural checks only run once the type matched
+            if not check(value, path, errors):
+                break
+        return errors
+    return validate
+
+validate_updates = compile_validator(UPDATES_SCHEMA)
+
+# Longest run of complete JSON string characters and escapes
+_STRING_PREFIX = re.compile(r'(?:[^"\\]+|\\u[0-9a-fA-F]{4}|\\[^u])*')
+_HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}$')
+# Text kept while looking for the narrative key, in case the key is split across deltas
+_KEY_LOOKBEHIND = 32
+
+class ToolInputStreamParser:
+    """Reads the updates tool input as it streams in as partial JSON.
+
+    The narrative string is decoded incrementally so it can be rendered while
+    the model is still writing; everything else is parsed and validated once
+    in ``finish``. Another tool's text can be streamed by naming its string
+    ``field``.
+    """
+
+    def __init__(self, field: str = "narrative"):
+        self._key = re.compile(rf'"{re.escape(field)}"\s*:\s*"')
+        self._raw_parts: List[str] = []
+        self._scan = ""
+        self._state = "seek"
+        self._narrative_parts: List[str] = []
+        self._narrative: Optional[str] = ""
+
+    def feed(self, partial_json: str) -> str:
+        """Consume a partial JSON delta and return the narrative text it released"""
+        self._raw_parts.append(partial_json)
+        if self._state == "done":
+            return ""
+        self._scan += partial_json
+
+        if self._state == "seek":
+            match = self._key.search(self._scan)
+            if match is None:
+                self._scan = self._scan[-_KEY_LOOKBEHIND:]
+                return ""
+            self._scan = self._scan[match.end():]
+            self._state = "string"
+
+        segment = _STRING_PREFIX.match(self._scan).group()
+        closed = len(segment) < len(self._scan) and self._scan[len(segment)] == '"'
+        if not closed:
+            # Hold back half of a surrogate pair until the other half arrives
+            surrogate = _HIGH_SURROGATE.search(segment)
+            if surrogate:
+                segment = segment[:surrogate.start()]
+        self._scan = "" if closed else self._scan[len(segment):]
+        if closed:
+            self._state = "done"
+
+        released = json.loads(f'"{segment}"') if segment else ""
+        if released:
+            self._narrative_parts.append(released)
+            self._narrative = None
+        return released
+
+    @property
+    def raw(self) -> str:
+        """Tool input received so far"""
+        return "".join(self._raw_parts)
+
+    @property
+    def narrative(self) -> str:
+        """Narrative text decoded so far"""
+        if self._narrative is None:
+            self._narrative = "".join(self._narrative_parts)
+        return self._narrative
+
+    def finish(self) -> Tuple[str, Dict]:
+        """Parse and validate the complete tool input and return the narrative and updates"""
+        raw = self.raw
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.error("Error parsing tool input: %s", e)
+            logger.debug("Raw tool input: %s", raw)
+            return self.narrative.strip(), default_updates()
+
+        errors = validate_updates(data)
+        if errors:
+            logger.error("Invalid state updates: %s", "; ".join(errors))
+            narrative = data.get("narrative") if isinstance(data, dict) else None
+            return (narrative if isinstance(narrative, str) else self.narrative).strip(), default_updates()
+        return data["narrative"].strip(), {key: data[key] for key in UPDATE_KEYS}
@@ -0,0 +1,266 @@
+"""Micro-benchmarks for the pure-Python paths that grow with game length.
+
+Run from the repository root:
+
+    python -m tests.benchmarks.hot_paths                    # compare against baseline.json
+    python -m tests.benchmarks.hot_paths --update-baseline  # record a new baseline
+
+Each benchmark is driven by a synthetic game of 10, 1,000 and 100,000 turns.
+Time is the best of several runs; peak memory is measured separately with
+tracemalloc. The run exits non-zero when a result regresses past the
+tolerance relative to the stored baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from arena_test.game_state import GameState, PlayerState, PlayerType
+from arena_test.grid import _render, build_grid_html
+from arena_test.prompt_manager import Prompt, PromptManager, PromptType
+from arena_test.updates_tool import ToolInputStreamParser
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "prompt_templates")
+SIZES = [10, 1_000, 100_000]
+
+# Results below these floors are too small to compare reliably
+MIN_SECONDS = 1e-4
+MIN_PEAK_BYTES = 64 * 1024
+
+NARRATIVE = "The fighter circles left, feints high and strikes low with the blunt end of the staff."
+UPDATES = {
+    "hp_changes": {"player_a": 0, "player_b": -1},
+    "position_changes": {"player_a": [1, 0], "player_b": [-1, 0]},
+    "custom_stat_changes": {"player_a": {"stamina": 3}, "player_b": {}}
+}
+
+
+def synthetic_game(turns: int) -> GameState:
+    game_state = GameState()
+    for turn in range(turns):
+        player = PlayerType.A if turn % 2 == 0 else PlayerType.B
+        game_state.update_state(UPDATES, player, NARRATIVE)
+    return game_state
+
+
+def synthetic_prompt_library(size: int) -> PromptManager:
+    prompt_manager = PromptManager(PROMPTS_DIR)
+    for index in range(size):
+        prompt_manager.register(Prompt(
+            name=f"Synthetic {index}",
+            content="You are the Game Master for {player_name}.",
+            description="Synthetic benchmark prompt",
+            type=PromptType.GAME_MASTER
+        ))
+    return prompt_manager
+
+
+def bench_to_dict(size: int) -> Callable:
+    game_state = synthetic_game(size)
+
+    # Serialized forms are cached until the next mutation, so each call mutates first
+    def step():
+        game_state.update_state(UPDATES, PlayerType.A, NARRATIVE)
+        return game_state.to_dict()
+    return step
+
+
+def bench_to_json(size: int) -> Callable:
+    game_state = synthetic_game(size)
+
+    def step():
+        game_state.update_state(UPDATES, PlayerType.A, NARRATIVE)
+        return game_state.to_json()
+    return step
+
+
+def bench_update_state(size: int) -> Callable:
+    game_state = synthetic_game(size)
+    return lambda: game_state.update_state(UPDATES, PlayerType.A, NARRATIVE)
+
+
+def bench_apply_updates(size: int) -> Callable:
+    # Here size is the number of combatants, each moving and taking damage every call
+    game_state = GameState(width=500, height=500)
+    for index in range(size):
+        game_state.add_entity(f"npc_{index}", PlayerState(f"NPC {index}", 100, (index % 500, index // 500 % 500)))
+    updates = {
+        "hp_changes": {entity_id: -1 for entity_id in game_state.entities.ids},
+        "position_changes": {entity_id: [1, -1] for entity_id in game_state.entities.ids}
+    }
+    return lambda: game_state.entities.apply_updates(updates)
+
+
+def bench_snapshot(size: int) -> Callable:
+    game_state = synthetic_game(size)
+
+    def step():
+        game_state.update_state(UPDATES, PlayerType.A, NARRATIVE)
+        return game_state.snapshot()
+    return step
+
+
+def bench_get_recent_actions(size: int) -> Callable:
+    return synthetic_game(size).get_recent_actions
+
+
+def bench_get_prompt(size: int) -> Callable:
+    prompt_manager = synthetic_prompt_library(size)
+    return lambda: prompt_manager.get_prompt(PromptType.GAME_MASTER, "Default Game Master")
+
+
+def bench_format_prompt(size: int) -> Callable:
+    prompt_manager = PromptManager(PROMPTS_DIR)
+    # Template that still embeds the rendered history, as custom prompts may
+    prompt = Prompt(
+        name="Synthetic history",
+        content="You are the Game Master for {player_name}.\n{conversation_history}\n"
+                "{game_state}\nPlayer's current message: {player_message}",
+        description="Synthetic benchmark prompt",
+        type=PromptType.GAME_MASTER
+    )
+    history = "\n".join(f"Turn {turn}:\nPlayer: I attack on turn {turn}\nGM: {NARRATIVE}\n"
+                        for turn in range(size))
+    return lambda: prompt_manager.format_prompt(
+        prompt,
+        player_name="Player A",
+        conversation_history=history,
+        game_state="{}",
+        player_message="I attack"
+    )
+
+
+def bench_parse_tool_input(size: int) -> Callable:
+    text = json.dumps({"narrative": (NARRATIVE + " ") * size, **UPDATES})
+    chunks = [text[start:start + 8] for start in range(0, len(text), 8)]
+
+    def parse():
+        parser = ToolInputStreamParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.finish()
+    return parse
+
+
+def bench_grid_html(size: int) -> Callable:
+    game_state = synthetic_game(size)
+
+    # Renders are memoized by viewport and positions; time a render that misses
+    def step():
+        _render.cache_clear()
+        return build_grid_html(game_state)
+    return step
+
+
+BENCHMARKS: Dict[str, Callable[[int], Callable]] = {
+    "GameState.to_dict": bench_to_dict,
+    "GameState.to_json": bench_to_json,
+    "GameState.update_state": bench_update_state,
+    "GameState.snapshot": bench_snapshot,
+    "GameState.get_recent_actions": bench_get_recent_actions,
+    "EntityTable.apply_updates": bench_apply_updates,
+    "PromptManager.get_prompt": bench_get_prompt,
+    "PromptManager.format_prompt": bench_format_prompt,
+    "ToolInputStreamParser": bench_parse_tool_input,
+    "build_grid_html": bench_grid_html,
+}
+
+
+def measure(fn: Callable, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def run(sizes: List[int], names: List[str]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for name in names:
+        results[name] = {}
+        for size in sizes:
+            fn = BENCHMARKS[name](size)
+            repeat = 3 if size >= 100_000 else 20
+            results[name][str(size)] = measure(fn, repeat)
+            print(f"{name:40} {size:>8} turns  "
+                  f"{results[name][str(size)]['seconds'] * 1000:10.3f} ms  "
+                  f"{results[name][str(size)]['peak_bytes'] / 1024:10.1f} KiB")
+    return results
+
+
+def find_regressions(results: Dict, baseline: Dict, time_tolerance: float,
+                     memory_tolerance: float) -> List[str]:
+    regressions = []
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            expected = baseline.get(name, {}).get(size)
+            if expected is None:
+                continue
+            if (result["seconds"] > MIN_SECONDS
+                    and result["seconds"] > expected["seconds"] * time_tolerance):
+                regressions.append(
+                    f"{name} @ {size} turns: {result['seconds']:.6f}s vs baseline {expected['seconds']:.6f}s"
+                )
+            if (result["peak_bytes"] > MIN_PEAK_BYTES
+                    and result["peak_bytes"] > expected["peak_bytes"] * memory_tolerance):
+                regressions.append(
+                    f"{name} @ {size} turns: {result['peak_bytes']} B peak vs baseline {expected['peak_bytes']} B"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update-baseline", action="store_true", help="overwrite the stored baseline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="synthetic game lengths in turns")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS),
+                        help="benchmarks to run")
+    parser.add_argument("--time-tolerance", type=float, default=2.0,
+                        help="allowed slowdown factor before failing")
+    parser.add_argument("--memory-tolerance", type=float, default=1.5,
+                        help="allowed peak memory growth factor before failing")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.only)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        for name, by_size in results.items():
+            baseline.setdefault(name, {}).update(by_size)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded; run with --update-baseline first")
+        return 1
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    regressions = find_regressions(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
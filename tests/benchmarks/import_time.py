@@ -0,0 +1,94 @@
+"""Import-time budget for the arena_test modules that workers and CLI tools load.
+
+Run from the repository root:
+
+    python -m tests.benchmarks.import_time
+    python -m tests.benchmarks.import_time --only arena_test.game_state --runs 10
+
+Each module is imported in a fresh interpreter with ``-X importtime``; its
+cumulative import time is the best of several runs. The run exits non-zero
+when a module exceeds its budget or pulls in a heavy dependency (Streamlit,
+the Anthropic SDK, httpx, PyYAML) that should only be loaded on first use.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import List, Optional, Set, Tuple
+
+# Cumulative import time allowed per module, in milliseconds, with headroom for
+# noisy machines. NumPy, loaded by the entity table, is most of the game_state
+# budget and asyncio a good part of the arena's; the SDK alone would take more.
+BUDGETS_MS = {
+    "arena_test.config": 40,
+    "arena_test.snapshots": 40,
+    "arena_test.prompt_manager": 60,
+    "arena_test.event_store": 60,
+    "arena_test.game_state": 200,
+    "arena_test.grid": 200,
+    "arena_test.arena": 400,
+    "arena_test.server": 400,
+}
+
+# Top-level packages that no module above may import eagerly
+LAZY_DEPENDENCIES = {"streamlit", "anthropic", "httpx", "yaml"}
+
+RUNS = 5
+
+
+def import_once(module: str) -> Tuple[float, Set[str]]:
+    """Cumulative import time of ``module`` in ms and the top-level packages it loaded"""
+    code = f"import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    cumulative_us: Optional[int] = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, _, cumulative, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        if name == module:
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        raise RuntimeError(f"{module} did not appear in the -X importtime output")
+    loaded = {name.split(".")[0] for name in json.loads(result.stdout)}
+    return cumulative_us / 1000, loaded
+
+
+def check(modules: List[str], runs: int) -> List[str]:
+    failures = []
+    for module in modules:
+        best = float("inf")
+        loaded: Set[str] = set()
+        for _ in range(runs):
+            ms, loaded = import_once(module)
+            best = min(best, ms)
+        budget = BUDGETS_MS[module]
+        eager = sorted(loaded & LAZY_DEPENDENCIES)
+        print(f"{module:30} {best:8.1f} ms  (budget {budget} ms)"
+              + (f"  loads {', '.join(eager)}" if eager else ""))
+        if best > budget:
+            failures.append(f"{module}: {best:.1f} ms over its {budget} ms budget")
+        if eager:
+            failures.append(f"{module}: imports {', '.join(eager)} eagerly")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(BUDGETS_MS), default=list(BUDGETS_MS),
+                        help="modules to check")
+    parser.add_argument("--runs", type=int, default=RUNS, help="fresh interpreters per module")
+    args = parser.parse_args(argv)
+
+    failures = check(args.only, args.runs)
+    if failures:
+        print("\nOver budget:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nAll modules within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
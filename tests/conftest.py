@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+import pytest
+
+from arena_test.arena import Arena
+from arena_test.event_store import EventStore
+from arena_test.narrator import NARRATION_TOOL_NAME
+from arena_test.prompt_manager import DEFAULT_PROMPT_NAMES, PromptManager
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "prompt_templates")
+
+
+class FakeLLM:
+    """Stands in for LLMClient: answers each tool call with a canned tool input.
+
+    Tool names in ``fail`` raise instead, and ``updates`` is what every
+    updates-tool call reports. The input streams in ``chunk``-sized deltas,
+    or all at once when it is None.
+    """
+
+    def __init__(self):
+        self.calls: List[str] = []
+        self.requests: List[List[Dict]] = []
+        self.priorities: List = []
+        self.chunk: Optional[int] = None
+        self.fail = set()
+        self.updates: Dict = {
+            "hp_changes": {"player_a": 0, "player_b": -1},
+            "position_changes": {"player_a": [1, 0], "player_b": [0, 0]},
+            "custom_stat_changes": {"player_a": {}, "player_b": {}}
+        }
+
+    async def stream_tool(self, messages: List[Dict], model: str, max_tokens: int, tool: Dict,
+                          on_json: Callable[[str], None], system: Optional[List[Dict]] = None,
+                          priority=None, validate=None) -> str:
+        name = tool["name"]
+        self.calls.append(name)
+        self.requests.append(messages)
+        self.priorities.append(priority)
+        # Yield like a network call, so concurrent work gets to run
+        await asyncio.sleep(0)
+        if name in self.fail:
+            raise RuntimeError(f"{name} failed")
+        if name == NARRATION_TOOL_NAME:
+            payload = {"summary": f"Summary {len(self.calls)}", "story_so_far": f"Story {len(self.calls)}"}
+        else:
+            payload = {"narrative": f"Turn {len(self.calls)}", **self.updates}
+        text = json.dumps(payload)
+        chunk = self.chunk or len(text)
+        for start in range(0, len(text), chunk):
+            on_json(text[start:start + chunk])
+        return text
+
+    async def complete(self, messages: List[Dict], model: str, max_tokens: int,
+                       system: Optional[List[Dict]] = None, priority=None) -> str:
+        self.calls.append("complete")
+        return "Earlier turns, summarized."
+
+
+def use_llm(arena: Arena, llm: FakeLLM) -> Arena:
+    for agent in (arena.game_master, arena.player_b, arena.narrator):
+        agent.llm = llm
+        if hasattr(agent, "context"):
+            agent.context.llm = llm
+    return arena
+
+
+@pytest.fixture
+def prompt_manager() -> PromptManager:
+    return PromptManager(PROMPTS_DIR)
+
+
+@pytest.fixture
+def llm() -> FakeLLM:
+    return FakeLLM()
+
+
+@pytest.fixture
+def store(tmp_path) -> EventStore:
+    return EventStore(str(tmp_path / "games.sqlite3"))
+
+
+@pytest.fixture
+def make_arena(prompt_manager, llm):
+    def make(**kwargs) -> Arena:
+        return use_llm(Arena("test-key", prompt_manager, dict(DEFAULT_PROMPT_NAMES), **kwargs), llm)
+    return make
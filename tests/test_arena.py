@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+
+from arena_test.arena import EXCHANGES_PER_ROUND, Arena
+from arena_test.narrator import NARRATION_TOOL_NAME
+from arena_test.scheduler import Priority
+from arena_test.updates_tool import UPDATES_TOOL_NAME
+
+
+async def play_round_exchanges(arena):
+    for turn in range(EXCHANGES_PER_ROUND):
+        await arena.play_exchange(f"I attack on turn {turn}")
+
+
+def test_retried_round_end_skips_player_b(make_arena, llm, store, prompt_manager):
+    arena = make_arena(store=store)
+
+    async def scenario():
+        await play_round_exchanges(arena)
+        llm.fail.add(NARRATION_TOOL_NAME)
+        with pytest.raises(RuntimeError):
+            await arena.finish_round()
+        assert arena.round_complete
+        resumed = Arena.resume(store, arena.game_id, "test-key", prompt_manager)
+        assert resumed.round_phases == {"player_b"}
+        llm.fail.clear()
+        updates_calls = llm.calls.count(UPDATES_TOOL_NAME)
+        await arena.finish_round()
+        # Player B's turn from the failed attempt stands; only the narrator runs again
+        assert llm.calls.count(UPDATES_TOOL_NAME) == updates_calls
+
+    asyncio.run(scenario())
+    kinds = [kind for _, kind, _ in store.events_after(arena.game_id, 0)]
+    assert kinds.count("player_b_turn") == 1
+    assert kinds[-2:] == ["narrative", "round_end"]
+    assert len(arena.player_b.narrative_history) == 1
+    assert arena.rounds_played == 1 and not arena.round_phases
+
+
+NO_CHANGE = {
+    "hp_changes": {"player_a": 0, "player_b": 0},
+    "position_changes": {"player_a": [0, 0], "player_b": [0, 0]},
+    "custom_stat_changes": {"player_a": {}, "player_b": {}}
+}
+
+
+@pytest.mark.parametrize("final_updates, accepted", [(NO_CHANGE, True), (None, False)])
+def test_speculative_turn_is_kept_only_if_stats_are_unchanged(make_arena, llm, final_updates, accepted):
+    arena = make_arena(speculative_player_b=True)
+
+    async def scenario():
+        for turn in range(EXCHANGES_PER_ROUND - 1):
+            await arena.play_exchange(f"move {turn}")
+        if final_updates is not None:
+            llm.updates = final_updates
+        await arena.play_exchange("final move")
+        await arena.finish_round()
+
+    asyncio.run(scenario())
+    # Five GM exchanges and the speculative turn, plus a fresh turn if it was rejected
+    assert llm.calls.count(UPDATES_TOOL_NAME) == (6 if accepted else 7)
+    assert arena.player_b.pending_turn is None
+    assert len(arena.player_b.narrative_history) == 1
+
+
+def test_failed_final_exchange_cancels_its_speculation(make_arena, llm):
+    arena = make_arena(speculative_player_b=True)
+    started = []
+
+    async def never_finishes(**kwargs):
+        started.append(True)
+        await asyncio.Event().wait()
+
+    async def scenario():
+        for turn in range(EXCHANGES_PER_ROUND - 1):
+            await arena.play_exchange(f"move {turn}")
+        arena.player_b.llm = type("HangingLLM", (), {"stream_tool": staticmethod(never_finishes)})()
+        llm.fail.add(UPDATES_TOOL_NAME)
+        with pytest.raises(RuntimeError):
+            await arena.play_exchange("final move")
+        assert started and arena._speculation is None
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
+    assert arena.player_b.pending_turn is None
+
+
+def test_concurrent_sessions_play_exchanges_one_at_a_time(make_arena, llm):
+    arena = make_arena()
+
+    async def scenario():
+        await asyncio.gather(arena.play_exchange("first"), arena.play_exchange("second"))
+
+    asyncio.run(scenario())
+    history = arena.game_master.conversation_history
+    assert [turn["player_message"] for turn in history] == ["first", "second"]
+    assert [turn["turn_number"] for turn in history] == [0, 1]
+    # The second request already carries the first exchange
+    assert len(llm.requests[1]) > len(llm.requests[0])
+    assert arena.conversation_turns == 2 and arena.game_state.turn_number == 2
+
+
+def test_concurrent_round_ends_finish_the_round_once(make_arena, llm):
+    arena = make_arena()
+
+    async def scenario():
+        await play_round_exchanges(arena)
+        await asyncio.gather(arena.finish_round(), arena.finish_round())
+
+    asyncio.run(scenario())
+    assert arena.rounds_played == 1
+    assert len(arena.player_b.narrative_history) == 1
+    assert llm.calls.count(NARRATION_TOOL_NAME) == 1
+
+
+def test_resume_rebuilds_the_game_across_snapshots(make_arena, store, prompt_manager, monkeypatch):
+    monkeypatch.setenv("ARENA_SNAPSHOT_EVERY", "3")
+    arena = make_arena(store=store)
+
+    async def scenario():
+        await play_round_exchanges(arena)
+        await arena.finish_round()
+        await arena.play_exchange("into round two")
+        await arena.play_exchange("still round two")
+
+    asyncio.run(scenario())
+    snapshot = store.latest_snapshot(arena.game_id)
+    assert snapshot is not None and 0 < snapshot[0] < arena.event_seq
+
+    resumed = Arena.resume(store, arena.game_id, "test-key", prompt_manager)
+    assert resumed.event_seq == arena.event_seq
+    assert resumed.to_snapshot() == arena.to_snapshot()
+    assert resumed.game_state.to_dict() == arena.game_state.to_dict()
+    assert list(resumed.transcript()) == list(arena.transcript())
+
+    # With a snapshot at the very last event, nothing is replayed and the result is the same
+    arena.save_snapshot()
+    assert Arena.resume(store, arena.game_id, "test-key", prompt_manager).to_snapshot() == arena.to_snapshot()
+
+
+@pytest.mark.parametrize("watched, player_b_priority", [(False, Priority.BACKGROUND), (True, Priority.INTERACTIVE)])
+def test_player_b_is_interactive_only_when_watched(make_arena, llm, watched, player_b_priority):
+    arena = make_arena()
+    messages = [f"move {turn}" for turn in range(EXCHANGES_PER_ROUND)]
+
+    async def scenario():
+        if not watched:
+            return await arena.run_round(messages)
+        await play_round_exchanges(arena)
+        await arena.finish_round(priority=Priority.INTERACTIVE)
+
+    asyncio.run(scenario())
+    player_b_call = len(messages)
+    assert llm.calls[player_b_call] == UPDATES_TOOL_NAME
+    assert llm.priorities[player_b_call] == player_b_priority
+    # The round's progress is still tracked for readers that poll it
+    assert set(arena.round_text()) == {"player_b", "narrator"}
+
+
+def test_streamed_pieces_add_up_to_the_text(make_arena, llm):
+    arena = make_arena()
+    llm.chunk = 3
+    gm_pieces, round_pieces = [], []
+
+    async def scenario():
+        narrative = None
+        for turn in range(EXCHANGES_PER_ROUND):
+            gm_pieces.clear()
+            narrative = await arena.play_exchange(f"move {turn}", gm_pieces.append)
+        await arena.finish_round(lambda phase, delta: round_pieces.append((phase, delta)))
+        return narrative
+
+    narrative = asyncio.run(scenario())
+    assert len(gm_pieces) > 1 and "".join(gm_pieces) == narrative
+    player_b = "".join(delta for phase, delta in round_pieces if phase == "player_b")
+    assert player_b == arena.player_b.narrative_history[-1]["turn_narrative"]
+    assert arena.round_text() == {"player_b": player_b, "narrator": arena.game_state.public_narrative[-1]}
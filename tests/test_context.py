@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from arena_test.arena import EXCHANGES_PER_ROUND
+from arena_test.context import SUMMARY_MESSAGE, ContextCompactor
+from arena_test.scheduler import estimate_tokens
+
+
+class SummaryLLM:
+    """Answers compaction requests, optionally holding them until ``release`` is set"""
+
+    def __init__(self, fail: bool = False, hold: bool = False):
+        self.fail = fail
+        self.release = asyncio.Event() if hold else None
+        self.prompts = []
+
+    async def complete(self, messages, model, max_tokens, system=None, priority=None):
+        self.prompts.append(messages[0]["content"])
+        if self.release is not None:
+            await self.release.wait()
+        if self.fail:
+            raise RuntimeError("summary failed")
+        return f"Summary {len(self.prompts)}"
+
+
+def turn(index):
+    return {"user": f"Player move number {index:03d} " + "x" * 20, "reply": f"Outcome {index:03d} " + "y" * 30}
+
+
+def tokens(entries):
+    return sum(estimate_tokens(entry["user"]) + estimate_tokens(entry["reply"]) for entry in entries)
+
+
+def compactor(llm, history, budget=200):
+    return ContextCompactor(llm, "Game Master", history, "user", "reply", budget)
+
+
+def test_compaction_folds_down_to_half_the_budget():
+    history = [turn(index) for index in range(20)]
+    context = compactor(SummaryLLM(), history)
+
+    async def scenario():
+        context.schedule()
+        await context._task
+
+    asyncio.run(scenario())
+    verbatim = history[context.summarized_turns:]
+    assert 0 < context.summarized_turns < len(history)
+    assert len(verbatim) >= context.keep_recent
+    # As many turns as fit in half the budget stay verbatim, and not one more
+    assert tokens(verbatim) <= context.token_budget // 2 < tokens(history[context.summarized_turns - 1:])
+    messages = context.messages()
+    assert messages[0]["content"] == SUMMARY_MESSAGE.format(summary="Summary 1")
+    assert [message["content"] for message in messages[3::2]] == [entry["reply"] for entry in verbatim]
+    assert context.tokens_saved == tokens(history[:context.summarized_turns]) - estimate_tokens("Summary 1")
+
+
+def test_history_within_budget_is_left_alone():
+    llm = SummaryLLM()
+    context = compactor(llm, [turn(index) for index in range(3)], budget=10)
+
+    async def scenario():
+        context.schedule()
+
+    asyncio.run(scenario())
+    assert context._task is None and not llm.prompts
+
+
+def test_compaction_runs_in_the_background(make_arena, llm):
+    arena = make_arena()
+    summaries = SummaryLLM(hold=True)
+    arena.game_master.context.llm = summaries
+    arena.game_master.context.token_budget = 10
+    arena.game_master.context.keep_recent = 1
+
+    async def scenario():
+        for index in range(EXCHANGES_PER_ROUND):
+            await arena.play_exchange(f"move {index}")
+        context = arena.game_master.context
+        # Compaction started several exchanges ago and is still waiting; the turns went ahead
+        assert len(summaries.prompts) == 1 and not context._task.done()
+        assert context.summary is None and context.summarized_turns == 0
+        summaries.release.set()
+        await context._task
+        return context
+
+    context = asyncio.run(scenario())
+    assert context.summary == "Summary 1"
+    # Only the turn folded when compaction started is summarized; later exchanges stay verbatim
+    assert context.summarized_turns == 1
+    assert len(context.messages()) == 2 + 2 * (EXCHANGES_PER_ROUND - context.summarized_turns)
+
+
+def test_failed_compaction_keeps_the_full_history_and_retries():
+    llm = SummaryLLM(fail=True)
+    history = [turn(index) for index in range(20)]
+    context = compactor(llm, history)
+    verbatim_messages = context.messages()
+
+    async def scenario():
+        context.schedule()
+        await context._task
+        assert context.summary is None and context.summarized_turns == 0
+        assert context.messages() == verbatim_messages
+        llm.fail = False
+        context.schedule()
+        await context._task
+
+    asyncio.run(scenario())
+    assert len(llm.prompts) == 2
+    assert context.summary == "Summary 2" and context.summarized_turns > 0
+
+
+@pytest.mark.parametrize("summarized", [False, True])
+def test_snapshot_round_trip(summarized):
+    history = [turn(index) for index in range(20)]
+    context = compactor(SummaryLLM(), history)
+    if summarized:
+        async def scenario():
+            context.schedule()
+            await context._task
+        asyncio.run(scenario())
+    restored = compactor(SummaryLLM(), list(history))
+    restored.restore(context.to_snapshot())
+    assert restored.messages() == context.messages()
+    assert restored.stats() == context.stats()
+
+
+def test_turns_carry_state_diffs_between_full_states(make_arena):
+    arena = make_arena()
+    history = arena.game_master.conversation_history
+
+    async def scenario():
+        for index in range(EXCHANGES_PER_ROUND):
+            await arena.play_exchange(f"move {index}")
+
+    asyncio.run(scenario())
+    keep_recent = arena.game_master.context.keep_recent
+    assert [entry["full_state"] for entry in history] == [True] + [False] * (keep_recent - 1) + [True]
+    first, second = history[0]["user_content"], history[1]["user_content"]
+    assert first.startswith("Current game state:") and '"size"' in first
+    assert second.startswith("Changes to the game state since the previous message:")
+    assert '"since":0' in second and '"size"' not in second
+
+
+def test_compaction_never_folds_away_the_last_full_state(make_arena):
+    arena = make_arena()
+    context = arena.game_master.context
+    context.llm = SummaryLLM()
+    context.token_budget = 10
+
+    async def scenario():
+        for index in range(3 * EXCHANGES_PER_ROUND):
+            if arena.round_complete:
+                await arena.finish_round()
+            await arena.play_exchange(f"move {index}")
+            if context._task is not None:
+                await context._task
+            verbatim = context.history[context.summarized_turns:]
+            assert any(entry["full_state"] for entry in verbatim)
+
+    asyncio.run(scenario())
+    assert context.summarized_turns > 0
@@ -0,0 +1,59 @@
+from arena_test.entities import MAX_DELTA, EntityTable
+
+
+def table_with(positions, width=100, height=100):
+    table = EntityTable(width, height, capacity=2)
+    for index, position in enumerate(positions):
+        table.add(f"e{index}", f"E{index}", 10, position)
+    return table
+
+
+def test_near_is_chebyshev_and_sorted_by_distance():
+    # Spread over several spatial-hash buckets
+    table = table_with([(10, 10), (13, 7), (17, 10), (10, 18), (50, 50)])
+    assert table.near((10, 10), 3) == ["e0", "e1"]
+    assert table.near((10, 10), 8) == ["e0", "e1", "e2", "e3"]
+    assert table.near((0, 0), 5) == []
+
+
+def test_at_and_collisions_follow_moves():
+    table = table_with([(5, 5), (6, 5), (20, 20)])
+    assert table.at((5, 5)) == ["e0"]
+    assert table.collisions() == []
+    table.apply_updates({"position_changes": {"e1": [-1, 0], "e2": [-15, -15]}})
+    assert sorted(table.at((5, 5))) == ["e0", "e1", "e2"]
+    assert [sorted(group) for group in table.collisions()] == [["e0", "e1", "e2"]]
+
+
+def test_moves_across_buckets_keep_the_spatial_hash_in_sync():
+    table = table_with([(1, 1)])
+    for _ in range(30):
+        table.apply_updates({"position_changes": {"e0": [3, 2]}})
+    assert table.get("e0").position == (91, 61)
+    assert table.near((91, 61), 0) == ["e0"]
+    assert table.near((1, 1), 5) == []
+
+
+def test_apply_updates_clamps_and_reports_changes():
+    table = table_with([(0, 0), (99, 99)])
+    changed = table.apply_updates({
+        "hp_changes": {"e0": -50, "e1": 0, "unknown": -1},
+        "position_changes": {"e0": [-1, -1], "e1": [5, 5]},
+        "custom_stat_changes": {"e1": {"stance": "guard"}}
+    })
+    assert changed == {"e0", "e1"}
+    assert table.get("e0").hp == 0
+    assert table.get("e1").position == (99, 99)
+
+
+def test_huge_deltas_are_clamped_instead_of_overflowing():
+    table = table_with([(10, 10), (20, 20)])
+    table.apply_updates({
+        "hp_changes": {"e0": 10 ** 20, "e1": -(2 ** 63 - 1)},
+        "position_changes": {"e0": [10 ** 30, -(10 ** 30)]}
+    })
+    assert table.get("e0").hp == 10 + MAX_DELTA
+    assert table.get("e1").hp == 0
+    assert table.get("e0").position == (99, 0)
+    table.apply_updates({"hp_changes": {"e0": 2 ** 63 - 1}})
+    assert table.get("e0").hp == 10 + 2 * MAX_DELTA
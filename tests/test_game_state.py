@@ -0,0 +1,128 @@
+from arena_test.game_state import HISTORY_WINDOW, ActionHistory, GameState, PlayerType, TurnAction
+
+UPDATES = {
+    "hp_changes": {"player_a": 0, "player_b": -5},
+    "position_changes": {"player_a": [1, 0], "player_b": [0, 0]},
+    "custom_stat_changes": {"player_a": {"stamina": 3}, "player_b": {}}
+}
+
+
+def play(game_state, turns):
+    for turn in range(turns):
+        game_state.update_state(UPDATES, PlayerType.A if turn % 2 == 0 else PlayerType.B, f"move {turn}")
+
+
+def test_fork_is_independent_of_the_original():
+    game_state = GameState()
+    play(game_state, 3)
+    game_state.add_narrative("Round one")
+    fork = game_state.fork()
+    assert fork.to_dict() == game_state.to_dict()
+
+    play(fork, 2)
+    fork.player_a.custom_stats["stamina"] = 99
+    assert game_state.player_a.custom_stats["stamina"] == 3
+    assert game_state.turn_number == 3 and fork.turn_number == 5
+    assert len(game_state.action_history) == 3
+    assert game_state.public_narrative == ["Round one"]
+
+
+def test_fork_from_an_earlier_snapshot():
+    game_state = GameState()
+    play(game_state, 2)
+    earlier = game_state.snapshot()
+    expected = game_state.to_dict()
+    play(game_state, 4)
+    game_state.add_narrative("Later")
+
+    fork = game_state.fork(earlier)
+    assert fork.to_dict() == expected
+    assert fork.public_narrative == []
+    play(fork, 1)
+    assert fork.snapshot().entities[1].hp == expected["player_b"]["hp"] - 5
+
+
+def test_diff_since_carries_only_later_changes():
+    game_state = GameState()
+    play(game_state, 2)
+    game_state.add_narrative("Round one")
+    since = game_state.turn_number
+    # A summary written at the diff's first turn counts as part of it
+    assert game_state.diff_since(since) == {"since": since, "t": since, "c": "player_a", "log": ["Round one"]}
+    assert game_state.diff_since(since + 1) == {"since": since + 1, "t": since, "c": "player_a"}
+
+    game_state.update_state({
+        "hp_changes": {"player_a": 0, "player_b": 0},
+        "position_changes": {"player_a": [0, 0], "player_b": [0, 1]},
+        "custom_stat_changes": {"player_a": {}, "player_b": {}}
+    }, PlayerType.A, "step aside")
+    game_state.add_narrative("Round two")
+    diff = game_state.diff_since(since)
+    assert "a" not in diff
+    assert diff["b"] == game_state.player_b.to_compact_dict()
+    assert diff["log"] == ["Round one", "Round two"]
+    assert diff["t"] == since + 1 and diff["c"] == "player_b"
+
+
+def test_diff_since_the_start_is_the_whole_state():
+    game_state = GameState()
+    play(game_state, 3)
+    game_state.add_narrative("Round one")
+    diff = game_state.diff_since(0)
+    assert diff["a"] == game_state.player_a.to_compact_dict()
+    assert diff["b"] == game_state.player_b.to_compact_dict()
+    assert diff["log"] == ["Round one"]
+
+
+def actions(count):
+    return [TurnAction(PlayerType.A if turn % 2 == 0 else PlayerType.B, f"move {turn}",
+                       {"hp_changes": {"player_b": -turn}}, turn) for turn in range(count)]
+
+
+def test_history_spills_past_its_window_and_still_finds_every_turn():
+    history = ActionHistory(window=3)
+    played = actions(8)
+    for action in played:
+        history.append(action)
+    assert len(history) == 8 and len(history.archive) == 5
+    assert history.recent() == played[-3:]
+    assert history.by_player(PlayerType.A) == [played[6]]
+    assert list(history) == played
+    assert [history.get(turn) for turn in range(8)] == played
+    assert history.get(8) is None and history.get(-1) is None
+    for turn in range(10):
+        assert history.summaries_since(turn) == [action.to_summary() for action in played[turn:]]
+
+
+def test_history_snapshot_round_trip_after_spilling():
+    history = ActionHistory(window=3)
+    played = actions(7)
+    for action in played:
+        history.append(action)
+    restored = ActionHistory.from_snapshot(history.to_snapshot(), window=3)
+    assert restored.archive == history.archive
+    assert restored.recent() == history.recent()
+    assert list(restored) == played
+
+    more = actions(9)[7:]
+    for action in more:
+        restored.append(action)
+    assert len(restored.archive) == 6
+    assert restored.summaries_since(5) == [action.to_summary() for action in (played + more)[5:]]
+
+
+def test_game_state_keeps_its_full_history_across_snapshots():
+    game_state = GameState()
+    turns = HISTORY_WINDOW + 10
+    play(game_state, turns)
+    all_actions = game_state.get_actions_since(0)
+    assert [action["turn_number"] for action in all_actions] == list(range(turns))
+
+    restored = GameState.from_snapshot(game_state.to_snapshot())
+    assert restored.get_actions_since(0) == all_actions
+    assert restored.get_recent_actions(3) == game_state.get_recent_actions(3)
+
+    earlier = game_state.snapshot()
+    play(game_state, 5)
+    fork = game_state.fork(earlier)
+    assert fork.get_actions_since(0) == all_actions
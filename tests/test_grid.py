@@ -0,0 +1,45 @@
+import pytest
+
+from arena_test.game_state import GameState
+from arena_test.grid import MAX_VIEWPORT, MIN_VIEWPORT, VIEWPORT_MARGIN, Viewport, build_grid_html, get_viewport
+
+
+def place(width, height, a, b):
+    game_state = GameState(width, height)
+    game_state.player_a.position = a
+    game_state.player_b.position = b
+    return game_state
+
+
+@pytest.mark.parametrize("width, height", [(10, 10), (6, 4), (MIN_VIEWPORT, 3)])
+def test_small_boards_are_shown_whole(width, height):
+    game_state = place(width, height, (0, 0), (width - 1, height - 1))
+    assert get_viewport(game_state) == Viewport(0, 0, width, height)
+
+
+def test_view_is_centred_on_both_players():
+    viewport = get_viewport(place(100, 100, (50, 50), (54, 52)))
+    assert viewport.contains((50, 50)) and viewport.contains((54, 52))
+    left, right = 50 - viewport.x, viewport.x + viewport.cols - 1 - 54
+    top, bottom = 50 - viewport.y, viewport.y + viewport.rows - 1 - 52
+    assert min(left, right, top, bottom) >= VIEWPORT_MARGIN
+    assert abs(left - right) <= 1 and abs(top - bottom) <= 1
+    assert viewport.cols == 5 + 2 * VIEWPORT_MARGIN and viewport.rows == MIN_VIEWPORT
+
+
+@pytest.mark.parametrize("a, b", [((0, 0), (2, 1)), ((99, 99), (97, 98)), ((0, 99), (1, 97))])
+def test_view_is_clamped_at_the_edges(a, b):
+    viewport = get_viewport(place(100, 100, a, b))
+    assert viewport.contains(a) and viewport.contains(b)
+    assert 0 <= viewport.x and viewport.x + viewport.cols <= 100
+    assert 0 <= viewport.y and viewport.y + viewport.rows <= 100
+    assert viewport.cols == viewport.rows == MIN_VIEWPORT
+
+
+def test_players_too_far_apart_keep_player_a_in_view():
+    game_state = place(200, 20, (150, 10), (10, 10))
+    viewport = get_viewport(game_state)
+    assert viewport.cols == MAX_VIEWPORT and viewport.rows == MIN_VIEWPORT
+    assert viewport.contains((150, 10)) and not viewport.contains((10, 10))
+    assert viewport.x == 150 - MAX_VIEWPORT // 2
+    assert "Outside the view: 🔴 Player B at 10,10" in build_grid_html(game_state, viewport)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+from arena_test.arena import EXCHANGES_PER_ROUND
+from arena_test.narrator import NARRATION_TOOL_NAME
+
+
+def play_round(arena):
+    return arena.run_round([f"move {turn}" for turn in range(EXCHANGES_PER_ROUND)])
+
+
+def narrator_prompt(llm, index=-1):
+    prompts = [messages[0]["content"] for name, messages in zip(llm.calls, llm.requests)
+               if name == NARRATION_TOOL_NAME]
+    return prompts[index]
+
+
+def test_each_summary_covers_only_the_actions_since_the_last(make_arena, llm):
+    arena = make_arena()
+
+    async def scenario():
+        await play_round(arena)
+        assert arena.narrator.cursor == arena.game_state.turn_number == EXCHANGES_PER_ROUND + 1
+        await play_round(arena)
+
+    asyncio.run(scenario())
+    first, second = narrator_prompt(llm, 0), narrator_prompt(llm, 1)
+    # FakeLLM numbers its narratives by call: GM turns 1-5, Player B 6, the narrator 7, and so on
+    assert '"Turn 1"' in first and '"Turn 6"' in first
+    assert "(the game has just begun)" in first
+    assert '"Turn 6"' not in second and '"Turn 8"' in second and '"Turn 13"' in second
+    assert "Story so far: Story 7" in second
+    assert arena.narrator.digest == "Story 14"
+    assert arena.game_state.public_narrative == ["Summary 7", "Summary 14"]
+
+
+def test_failed_summary_leaves_the_cursor_for_the_retry(make_arena, llm):
+    arena = make_arena()
+
+    async def scenario():
+        for turn in range(EXCHANGES_PER_ROUND):
+            await arena.play_exchange(f"move {turn}")
+        llm.fail.add(NARRATION_TOOL_NAME)
+        with pytest.raises(RuntimeError):
+            await arena.finish_round()
+        assert arena.narrator.cursor == 0 and arena.narrator.digest == ""
+        llm.fail.clear()
+        await arena.finish_round()
+
+    asyncio.run(scenario())
+    assert '"Turn 1"' in narrator_prompt(llm)
+    assert arena.narrator.cursor == arena.game_state.turn_number
+
+
+@pytest.mark.parametrize("content, expected", [
+    (json.dumps({"summary": " New events ", "story_so_far": " Longer story "}), ("New events", "Longer story")),
+    (json.dumps({"summary": "New events", "story_so_far": "   "}), ("New events", "Old story")),
+    (json.dumps({"summary": "New events"}), ("New events", "Old story")),
+    (json.dumps({"summary": 3, "story_so_far": "Longer story"}), ("Streamed", "Longer story")),
+    (json.dumps(["not", "an", "object"]), ("Streamed", "Old story")),
+    ('{"summary": "New events", "story_so', ("Streamed", "Old story")),
+])
+def test_unusable_digest_keeps_the_previous_one(make_arena, content, expected):
+    narrator = make_arena().narrator
+    narrator.digest = "Old story"
+    assert narrator._parse(content, " Streamed ") == expected
@@ -0,0 +1,42 @@
+import os
+import shutil
+
+import pytest
+
+from arena_test.prompt_manager import DEFAULT_PROMPT_NAMES, PromptManager, PromptType
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "prompt_templates")
+
+
+@pytest.fixture
+def prompts_dir(tmp_path):
+    path = tmp_path / "prompts"
+    shutil.copytree(PROMPTS_DIR, path)
+    return path
+
+
+def test_malformed_file_is_skipped_and_not_reloaded(prompts_dir):
+    bad = prompts_dir / "broken.yaml"
+    bad.write_text("name: [unterminated\n")
+    manager = PromptManager(str(prompts_dir))
+    assert manager.get_prompt(PromptType.GAME_MASTER, DEFAULT_PROMPT_NAMES[PromptType.GAME_MASTER])
+    assert str(bad) in manager._file_mtimes
+
+    bad.write_text("name: Fixed\ntype: narrator\ndescription: d\ncontent: Narrate {recent_actions}\n")
+    os.utime(bad, (0, 12345))
+    manager.refresh(force=True)
+    assert manager.get_prompt(PromptType.NARRATOR, "Fixed").content == "Narrate {recent_actions}"
+
+
+def test_removed_prompt_falls_back_to_default(prompts_dir):
+    manager = PromptManager(str(prompts_dir))
+    prompt = manager.get_prompt_or_default(PromptType.PLAYER_B, "Deleted Prompt")
+    assert prompt.name == DEFAULT_PROMPT_NAMES[PromptType.PLAYER_B]
+
+
+def test_missing_default_still_raises(tmp_path):
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    manager = PromptManager(str(empty))
+    with pytest.raises(ValueError):
+        manager.get_prompt_or_default(PromptType.NARRATOR, DEFAULT_PROMPT_NAMES[PromptType.NARRATOR])
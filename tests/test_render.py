@@ -0,0 +1,64 @@
+import asyncio
+
+from arena_test.render import RenderCoalescer
+
+
+def coalescer(**settings):
+    rendered = []
+    return RenderCoalescer(rendered.append, **settings), rendered
+
+
+def test_deltas_within_the_interval_are_rendered_together():
+    stream, rendered = coalescer(interval=0.05, max_deltas=0)
+
+    async def scenario():
+        for delta in ("The ", "knight ", "strikes"):
+            stream.update(delta)
+        # The first delta renders at once; the rest wait for the interval
+        assert rendered == ["The "]
+        await asyncio.sleep(0.1)
+        stream.update(".")
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert rendered == ["The ", "The knight strikes", "The knight strikes."]
+    assert stream.renders == 3
+
+
+def test_max_deltas_forces_a_render_before_the_interval():
+    stream, rendered = coalescer(interval=10, max_deltas=3)
+
+    async def scenario():
+        for delta in "abcdefg":
+            stream.update(delta)
+        stream.close()
+
+    asyncio.run(scenario())
+    assert rendered == ["a", "abcd", "abcdefg"]
+
+
+def test_close_renders_held_deltas_and_stops_the_timer():
+    stream, rendered = coalescer(interval=0.05)
+
+    async def scenario():
+        stream.update("Half ")
+        stream.update("done")
+        assert stream._timer is not None
+        stream.close()
+        assert stream._timer is None
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert rendered == ["Half ", "Half done"]
+    assert stream.text == "Half done"
+
+
+def test_close_without_held_deltas_renders_nothing():
+    stream, rendered = coalescer(interval=0.05)
+
+    async def scenario():
+        stream.update("All of it")
+        stream.close()
+
+    asyncio.run(scenario())
+    assert rendered == ["All of it"]
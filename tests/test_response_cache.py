@@ -0,0 +1,157 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from arena_test import response_cache
+from arena_test.llm import LLMClient
+from arena_test.response_cache import CacheMiss, CacheMode, ResponseCache, make_cache_key
+from arena_test.updates_tool import UPDATES_TOOL, validate_updates
+
+MESSAGES = [{"role": "user", "content": "Attack"}]
+TOOL_INPUT = json.dumps({
+    "narrative": "A clean hit.",
+    "hp_changes": {"player_a": 0, "player_b": -2},
+    "position_changes": {"player_a": [0, 0], "player_b": [0, 0]},
+    "custom_stat_changes": {"player_a": {}, "player_b": {}}
+})
+
+
+class FakeMessages:
+    """Streams a canned tool input as SDK events"""
+
+    def __init__(self, text=TOOL_INPUT, stop_reason="tool_use"):
+        self.text = text
+        self.stop_reason = stop_reason
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        events = [SimpleNamespace(type="message_start", message=SimpleNamespace(usage=None))]
+        events += [SimpleNamespace(type="content_block_delta",
+                                   delta=SimpleNamespace(type="input_json_delta", partial_json=self.text[i:i + 7]))
+                   for i in range(0, len(self.text), 7)]
+        events.append(SimpleNamespace(type="message_delta", delta=SimpleNamespace(stop_reason=self.stop_reason),
+                                      usage=SimpleNamespace(output_tokens=10)))
+
+        async def stream():
+            for event in events:
+                yield event
+        return stream()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite3"))
+
+
+def make_client(cache, mode, messages=None):
+    client = LLMClient("test-key", cache=cache, cache_mode=mode)
+    client.client = SimpleNamespace(messages=messages or FakeMessages())
+    return client
+
+
+def stream(client, deltas=None, validate=validate_updates):
+    return asyncio.run(client.stream_tool(MESSAGES, "model", 100, UPDATES_TOOL,
+                                          (deltas if deltas is not None else []).append, validate=validate))
+
+
+def cache_key():
+    return make_cache_key("model", 100, MESSAGES, None, tools=[UPDATES_TOOL])
+
+
+@pytest.mark.parametrize("mode, api_calls, stored", [
+    (CacheMode.OFF, 2, False),
+    (CacheMode.READ_THROUGH, 1, True),
+    (CacheMode.RECORD_ONLY, 2, True),
+])
+def test_cache_modes(cache, mode, api_calls, stored):
+    client = make_client(cache, mode)
+    replayed = []
+    assert stream(client) == TOOL_INPUT
+    assert stream(client, replayed) == TOOL_INPUT
+    assert client.client.messages.calls == api_calls
+    assert (cache.get(cache_key()) == TOOL_INPUT) is stored
+    # A replayed response streams in chunks like a live one
+    assert len(replayed) > 1 and "".join(replayed) == TOOL_INPUT
+
+
+def test_replay_only_never_calls_the_api(cache):
+    client = make_client(cache, CacheMode.REPLAY_ONLY)
+    with pytest.raises(CacheMiss):
+        stream(client)
+    cache.put(cache_key(), TOOL_INPUT)
+    assert stream(client) == TOOL_INPUT
+    assert client.client.messages.calls == 0
+
+
+@pytest.mark.parametrize("messages", [
+    FakeMessages(stop_reason="max_tokens"),
+    FakeMessages(text=TOOL_INPUT[:-10]),
+    FakeMessages(text=json.dumps({"narrative": "No updates"})),
+])
+def test_unusable_tool_input_is_not_cached(cache, messages):
+    client = make_client(cache, CacheMode.READ_THROUGH, messages)
+    stream(client)
+    stream(client)
+    assert cache.get(cache_key()) is None
+    assert messages.calls == 2
+
+
+def test_tool_input_without_a_validator_is_cached_unless_truncated(cache):
+    client = make_client(cache, CacheMode.RECORD_ONLY, FakeMessages(text="{}"))
+    stream(client, validate=None)
+    assert cache.get(cache_key()) == "{}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=10)
+    cache.put("a", "aaaa")
+    clock[0] += 1
+    cache.put("b", "bbbb")
+    clock[0] += 1
+    assert cache.get("a") == "aaaa"
+    clock[0] += 1
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+
+
+def test_entries_expire_by_age_even_when_read(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_age_seconds=60)
+    cache.put("old", "x")
+    clock[0] += 30
+    cache.put("new", "y")
+    assert cache.get("old") == "x"
+    clock[0] += 31
+    assert cache.get("old") is None
+    assert cache.get("new") == "y"
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    ResponseCache(path).put("key", "response")
+    assert ResponseCache(path).get("key") == "response"
+
+
+def test_cache_key_covers_everything_that_shapes_a_response():
+    system = [{"type": "text", "text": "Rules", "cache_control": {"type": "ephemeral"}}]
+    base = make_cache_key("model", 100, MESSAGES, system, tools=[UPDATES_TOOL])
+    reordered = [{"content": "Attack", "role": "user"}]
+    assert make_cache_key("model", 100, reordered, system, tools=[UPDATES_TOOL]) == base
+    assert len({
+        base,
+        make_cache_key("other", 100, MESSAGES, system, tools=[UPDATES_TOOL]),
+        make_cache_key("model", 200, MESSAGES, system, tools=[UPDATES_TOOL]),
+        make_cache_key("model", 100, MESSAGES + MESSAGES, system, tools=[UPDATES_TOOL]),
+        make_cache_key("model", 100, MESSAGES, None, tools=[UPDATES_TOOL]),
+        make_cache_key("model", 100, MESSAGES, system),
+    }) == 6
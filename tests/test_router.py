@@ -0,0 +1,70 @@
+import asyncio
+
+import anthropic
+import httpx
+import pytest
+
+from arena_test.router import ModelRoute, ModelRouter
+from arena_test.scheduler import Priority, RequestScheduler, mark_first_output
+
+REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+
+def router(**route) -> ModelRouter:
+    return ModelRouter({"gm": ModelRoute(**{"model": "primary", "max_tokens": 100, **route})})
+
+
+def test_latency_excludes_queueing_and_counts_to_first_output():
+    model_router = router()
+    scheduler = RequestScheduler()
+
+    async def attempt(reservation):
+        await asyncio.sleep(0.01)
+        mark_first_output()
+        await asyncio.sleep(0.2)
+        return "done"
+
+    async def call(model, max_tokens):
+        return await scheduler.run(Priority.BULK, 10, max_tokens, attempt, lambda e: None)
+
+    async def scenario():
+        scheduler.pause(0.2)
+        return await model_router.run("gm", call)
+
+    assert asyncio.run(scenario()) == ("done", "primary")
+    [sample] = model_router._latency[("gm", "primary")].samples
+    assert 0.005 < sample < 0.1
+
+
+def test_slow_primary_switches_to_fast_model():
+    model_router = router(latency_budget=0.05, fast_model="fast")
+
+    async def call(model, max_tokens):
+        await asyncio.sleep(0.06 if model == "primary" else 0)
+        return model
+
+    async def scenario():
+        return [(await model_router.run("gm", call))[1] for _ in range(8)]
+
+    assert asyncio.run(scenario()) == ["primary"] * 5 + ["fast"] * 3
+
+
+@pytest.mark.parametrize("error, falls_back", [
+    (anthropic.APIConnectionError(request=REQUEST), True),
+    (anthropic.InternalServerError("overloaded", response=httpx.Response(529, request=REQUEST), body=None), True),
+    (anthropic.BadRequestError("bad request", response=httpx.Response(400, request=REQUEST), body=None), False),
+    (ValueError("not an API error"), False),
+])
+def test_fallback_only_on_transient_errors(error, falls_back):
+    model_router = router(fallback_model="backup")
+
+    async def call(model, max_tokens):
+        if model == "primary":
+            raise error
+        return "recovered"
+
+    if falls_back:
+        assert asyncio.run(model_router.run("gm", call)) == ("recovered", "backup")
+    else:
+        with pytest.raises(type(error)):
+            asyncio.run(model_router.run("gm", call))
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from arena_test.scheduler import Priority, RequestScheduler
+
+
+class Flaky(Exception):
+    pass
+
+
+def test_waiters_are_admitted_by_priority_then_arrival_under_saturation():
+    # 100 output tokens a second: once the bucket is drained, each 5-token request waits its turn
+    scheduler = RequestScheduler(output_tokens_per_minute=6000)
+    admitted = []
+
+    async def request(name, priority):
+        await scheduler.acquire(priority, 0, 5)
+        admitted.append(name)
+
+    async def scenario():
+        await scheduler.acquire(Priority.INTERACTIVE, 0, 6000)
+        tasks = [asyncio.create_task(request(name, priority)) for name, priority in [
+            ("summary", Priority.BULK), ("player b", Priority.BACKGROUND),
+            ("compaction", Priority.BULK), ("gm", Priority.INTERACTIVE)]]
+        await asyncio.sleep(0)
+        assert scheduler.stats.waiting == 4
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert admitted == ["gm", "player b", "summary", "compaction"]
+    assert scheduler.stats.requests == 5
+
+
+def test_rate_limit_pauses_every_request_for_its_retry_after():
+    scheduler = RequestScheduler(base_delay=0.001)
+    attempts = []
+
+    async def call(reservation):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise Flaky("429")
+        return "ok"
+
+    async def other():
+        await scheduler.acquire(Priority.INTERACTIVE, 0, 0)
+        return time.monotonic()
+
+    async def scenario():
+        retried = asyncio.create_task(scheduler.run(Priority.BULK, 0, 0, call, lambda e: 0.1))
+        while not attempts:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # Arrives during the pause: even an interactive request has to wait it out
+        other_admitted = await other()
+        assert await retried == "ok"
+        return other_admitted
+
+    other_admitted = asyncio.run(scenario())
+    assert attempts[1] - attempts[0] >= 0.1
+    assert other_admitted - attempts[0] >= 0.09
+    assert scheduler.stats.rate_limited == 1 and scheduler.stats.retries == 1
+
+
+@pytest.mark.parametrize("allowed, attempts", [(False, 1), (True, 3)])
+def test_can_retry_vetoes_retries(allowed, attempts):
+    scheduler = RequestScheduler(max_retries=2, base_delay=0.001)
+    calls = []
+
+    async def call(reservation):
+        calls.append(reservation)
+        raise Flaky("stream dropped")
+
+    with pytest.raises(Flaky):
+        asyncio.run(scheduler.run(Priority.INTERACTIVE, 0, 0, call, lambda e: 0, can_retry=lambda: allowed))
+    assert len(calls) == attempts
+    assert scheduler.stats.retries == attempts - 1
+
+
+def test_errors_that_are_not_retryable_raise_at_once():
+    scheduler = RequestScheduler(base_delay=0.001)
+    calls = []
+
+    async def call(reservation):
+        calls.append(reservation)
+        raise Flaky("bad request")
+
+    with pytest.raises(Flaky):
+        asyncio.run(scheduler.run(Priority.BULK, 0, 0, call, lambda e: None))
+    assert len(calls) == 1 and scheduler.stats.retries == 0
+
+
+def test_unused_and_failed_reservations_are_handed_back():
+    scheduler = RequestScheduler(output_tokens_per_minute=600)
+
+    async def used_little(reservation):
+        reservation.record_usage(10, 100)
+
+    async def failed(reservation):
+        raise Flaky("connection reset")
+
+    async def scenario():
+        await scheduler.run(Priority.BULK, 10, 600, used_little, lambda e: None)
+        with pytest.raises(Flaky):
+            await scheduler.run(Priority.BULK, 10, 500, failed, lambda e: None)
+        # Only 100 tokens were spent, so a 500-token request is admitted at once
+        return await asyncio.wait_for(scheduler.acquire(Priority.BULK, 0, 500), 0.05)
+
+    assert asyncio.run(scenario()).output_tokens == 500
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import struct
+import threading
+
+import pytest
+
+from arena_test.arena import EXCHANGES_PER_ROUND
+from arena_test.llm import ClientPool
+from arena_test.narrator import NARRATION_TOOL_NAME
+from arena_test import server as server_module
+from arena_test.server import ArenaServer, GameActor
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return [event["type"] for event in events if event["type"] != "delta"]
+
+
+def test_failed_round_end_is_finished_before_the_next_exchange(make_arena, llm):
+    arena = make_arena()
+
+    async def scenario():
+        actor = GameActor(arena, inbox_size=4, outbox_size=256)
+        subscriber = actor.subscribe()
+        for turn in range(EXCHANGES_PER_ROUND - 1):
+            await actor._play(f"move {turn}")
+        llm.fail.add(NARRATION_TOOL_NAME)
+        with pytest.raises(RuntimeError):
+            await actor._play("final move")
+        assert arena.round_complete
+        drain(subscriber)
+
+        llm.fail.clear()
+        await actor._play("next round")
+        return drain(subscriber)
+
+    events = asyncio.run(scenario())
+    assert events == ["player_message", "round_end", "gm_response", "state"]
+    assert arena.rounds_played == 1
+    assert arena.conversation_turns == 1
+
+
+def test_play_exchange_refuses_a_sixth_exchange(make_arena):
+    arena = make_arena()
+
+    async def scenario():
+        for turn in range(EXCHANGES_PER_ROUND):
+            await arena.play_exchange(f"move {turn}")
+        with pytest.raises(RuntimeError):
+            await arena.play_exchange("one too many")
+
+    asyncio.run(scenario())
+    assert arena.conversation_turns == EXCHANGES_PER_ROUND
+
+
+def make_server(prompt_manager, store=None):
+    return ArenaServer("test-key", prompt_manager, store, "127.0.0.1", 0, inbox_size=4, outbox_size=16,
+                       max_games=2, idle_seconds=60)
+
+
+async def listen(server):
+    listener = await asyncio.start_server(server._handle, "127.0.0.1", 0)
+    return listener, listener.sockets[0].getsockname()[1]
+
+
+def test_health_reports_pooled_llm_clients(make_arena, prompt_manager):
+    arena = make_arena()
+    server = make_server(prompt_manager)
+
+    async def scenario():
+        actor = server._start(arena)
+        try:
+            return await server._route("GET", ["health"], {})
+        finally:
+            await actor.stop()
+
+    status, health = asyncio.run(scenario())
+    assert status == 200 and health["games"] == 1
+    [client] = [client for key, client in health["llm_clients"].items() if key == ClientPool._key("test-key")]
+    assert client["healthy"] and client["consecutive_failures"] == 0
+    json.dumps(health)
+
+
+@pytest.mark.parametrize("length", ["ten", "-5"])
+def test_invalid_content_length_gets_a_400(prompt_manager, length):
+    server = make_server(prompt_manager)
+
+    async def scenario():
+        listener, port = await listen(server)
+        async with listener:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"POST /games HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode("latin-1"))
+            response = await reader.read()
+            writer.close()
+            return response
+
+    status_line, _, body = asyncio.run(scenario()).partition(b"\r\n")
+    assert status_line == b"HTTP/1.1 400 Bad Request"
+    assert body.endswith(b'{"error": "Invalid Content-Length"}')
+    assert not server.actors
+
+
+def test_websocket_text_that_is_not_utf8_closes_with_1007(make_arena, prompt_manager):
+    arena = make_arena()
+    server = make_server(prompt_manager)
+
+    async def scenario():
+        actor = server._start(arena)
+        listener, port = await listen(server)
+        try:
+            async with listener:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"GET /games/{arena.game_id}/ws HTTP/1.1\r\nUpgrade: websocket\r\n"
+                             "Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n"
+                             .encode("latin-1"))
+                await reader.readuntil(b"\r\n\r\n")
+                # Masked text frame holding a lone continuation byte
+                writer.write(bytes([0x81, 0x81]) + bytes(4) + b"\x80")
+                frames = []
+                while True:
+                    first, length = await reader.readexactly(2)
+                    if length == 126:
+                        length = struct.unpack("!H", await reader.readexactly(2))[0]
+                    frames.append((first & 0x0F, await reader.readexactly(length)))
+                    if first & 0x0F == server_module.OP_CLOSE:
+                        break
+                writer.close()
+                return frames
+        finally:
+            await actor.stop()
+
+    frames = asyncio.run(scenario())
+    assert frames[-1] == (server_module.OP_CLOSE, struct.pack("!H", 1007))
+
+
+def test_store_writes_run_off_the_event_loop(make_arena, store, monkeypatch):
+    monkeypatch.setenv("ARENA_SNAPSHOT_EVERY", "2")
+    arena = make_arena(store=store)
+    writers = set()
+    for name in ("append", "save_snapshot"):
+        def record(*args, write=getattr(store, name), name=name):
+            writers.add((name, threading.current_thread() is threading.main_thread()))
+            write(*args)
+        monkeypatch.setattr(store, name, record)
+
+    async def scenario():
+        for turn in range(3):
+            await arena.play_exchange(f"move {turn}")
+
+    asyncio.run(scenario())
+    assert writers == {("append", False), ("save_snapshot", False)}
+    assert [seq for seq, _, _ in store.events_after(arena.game_id, 0)] == [1, 2, 3]
+    assert store.latest_snapshot(arena.game_id)[0] == 2
+
+
+def test_concurrent_requests_resume_an_evicted_game_once(make_arena, store, prompt_manager):
+    arena = make_arena(store=store)
+    asyncio.run(arena.play_exchange("before eviction"))
+    server = make_server(prompt_manager, store)
+
+    async def scenario():
+        actors = await asyncio.gather(*(server.get_actor(arena.game_id) for _ in range(3)))
+        try:
+            assert server.actors == {arena.game_id: actors[0]} and not server._resuming
+            return actors
+        finally:
+            await actors[0].stop()
+
+    actors = asyncio.run(scenario())
+    assert actors[0] is actors[1] is actors[2]
+    assert actors[0].arena.event_seq == arena.event_seq
+
+
+def test_server_picks_up_prompt_edits(prompt_manager, monkeypatch):
+    server = make_server(prompt_manager)
+    refreshed = threading.Event()
+    monkeypatch.setattr(server_module, "REFRESH_INTERVAL", 0.01)
+    monkeypatch.setattr(prompt_manager, "refresh", refreshed.set)
+
+    async def scenario():
+        task = asyncio.ensure_future(server._refresh_prompts())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert refreshed.is_set()
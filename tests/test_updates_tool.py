@@ -0,0 +1,126 @@
+import json
+import random
+
+import pytest
+
+from arena_test.updates_tool import UPDATES_SCHEMA, ToolInputStreamParser, compile_validator, default_updates
+
+UPDATES = {
+    "hp_changes": {"player_a": -3, "player_b": 0},
+    "position_changes": {"player_a": [1, 0], "player_b": [0, -1]},
+    "custom_stat_changes": {"player_a": {"stamina": 2}, "player_b": {}}
+}
+
+# Quotes, backslashes, control characters, accented text and an astral character,
+# which json.dumps escapes as a surrogate pair
+TRICKY = 'He said "run"\\ then\n\tleft. Café — 🗡️ done   ok'
+
+
+def feed_in_chunks(text, sizes, field="narrative"):
+    parser = ToolInputStreamParser(field=field)
+    released, start = [], 0
+    for size in sizes:
+        released.append(parser.feed(text[start:start + size]))
+        start += size
+    released.append(parser.feed(text[start:]))
+    return parser, "".join(released)
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 5, 7, 64])
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_narrative_streams_exactly_at_any_chunk_size(chunk, ensure_ascii):
+    text = json.dumps({"narrative": TRICKY, **UPDATES}, ensure_ascii=ensure_ascii)
+    parser, released = feed_in_chunks(text, [chunk] * (len(text) // chunk))
+    assert released == TRICKY
+    assert parser.narrative == TRICKY
+    assert parser.finish() == (TRICKY.strip(), UPDATES)
+
+
+def test_surrogate_pair_is_held_until_complete():
+    text = json.dumps({"narrative": "a🗡b"})
+    split = text.rindex("\\u")  # between the two halves of the pair
+    parser = ToolInputStreamParser()
+    assert parser.feed(text[:split]) == "a"
+    assert parser.feed(text[split:]) == "🗡b"
+
+
+def test_key_split_across_deltas_and_after_other_fields():
+    text = json.dumps({**UPDATES, "narrative": "late key"})
+    parser, released = feed_in_chunks(text, [1] * len(text))
+    assert released == "late key"
+
+
+def test_nothing_after_the_narrative_is_released():
+    text = json.dumps({"narrative": "done", "note": "\"narrative\": \"again\""})
+    parser, released = feed_in_chunks(text, [4] * (len(text) // 4))
+    assert released == "done"
+
+
+def test_other_field_streams():
+    text = json.dumps({"summary": "The duel ends.", "story_so_far": "Long ago"})
+    _, released = feed_in_chunks(text, [3] * (len(text) // 3), field="summary")
+    assert released == "The duel ends."
+
+
+def test_fuzz_matches_json_decoding():
+    rng = random.Random(1234)
+    alphabet = ['a', 'Z', ' ', '"', '\\', '\n', '\t', '\x01', '/', 'é', '—', ' ', '🗡', '😀', 'ß', '\x7f']
+    for _ in range(300):
+        narrative = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        text = json.dumps({"narrative": narrative, **UPDATES}, ensure_ascii=rng.random() < 0.5)
+        sizes, total = [], 0
+        while total < len(text):
+            sizes.append(rng.randint(1, 9))
+            total += sizes[-1]
+        parser, released = feed_in_chunks(text, sizes)
+        assert released == narrative
+        assert parser.finish() == (narrative.strip(), UPDATES)
+
+
+def test_truncated_input_keeps_streamed_narrative():
+    text = json.dumps({"narrative": "Cut off here", **UPDATES})[:40]
+    parser, _ = feed_in_chunks(text, [5] * 8)
+    assert parser.finish() == ("Cut off here", default_updates())
+
+
+def test_invalid_updates_fall_back_to_defaults():
+    text = json.dumps({"narrative": "Fine", **UPDATES, "hp_changes": {"player_a": "lots"}})
+    parser, _ = feed_in_chunks(text, [])
+    assert parser.finish() == ("Fine", default_updates())
+
+
+validate_updates = compile_validator(UPDATES_SCHEMA)
+
+
+def test_validator_accepts_valid_updates():
+    assert validate_updates({"narrative": "ok", **UPDATES}) == []
+
+
+@pytest.mark.parametrize("payload, error", [
+    ([], "input: expected object"),
+    ({**UPDATES}, "input: missing narrative"),
+    ({"narrative": 1, **UPDATES}, "narrative: expected string"),
+    ({"narrative": "x", **UPDATES, "hp_changes": {"player_a": True}}, "hp_changes.player_a: expected integer"),
+    ({"narrative": "x", **UPDATES, "hp_changes": {"player_a": 1.5}}, "hp_changes.player_a: expected integer"),
+    ({"narrative": "x", **UPDATES, "position_changes": {"player_a": [1]}},
+     "position_changes.player_a: expected at least 2 items"),
+    ({"narrative": "x", **UPDATES, "position_changes": {"player_a": [1, 2, 3]}},
+     "position_changes.player_a: expected at most 2 items"),
+    ({"narrative": "x", **UPDATES, "position_changes": {"player_a": [1, "2"]}},
+     "position_changes.player_a[1]: expected integer"),
+    ({"narrative": "x", **UPDATES, "custom_stat_changes": {"player_a": 3}},
+     "custom_stat_changes.player_a: expected object"),
+])
+def test_validator_reports_paths(payload, error):
+    assert error in validate_updates(payload)
+
+
+def test_validator_rejects_unexpected_properties_when_closed():
+    validate = compile_validator({
+        "type": "object",
+        "properties": {"name": {"type": "string"}, "score": {"type": "number"}},
+        "additionalProperties": False
+    })
+    assert validate({"name": "a", "score": 2.5}) == []
+    assert validate({"name": "a", "extra": 1}) == ["input: unexpected extra"]
+    assert validate({"score": False}) == ["score: expected number"]